@@ -3,6 +3,7 @@ import numpy as np
 from power_model import vertical_takeoff_landing_phase_power, climb_transition_phase_power, climb_phase_power, descent_phase_power, \
     cruise_phase_power, descent_transition_phase_power
 from flight_helpers import stall_speed
+from flight_metrics import FlightMetrics
 from utils.vector_math import lat_long_to_heading, magnitude, heading_to_vector
 from utils.helpers import log_phase_info, log_location_and_speed, log_wind_speed, log_wind_travel_time
 import logging
@@ -38,24 +39,7 @@ class Aircraft:
 
     @staticmethod
     def _initialize_metrics(flight_directions):
-        metrics = {}
-        initial_phase_dict = {
-            'hover_climb': 0,
-            'climb_transition': 0,
-            'climb': 0,
-            'cruise': 0,
-            'descent': 0,
-            'descent_transition': 0,
-            'hover_descent': 0
-        }
-
-        for direction in flight_directions:
-            metrics[direction] = {
-                'phase_energy': initial_phase_dict.copy(),
-                'phase_time': initial_phase_dict.copy()
-            }
-
-        return metrics        
+        return FlightMetrics(flight_directions)
 
     def extract_phase_info(self, phase_info):
         self.horizontal_distance = phase_info['horizontal_distance']
@@ -82,12 +66,12 @@ class Aircraft:
         log_phase_info(aircraft=self, phase='HOVER CLIMB')
         log_location_and_speed(aircraft=self)
 
-        self.metrics[self.flight_direction]['phase_time']['hover_climb'] += self.travel_time
+        self.metrics.add(self.flight_direction, 'hover_climb', time=self.travel_time)
         energy_consumption = self.vertical_takeoff_landing_energy_consumption(start_altitude=self.altitude,
                                                              end_altitude=self.altitude+self.vertical_distance,
                                                              hover_time=self.travel_time,
                                                              operation='takeoff')
-        self.metrics[self.flight_direction]['phase_energy']['hover_climb'] += energy_consumption
+        self.metrics.add(self.flight_direction, 'hover_climb', energy=energy_consumption)
         self.update_location_and_velocity(horizontal_velocity=self.horizontal_velocity, vertical_velocity=self.vertical_velocity)
         log_location_and_speed(aircraft=self)
 
@@ -98,7 +82,7 @@ class Aircraft:
         self.extract_phase_info(phase_info)
         log_phase_info(aircraft=self, phase='CLIMB TRANSITION')
         log_location_and_speed(aircraft=self)
-        self.metrics[self.flight_direction]['phase_time']['climb_transition'] += self.travel_time
+        self.metrics.add(self.flight_direction, 'climb_transition', time=self.travel_time)
 
         start_air_speed, end_air_speed, true_v, ground_v = self.adjust_speed_based_on_wind(phase='CLIMB TRANSITION')
         assert abs(magnitude(ground_v) - self.horizontal_velocity) < 1e-9, "Climb phase horizontal speed incorrect."
@@ -109,7 +93,7 @@ class Aircraft:
                                                      climb_transition_time=self.travel_time,
                                                      start_air_speed=start_air_speed,
                                                      end_air_speed=end_air_speed)
-        self.metrics[self.flight_direction]['phase_energy']['climb_transition'] += energy_consumption
+        self.metrics.add(self.flight_direction, 'climb_transition', energy=energy_consumption)
         self.update_location_and_velocity(horizontal_velocity=end_air_speed, vertical_velocity=self.vertical_velocity)
         log_location_and_speed(aircraft=self)
         return energy_consumption, round(self.travel_time, 2)
@@ -119,7 +103,7 @@ class Aircraft:
         self.extract_phase_info(phase_info)
         log_phase_info(aircraft=self, phase='CLIMB')
         log_location_and_speed(aircraft=self)
-        self.metrics[self.flight_direction]['phase_time']['climb'] += self.travel_time
+        self.metrics.add(self.flight_direction, 'climb', time=self.travel_time)
 
         # Note: end_air_speed is sqrt(|true_v|^2 + vertical_vel^2))
         start_air_speed, end_air_speed, true_v, ground_v = self.adjust_speed_based_on_wind(phase='CLIMB')
@@ -131,7 +115,7 @@ class Aircraft:
                                           climb_time=self.travel_time,
                                           start_air_speed=start_air_speed,
                                           end_air_speed=end_air_speed)
-        self.metrics[self.flight_direction]['phase_energy']['climb'] += energy_consumption
+        self.metrics.add(self.flight_direction, 'climb', energy=energy_consumption)
         self.update_location_and_velocity(horizontal_velocity=end_air_speed, vertical_velocity=self.vertical_velocity)
         log_location_and_speed(aircraft=self)
         return energy_consumption, round(self.travel_time, 2)
@@ -152,10 +136,10 @@ class Aircraft:
 
         self.travel_time = link_traversal_time
         log_wind_travel_time(link_traversal_time)
-        self.metrics[self.flight_direction]['phase_time']['cruise'] += self.travel_time     
+        self.metrics.add(self.flight_direction, 'cruise', time=self.travel_time)     
 
         energy_consumption = self.cruise_energy_consumption(time_cruise=self.travel_time, cruise_speed=magnitude(true_v))
-        self.metrics[self.flight_direction]['phase_energy']['cruise'] += energy_consumption
+        self.metrics.add(self.flight_direction, 'cruise', energy=energy_consumption)
         self.update_location_and_velocity(horizontal_velocity=magnitude(true_v), vertical_velocity=self.vertical_velocity)
         log_location_and_speed(aircraft=self)
         return energy_consumption, link_traversal_time
@@ -165,7 +149,7 @@ class Aircraft:
         self.extract_phase_info(phase_info)
         log_phase_info(aircraft=self, phase='DESCENT')
         log_location_and_speed(aircraft=self)
-        self.metrics[self.flight_direction]['phase_time']['descent'] += self.travel_time
+        self.metrics.add(self.flight_direction, 'descent', time=self.travel_time)
 
         start_air_speed, end_air_speed, true_v, ground_v = self.adjust_speed_based_on_wind(phase='DESCENT')
         assert abs(magnitude(ground_v) - self.horizontal_velocity) < 1e-9, "Error: the aircraft is not flying with the right speed relative to the ground."
@@ -177,7 +161,7 @@ class Aircraft:
                                             start_air_speed=start_air_speed,
                                             end_air_speed=end_air_speed)
         
-        self.metrics[self.flight_direction]['phase_energy']['descent'] += energy_consumption
+        self.metrics.add(self.flight_direction, 'descent', energy=energy_consumption)
         self.update_location_and_velocity(horizontal_velocity=end_air_speed, vertical_velocity=self.vertical_velocity)
         log_location_and_speed(aircraft=self)
         return energy_consumption, round(self.travel_time, 2)
@@ -187,7 +171,7 @@ class Aircraft:
         self.extract_phase_info(phase_info)
         log_phase_info(aircraft=self, phase='DESCENT TRANSITION')
         log_location_and_speed(aircraft=self)
-        self.metrics[self.flight_direction]['phase_time']['descent_transition'] += self.travel_time
+        self.metrics.add(self.flight_direction, 'descent_transition', time=self.travel_time)
 
         start_air_speed, end_air_speed, true_v, ground_v = self.adjust_speed_based_on_wind(phase='DESCENT TRANSITION')
         assert abs(magnitude(ground_v) - self.horizontal_velocity) < 1e-9, "Climb phase horizontal speed incorrect."
@@ -199,7 +183,7 @@ class Aircraft:
                                                        start_air_speed=start_air_speed,
                                                        end_air_speed=end_air_speed)
         
-        self.metrics[self.flight_direction]['phase_energy']['descent_transition'] += energy_consumption
+        self.metrics.add(self.flight_direction, 'descent_transition', energy=energy_consumption)
         self.update_location_and_velocity(horizontal_velocity=end_air_speed, vertical_velocity=self.vertical_velocity)
         log_location_and_speed(aircraft=self)
         return energy_consumption, round(self.travel_time, 2)
@@ -209,12 +193,12 @@ class Aircraft:
         self.extract_phase_info(phase_info)
         log_phase_info(aircraft=self, phase='HOVER DESCENT')
         log_location_and_speed(aircraft=self)
-        self.metrics[self.flight_direction]['phase_time']['hover_descent'] += self.travel_time
+        self.metrics.add(self.flight_direction, 'hover_descent', time=self.travel_time)
         energy_consumption = self.vertical_takeoff_landing_energy_consumption(start_altitude=self.altitude,
                                                              end_altitude=self.altitude-self.vertical_distance,
                                                              hover_time=self.travel_time,
                                                              operation='landing')
-        self.metrics[self.flight_direction]['phase_energy']['hover_descent'] += energy_consumption
+        self.metrics.add(self.flight_direction, 'hover_descent', energy=energy_consumption)
         self.update_location_and_velocity(horizontal_velocity=self.horizontal_velocity, vertical_velocity=self.vertical_velocity)
         log_location_and_speed(aircraft=self)        
         return energy_consumption, round(self.travel_time, 2)
@@ -350,6 +334,10 @@ class Aircraft:
     
     def adjust_speed_based_on_wind(self, phase: str=None):  
          
+        if self.wind.spatial:
+            # Sample the wind at the waypoint, half way through the phase's altitude change
+            self.wind.locate(self.latitude, self.longitude, self.altitude + self.vertical_distance / 2)
+
         # Compute start air speed according to the previous speed
         start_air_speed = self.compute_air_speed(self.prev_horizontal_velocity, self.prev_vertical_velocity)
         # Compute end air speed according to the route file
@@ -386,20 +374,10 @@ class Aircraft:
         self.update_prev_location(self.latitude, self.longitude)        
 
     def get_total_energy_consumption(self):
-        total_energy = {}
-        for flight_direction, data in self.metrics.items():
-            total_energy.update({flight_direction: 0})
-            for _, energy in data['phase_energy'].items():
-                total_energy[flight_direction] += energy
-        return total_energy
+        return dict(zip(self.metrics.flight_directions, self.metrics.total_energy_consumption()))
     
     def get_total_flight_time(self):
-        total_time = {}
-        for flight_direction, data in self.metrics.items():
-            total_time.update({flight_direction: 0})
-            for _, time in data['phase_time'].items():
-                total_time[flight_direction] += time
-        return total_time
+        return dict(zip(self.metrics.flight_directions, self.metrics.total_flight_time()))
     
     def print_total_energy_consumption(self):
         total_energy = self.get_total_energy_consumption()
@@ -0,0 +1,208 @@
+import argparse
+import functools
+import glob
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import power_model
+from aircraft import Aircraft
+from main import compute_energy_consumption
+from route_engine import RouteColumns, compute_energy_consumption_vectorized
+from utils.helpers import load_config, preprocess_route
+from wind.wind import Wind
+from wind_sweep import wind_sweep, evaluate_wind_grid
+
+DEFAULT_BASELINE = 'data/benchmark_baseline.json'
+# A benchmark fails when it gets this much slower (or uses this much more memory) than its baseline
+DEFAULT_THRESHOLD = 0.25
+# Peak memory growth below this many MB is never a regression, so tiny benchmarks do not flap
+MEMORY_TOLERANCE_MB = 1.0
+# Each benchmark is repeated until it has run for this long (and at least MIN_REPEATS times); the best time counts
+MIN_SECONDS = 0.5
+MIN_REPEATS = 3
+ROUTE_FILES = 'routes/sfo_sjc_route_*.csv'
+SYNTHETIC_SEGMENTS = (1_000, 10_000, 100_000)
+# The row-by-row engine is only timed on synthetic routes up to this many segments
+LOOP_ENGINE_MAX_SEGMENTS = 1_000
+
+
+def measure(function, items=1):
+    """Best wall-clock time of function() over repeats and its peak traced memory. items is the work per call."""
+    times = []
+    start = time.perf_counter()
+    while len(times) < MIN_REPEATS or time.perf_counter() - start < MIN_SECONDS:
+        call_start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - call_start)
+    tracemalloc.start()
+    function()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    seconds = min(times)
+    return {'seconds': seconds, 'throughput': items / seconds, 'peak_memory_mb': peak_memory / 2**20}
+
+
+def synthetic_route(route, segments):
+    """Whole copies of a route, each shifted slightly north under new flight direction names, about segments rows long."""
+    copies = []
+    for i in range(max(round(segments / len(route)), 1)):
+        copy = route.copy()
+        copy['flight_direction'] = copy['flight_direction'].map(lambda direction: f'{direction}_{i}')
+        copy['latitude'] = copy['latitude'] + i * 1e-3
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+def energy_benchmarks(name, route, aircraft_params, wind, loop_engine=True):
+    route = preprocess_route(route.copy(), overwrite=False)
+    flight_directions = route['flight_direction'].unique()
+
+    def run(engine):
+        aircraft = Aircraft(aircraft_params=aircraft_params, flight_directions=flight_directions, wind=wind)
+        engine(route.copy(), flight_directions, aircraft)
+
+    results = {}
+    if loop_engine:
+        results[f'compute_energy_consumption[loop,{name}]'] = \
+            dict(measure(lambda: run(compute_energy_consumption), len(route)), unit='segments/s')
+    results[f'compute_energy_consumption[vectorized,{name}]'] = \
+        dict(measure(lambda: run(compute_energy_consumption_vectorized), len(route)), unit='segments/s')
+    columns = RouteColumns.from_dataframe(route, flight_directions)
+    results[f'compute_energy_consumption[vectorized parsed once,{name}]'] = \
+        dict(measure(lambda: run(functools.partial(compute_energy_consumption_vectorized, columns=columns)), len(route)),
+             unit='segments/s')
+    return results
+
+
+def wind_benchmarks(size=100_000):
+    wind = Wind(reference_frame='relative_to_aircraft', wind_magnitude_mph=20, wind_direction_degrees=60)
+    headings = np.linspace(0, 2 * np.pi, size, endpoint=False)
+    return {
+        'Wind.compute_aircraft_velocity[scalar]': dict(measure(
+            lambda: [wind.compute_aircraft_velocity(heading, 60.0, 0.1) for heading in headings[:1000]], 1000),
+            unit='solves/s'),
+        f'Wind.compute_aircraft_velocity_batch[{size}]': dict(measure(
+            lambda: wind.compute_aircraft_velocity_batch(headings, 60.0, 0.1), size), unit='solves/s')
+    }
+
+
+def power_model_benchmarks(aircraft_params, size=100_000):
+    rng = np.random.default_rng(0)
+    tom = aircraft_params['mtom'] - aircraft_params['pax'] * aircraft_params['pax_mass']
+    altitude = rng.uniform(0, 1500, size)
+    vertical_velocity = rng.uniform(0.5, 5, size)
+    air_speed = rng.uniform(30, 80, size)
+    sustained = dict(start_altitude=altitude, end_altitude=altitude + 100, aircraft_params=aircraft_params, tom=tom,
+                     start_vertical_velocity=vertical_velocity, end_vertical_velocity=vertical_velocity,
+                     start_air_speed=air_speed, end_air_speed=air_speed)
+    calls = {
+        'vertical_takeoff_landing_phase_power': lambda: power_model.vertical_takeoff_landing_phase_power(
+            start_altitude=altitude, end_altitude=altitude + 15, aircraft_params=aircraft_params, tom=tom,
+            vertical_velocity=vertical_velocity),
+        'climb_transition_phase_power': lambda: power_model.climb_transition_phase_power(**sustained, is_first_time=False),
+        'climb_phase_power': lambda: power_model.climb_phase_power(**sustained),
+        'cruise_phase_power': lambda: power_model.cruise_phase_power(cruise_speed=air_speed,
+                                                                     aircraft_params=aircraft_params, tom=tom),
+        'descent_phase_power': lambda: power_model.descent_phase_power(**sustained),
+        'descent_transition_phase_power': lambda: power_model.descent_transition_phase_power(**sustained,
+                                                                                             is_last_time=False)
+    }
+    return {f'power_model.{name}[{size}]': dict(measure(call, size), unit='segments/s') for name, call in calls.items()}
+
+
+def run_benchmarks(aircraft_params_path='data/aircraft_params.json', quick=False):
+    aircraft_params = load_config(aircraft_params_path)
+    wind = Wind(reference_frame='relative_to_aircraft', wind_magnitude_mph=20, wind_direction_degrees=90)
+    route_files = sorted(glob.glob(ROUTE_FILES))
+    base_route = pd.read_csv(route_files[-1])
+    synthetic_sizes = SYNTHETIC_SEGMENTS[:1] if quick else SYNTHETIC_SEGMENTS
+
+    results = {}
+    for path in route_files:
+        results.update(energy_benchmarks(path, pd.read_csv(path), aircraft_params, wind))
+    for segments in synthetic_sizes:
+        route = synthetic_route(base_route, segments)
+        results.update(energy_benchmarks(f'synthetic_{segments}', route, aircraft_params, wind,
+                                         loop_engine=segments <= LOOP_ENGINE_MAX_SEGMENTS))
+        raw_route = route.drop(columns=[column for column in route.columns if column not in
+                                        ('flight_direction', 'latitude', 'longitude', 'altitude', 'phase',
+                                         'vertical_velocity', 'horizontal_velocity')])
+        results[f'preprocess_route[synthetic_{segments}]'] = \
+            dict(measure(lambda: preprocess_route(raw_route.copy()), len(route)), unit='segments/s')
+    results.update(wind_benchmarks())
+    results.update(power_model_benchmarks(aircraft_params))
+
+    wind_speeds = np.arange(0, 50, 0.5)
+    wind_directions = np.linspace(0, 360, 100, endpoint=False)
+    flights = len(wind_speeds) * len(wind_directions) * base_route['flight_direction'].nunique()
+    results['wind_sweep[100x100]'] = dict(measure(
+        lambda: wind_sweep(base_route, aircraft_params, wind_speeds, wind_directions), flights), unit='flights/s')
+    columns = RouteColumns.from_dataframe(base_route)
+    results['evaluate_wind_grid[100x100]'] = dict(measure(
+        lambda: evaluate_wind_grid(columns, aircraft_params, wind_speeds, wind_directions), flights), unit='flights/s')
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Returns the regressions of results against the baseline benchmarks, as messages."""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        for field, tolerance in (('seconds', 0), ('peak_memory_mb', MEMORY_TOLERANCE_MB)):
+            if result[field] > reference[field] * (1 + threshold) + tolerance:
+                regressions.append(f'{name}: {field} {result[field]:.4g} > baseline {reference[field]:.4g} '
+                                   f'(+{result[field] / reference[field] - 1:.0%})')
+    return regressions
+
+
+def print_results(results, baseline):
+    print(f'{"benchmark":<70} {"seconds":>10} {"throughput":>22} {"peak MB":>9} {"vs baseline":>12}')
+    for name, result in results.items():
+        reference = baseline.get(name)
+        change = f'{result["seconds"] / reference["seconds"] - 1:+.0%}' if reference else ''
+        throughput = f'{result["throughput"]:.4g} {result["unit"]}'
+        print(f'{name:<70} {result["seconds"]:>10.4g} {throughput:>22} {result["peak_memory_mb"]:>9.2f} {change:>12}')
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the energy pipeline and check it against a baseline")
+    parser.add_argument('-b', '--baseline', default=DEFAULT_BASELINE, help="Baseline file")
+    parser.add_argument('-s', '--save_baseline', action='store_true', help="Store this run as the new baseline")
+    parser.add_argument('-t', '--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed relative slowdown or memory growth before a benchmark fails")
+    parser.add_argument('-q', '--quick', action='store_true', help="Skip the large synthetic routes")
+    parser.add_argument('-p', '--aircraft_params', default='data/aircraft_params.json', help="Aircraft params file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    try:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)['benchmarks']
+    except FileNotFoundError:
+        # Without a baseline every check would pass; only a run storing one may go without
+        if not args.save_baseline:
+            sys.exit(f'No baseline at {args.baseline}; run with --save_baseline to store one.')
+        baseline = {}
+
+    results = run_benchmarks(args.aircraft_params, quick=args.quick)
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump({'machine': platform.platform(), 'python': platform.python_version(), 'benchmarks': results},
+                      file, indent=4)
+        print(f'Saved baseline to {args.baseline}')
+    else:
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
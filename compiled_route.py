@@ -0,0 +1,100 @@
+import argparse
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from route_engine import RouteColumns
+
+# Bump when the bundle layout or the meaning of a RouteColumns field changes, so old bundles get rebuilt
+COMPILED_ROUTE_VERSION = 3
+META_FILE = 'meta.json'
+FLIGHT_DIRECTIONS_FILE = 'flight_directions.npy'
+
+
+def compiled_route_path(csv_path):
+    """Directory the compiled bundle of a route CSV lives in: one .npy file per column plus meta.json."""
+    return f'{csv_path}.compiled'
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_meta(bundle_path):
+    try:
+        with open(os.path.join(bundle_path, META_FILE), 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _flight_direction_labels(flight_directions):
+    """
+    flight_directions as an array that loads back equal, label for label and type for type: all strings or all
+    numbers, as a route CSV column holds them.
+    """
+    labels = np.asarray(list(flight_directions))
+    if labels.dtype.kind not in 'biufU' or labels.tolist() != list(flight_directions):
+        raise ValueError('Compiled routes need flight directions that are all strings or all numbers.')
+    return labels
+
+
+def save_compiled_route(columns, bundle_path, source_hash):
+    labels = _flight_direction_labels(columns.flight_directions)
+    os.makedirs(bundle_path, exist_ok=True)
+    # meta.json is written last and removed first, so a bundle without it is never trusted
+    meta_path = os.path.join(bundle_path, META_FILE)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    for field in RouteColumns.ARRAY_FIELDS:
+        np.save(os.path.join(bundle_path, f'{field}.npy'), getattr(columns, field))
+    # Saved with their dtype: labels read from a CSV are not always strings
+    np.save(os.path.join(bundle_path, FLIGHT_DIRECTIONS_FILE), labels)
+    meta = {
+        'version': COMPILED_ROUTE_VERSION,
+        'source_sha256': source_hash
+    }
+    with open(meta_path, 'w') as file:
+        json.dump(meta, file, indent=4)
+
+
+def compile_route(csv_path, bundle_path=None):
+    """Parse and preprocess a route CSV and write its compiled bundle. Returns the RouteColumns."""
+    source_hash = file_hash(csv_path)
+    columns = RouteColumns.from_dataframe(pd.read_csv(csv_path))
+    save_compiled_route(columns, bundle_path or compiled_route_path(csv_path), source_hash)
+    return columns
+
+
+def load_compiled_route(csv_path, mmap=True):
+    """
+    Load the compiled bundle of a route CSV, rebuilding it if it is missing, was built from a different CSV content
+    or by a different COMPILED_ROUTE_VERSION. With mmap, arrays are memory-mapped read-only, so processes loading the
+    same route share its pages instead of each parsing the CSV.
+    """
+    bundle_path = compiled_route_path(csv_path)
+    meta = _read_meta(bundle_path)
+    if meta is None or meta.get('version') != COMPILED_ROUTE_VERSION or meta.get('source_sha256') != file_hash(csv_path):
+        compile_route(csv_path, bundle_path)
+        meta = _read_meta(bundle_path)
+
+    arrays = {field: np.load(os.path.join(bundle_path, f'{field}.npy'), mmap_mode='r' if mmap else None)
+              for field in RouteColumns.ARRAY_FIELDS}
+    labels = np.load(os.path.join(bundle_path, FLIGHT_DIRECTIONS_FILE))
+    # Like the labels of a parsed CSV: Python strings, numpy numbers
+    flight_directions = labels.tolist() if labels.dtype.kind == 'U' else list(labels)
+    return RouteColumns(flight_directions=flight_directions, **arrays)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile route CSV files into memory-mappable bundles")
+    parser.add_argument('files', nargs='+', help="Paths to the route files")
+    args = parser.parse_args()
+    for path in args.files:
+        compile_route(path)
+        print(f'Compiled {path} -> {compiled_route_path(path)}')
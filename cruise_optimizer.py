@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+from flight_helpers import stall_speed
+from power_model import cruise_phase_power
+from route_engine import RouteColumns, CRUISE, GROUND_SPEED_THRESHOLD
+from utils.units import mph_to_metersec, degrees_to_radians, sec_to_hr, sec_to_min, watt_to_kw
+from utils.vector_math import norm
+from wind.wind import Wind
+from wind_sweep import DEFAULT_CHUNK_SIZE
+
+INVERSE_GOLDEN_RATIO = (np.sqrt(5) - 1) / 2
+# Width (m/s) the golden-section bracket is narrowed to
+SPEED_TOLERANCE = 0.01
+# Relative cost difference below which candidate airspeeds count as equally good
+COST_TIE_TOLERANCE = 1e-9
+
+
+def cruise_segment_cost(airspeed, along_wind, cross_wind, distance, aircraft_params, tom, time_weight=0.0):
+    """
+    Energy (kWh), time (s) and cost of cruise segments flown at an airspeed (m/s), crabbing into the wind like
+    evaluate_route does. cost = energy + time_weight * time in minutes, so time_weight is in kWh per minute.
+    """
+    true_along, true_cross, ground_speed = Wind.wind_adjusted_true_velocity_batch(airspeed, along_wind, cross_wind,
+                                                                                  GROUND_SPEED_THRESHOLD)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        time = distance / ground_speed
+    power = cruise_phase_power(cruise_speed=norm(true_along, true_cross), aircraft_params=aircraft_params, tom=tom)
+    energy = sec_to_hr(watt_to_kw(power) * time)
+    return energy, time, energy + time_weight * sec_to_min(time)
+
+
+def cruise_speed_bounds(columns, aircraft_params, rows):
+    """(lowest, highest) airspeed (m/s) of the given cruise rows: the stall speed at their altitude and max_horizontal_velocity."""
+    highest = float(aircraft_params['max_horizontal_velocity'])
+    lowest = stall_speed(atmosphere_condition=aircraft_params['atmosphere_condition'],
+                         altitude=columns.altitude[rows],
+                         mtom=aircraft_params['mtom'],
+                         wing_area=aircraft_params['wing_area'],
+                         cl_max=aircraft_params['cl_max'])
+    # An aircraft that stalls above its top speed can only fly its top speed
+    return np.minimum(lowest, highest), highest
+
+
+def optimize_cruise_speeds(columns, aircraft_params, wind_magnitude, wind_angle, reference_frame,
+                           time_weight=0.0, tolerance=SPEED_TOLERANCE):
+    """
+    Airspeed minimizing the energy (or energy + time_weight * minutes) of every cruise segment, found by a
+    golden-section search run on all segments and wind cases at once. wind_magnitude (m/s) and wind_angle (radians)
+    broadcast against the route rows like in evaluate_route, e.g. shape (cases, 1).
+    Segments are optimized independently: the speed the aircraft carries into the next phase is not part of the cost.
+    :return: (rows, airspeed, energy, time): indices of the cruise rows in columns, and the optimal airspeed (m/s),
+             energy (kWh) and time (s) of shape (..., cruise rows)
+    """
+    rows = np.flatnonzero(columns.phase == CRUISE)
+    along_wind, cross_wind = Wind.track_wind_components(reference_frame, wind_magnitude, wind_angle,
+                                                        columns.destination_heading)
+    along_wind, cross_wind = along_wind[..., rows], cross_wind[..., rows]
+    distance = columns.horizontal_distance[rows]
+    tom = aircraft_params['mtom'] - aircraft_params['pax'] * aircraft_params['pax_mass']
+
+    def cost(airspeed):
+        return cruise_segment_cost(airspeed, along_wind, cross_wind, distance, aircraft_params, tom, time_weight)
+
+    lowest, highest = cruise_speed_bounds(columns, aircraft_params, rows)
+    shape = np.broadcast_shapes(along_wind.shape, np.shape(lowest))
+    low = np.array(np.broadcast_to(lowest, shape), dtype=np.float64)
+    high = np.full(shape, highest)
+    inner_low = high - INVERSE_GOLDEN_RATIO * (high - low)
+    inner_high = low + INVERSE_GOLDEN_RATIO * (high - low)
+    cost_low, cost_high = cost(inner_low)[2], cost(inner_high)[2]
+
+    # The cost falls then rises with airspeed; below the speed at which the aircraft can no longer make headway it
+    # is flat (the wind fallback), so ties move the bracket towards higher speeds
+    span = float(np.max(high - low, initial=0.0))
+    iterations = int(np.ceil(np.log(tolerance / span) / np.log(INVERSE_GOLDEN_RATIO))) if span > tolerance else 0
+    for _ in range(iterations):
+        keep_lower = cost_low < cost_high
+        high = np.where(keep_lower, inner_high, high)
+        low = np.where(keep_lower, low, inner_low)
+        new_speed = np.where(keep_lower, high - INVERSE_GOLDEN_RATIO * (high - low),
+                             low + INVERSE_GOLDEN_RATIO * (high - low))
+        new_cost = cost(new_speed)[2]
+        inner_low, inner_high, cost_low, cost_high = (np.where(keep_lower, new_speed, inner_high),
+                                                      np.where(keep_lower, inner_low, new_speed),
+                                                      np.where(keep_lower, new_cost, cost_high),
+                                                      np.where(keep_lower, cost_low, new_cost))
+
+    # Monotonic costs have their minimum on a bound, which the bracket only approaches. Where the cost does not
+    # depend on airspeed (no wind: power and ground speed both scale with it) the fastest candidate wins
+    candidates = np.stack([np.full(shape, highest), (low + high) / 2, np.broadcast_to(lowest, shape)])
+    energy, time, candidate_cost = cost(candidates)
+    lowest_cost = candidate_cost.min(axis=0)
+    best = np.argmax(candidate_cost <= lowest_cost + COST_TIE_TOLERANCE * np.abs(lowest_cost), axis=0)[np.newaxis]
+    return (rows,) + tuple(np.take_along_axis(value, best, axis=0)[0] for value in (candidates, energy, time))
+
+
+def optimal_cruise_speeds(route, aircraft_params, wind_speeds, wind_directions, reference_frame='relative_to_aircraft',
+                          time_weight=0.0, flight_directions=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Energy-optimal cruise airspeed of every cruise segment for a list of wind cases, against the route's airspeed.
+    :param route: route DataFrame (as read from a route CSV) or RouteColumns
+    :param wind_speeds: wind magnitude of each case in mph
+    :param wind_directions: wind direction of each case in degrees, interpreted in reference_frame like Wind does
+    :param time_weight: kWh one minute of flight time is worth; 0 minimizes energy alone
+    :return: DataFrame with one row per (case, cruise segment) holding the route and optimal airspeed (m/s) and
+             the energy_consumption (kWh) and flight_time (minutes) at each
+    """
+    columns = route if isinstance(route, RouteColumns) else RouteColumns.from_dataframe(route, flight_directions)
+    wind_speeds, wind_directions = (np.ravel(value).astype(np.float64)
+                                    for value in np.broadcast_arrays(wind_speeds, wind_directions))
+    tom = aircraft_params['mtom'] - aircraft_params['pax'] * aircraft_params['pax_mass']
+    rows = np.flatnonzero(columns.phase == CRUISE)
+    chunks = []
+    for start in range(0, len(wind_speeds), chunk_size):
+        wind_magnitude = mph_to_metersec(wind_speeds[start:start + chunk_size, np.newaxis])
+        wind_angle = degrees_to_radians(wind_directions[start:start + chunk_size, np.newaxis])
+        _, airspeed, energy, time = optimize_cruise_speeds(columns, aircraft_params, wind_magnitude, wind_angle,
+                                                           reference_frame, time_weight)
+        along_wind, cross_wind = Wind.track_wind_components(reference_frame, wind_magnitude, wind_angle,
+                                                            columns.destination_heading[rows])
+        route_energy, route_time, _ = cruise_segment_cost(columns.horizontal_velocity[rows], along_wind, cross_wind,
+                                                          columns.horizontal_distance[rows], aircraft_params, tom)
+        chunks.append(np.stack(np.broadcast_arrays(airspeed, energy, time, route_energy, route_time), axis=-1))
+    results = np.concatenate(chunks) if chunks else np.zeros((0, len(rows), 5))
+
+    n_cases = len(wind_speeds)
+    return pd.DataFrame({
+        'case': np.repeat(np.arange(n_cases), len(rows)),
+        'wind_speed': np.repeat(wind_speeds, len(rows)),
+        'wind_direction': np.repeat(wind_directions, len(rows)),
+        'flight_direction': np.tile(np.asarray(columns.flight_directions, dtype=object)[columns.direction_index[rows]], n_cases),
+        'row_index': np.tile(columns.row_index[rows], n_cases),
+        'route_airspeed': np.tile(columns.horizontal_velocity[rows], n_cases),
+        'optimal_airspeed': results[..., 0].ravel(),
+        'energy_consumption': results[..., 3].ravel(),
+        'optimal_energy_consumption': results[..., 1].ravel(),
+        'flight_time': sec_to_min(results[..., 4].ravel()),
+        'optimal_flight_time': sec_to_min(results[..., 2].ravel())
+    })
@@ -0,0 +1,75 @@
+import itertools
+import numpy as np
+import pandas as pd
+from route_engine import RouteColumns, evaluate_route, VARIANT_PARAMS
+from utils.units import mph_to_metersec, degrees_to_radians, sec_to_min
+from wind_sweep import DEFAULT_CHUNK_SIZE, empty_phase_totals
+
+
+def variant_grid(**values):
+    """Full factorial of aircraft param values, e.g. variant_grid(mtom=[2000, 2200], ld_max=[15, 18]), as flat arrays."""
+    names = list(values)
+    combinations = np.array(list(itertools.product(*(np.asarray(values[name], dtype=np.float64).ravel()
+                                                       for name in names))), dtype=np.float64)
+    return {name: combinations[:, i] for i, name in enumerate(names)}
+
+
+def evaluate_aircraft_variants(columns, aircraft_params, variants, wind_magnitude=0.0, wind_angle=0.0,
+                               reference_frame='relative_to_aircraft', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Evaluate a route once for many aircraft variants by broadcasting the varied params against the route rows.
+    :param variants: {param name: array of one value per variant}; params not given keep their aircraft_params value
+    :param wind_magnitude: wind magnitude in m/s
+    :param wind_angle: wind angle in radians
+    :return: array of shape (variants, flight directions, phases, 2)
+    """
+    unknown = set(variants) - set(VARIANT_PARAMS)
+    if unknown:
+        raise ValueError(f'Only {", ".join(VARIANT_PARAMS)} can vary, not {", ".join(sorted(unknown))}.')
+    variants = {name: np.asarray(value, dtype=np.float64).ravel() for name, value in variants.items()}
+    n_variants = len(next(iter(variants.values()))) if variants else 1
+    if any(len(value) != n_variants for value in variants.values()):
+        raise ValueError('Every varied param needs one value per variant.')
+
+    chunks = [empty_phase_totals(columns)]
+    for start in range(0, n_variants, chunk_size):
+        params = dict(aircraft_params)
+        for name, value in variants.items():
+            params[name] = value[start:start + chunk_size, np.newaxis]
+        _, _, phase_totals = evaluate_route(columns=columns,
+                                            aircraft_params=params,
+                                            wind_magnitude=wind_magnitude,
+                                            wind_angle=wind_angle,
+                                            reference_frame=reference_frame)
+        chunks.append(np.broadcast_to(phase_totals, (min(chunk_size, n_variants - start),) + phase_totals.shape[-3:]))
+    return np.concatenate(chunks)
+
+
+def design_sweep(route, aircraft_params, variants, wind_speed=0.0, wind_direction=0.0,
+                 reference_frame='relative_to_aircraft', flight_directions=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    In-process replacement for rebuilding Aircraft and rerunning a route once per aircraft configuration.
+    :param route: route DataFrame (as read from a route CSV) or RouteColumns
+    :param variants: {param name: array of one value per variant}, see variant_grid
+    :param wind_speed: wind magnitude in mph
+    :param wind_direction: wind direction in degrees, interpreted in reference_frame like Wind does
+    :return: DataFrame with one row per (variant, flight_direction) holding the varied params and the total
+             energy_consumption (kWh) and flight_time (minutes)
+    """
+    columns = route if isinstance(route, RouteColumns) else RouteColumns.from_dataframe(route, flight_directions)
+    phase_totals = evaluate_aircraft_variants(columns=columns,
+                                              aircraft_params=aircraft_params,
+                                              variants=variants,
+                                              wind_magnitude=mph_to_metersec(wind_speed),
+                                              wind_angle=degrees_to_radians(wind_direction),
+                                              reference_frame=reference_frame,
+                                              chunk_size=chunk_size)
+    totals = phase_totals.sum(axis=-2)
+    n_variants, n_flight_directions = totals.shape[:2]
+    table = pd.DataFrame({'variant': np.repeat(np.arange(n_variants), n_flight_directions)})
+    for name, value in variants.items():
+        table[name] = np.repeat(np.asarray(value, dtype=np.float64).ravel(), n_flight_directions)
+    table['flight_direction'] = np.tile(np.asarray(columns.flight_directions, dtype=object), n_variants)
+    table['energy_consumption'] = totals[..., 0].ravel()
+    table['flight_time'] = sec_to_min(totals[..., 1].ravel())
+    return table
@@ -0,0 +1,341 @@
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from collections import deque, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from compiled_route import load_compiled_route
+from flight_metrics import METRIC_PHASES
+from result_cache import ResultCache, DEFAULT_MAX_BYTES
+from utils.helpers import load_config
+from wind_sweep import evaluate_wind_cases
+from utils.units import mph_to_metersec, degrees_to_radians
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+# Batches with at least this many flights are evaluated on the worker pool; smaller ones inline, which is faster
+POOL_MIN_FLIGHTS = 256
+# Flights per worker task
+POOL_TASK_FLIGHTS = 2048
+# Latencies kept per endpoint for the percentiles of /metrics
+LATENCY_WINDOW = 10_000
+MAX_BODY_BYTES = 16 * 2**20
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+               500: 'Internal Server Error'}
+
+# Routes and aircraft configs a pool worker evaluates, set once per process by _init_worker
+_worker_state = {}
+
+
+class RequestError(Exception):
+    """A request the service cannot answer; status is the HTTP status to reply with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _init_worker(route_paths, aircraft_configs):
+    # Workers memory-map the compiled route bundles rather than unpickling the routes
+    _worker_state['routes'] = {name: load_compiled_route(path) for name, path in route_paths.items()}
+    _worker_state['aircraft_configs'] = aircraft_configs
+
+
+def _run_task(task):
+    """Evaluate one group of flights sharing a route, aircraft, payload and reference frame inside a worker."""
+    route, aircraft, payload, reference_frame, wind_speeds, wind_directions = task
+    return evaluate_wind_cases(columns=_worker_state['routes'][route],
+                               aircraft_params=_payload_params(_worker_state['aircraft_configs'][aircraft], payload),
+                               wind_magnitudes=mph_to_metersec(wind_speeds),
+                               wind_angles=degrees_to_radians(wind_directions),
+                               reference_frame=reference_frame)
+
+
+def _payload_params(aircraft_params, payload):
+    return aircraft_params if payload is None else dict(aircraft_params, pax=payload)
+
+
+class ServiceMetrics:
+    """Request counts, errors and latency percentiles per endpoint, plus the number of flights evaluated."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.requests = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.latencies = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+        self.flights = 0
+
+    def record(self, endpoint, seconds, status):
+        self.requests[endpoint] += 1
+        if status >= 400:
+            self.errors[endpoint] += 1
+        self.latencies[endpoint].append(seconds)
+
+    def to_dict(self):
+        uptime = time.monotonic() - self.started
+        endpoints = {}
+        for endpoint, count in self.requests.items():
+            latencies = np.asarray(self.latencies[endpoint]) * 1e3
+            p50, p90, p99 = np.percentile(latencies, (50, 90, 99))
+            endpoints[endpoint] = {'requests': count, 'errors': self.errors[endpoint],
+                                   'requests_per_second': count / uptime,
+                                   'latency_ms': {'p50': p50, 'p90': p90, 'p99': p99, 'max': latencies.max()}}
+        return {'uptime_seconds': uptime, 'flights_evaluated': self.flights,
+                'flights_per_second': self.flights / uptime, 'endpoints': endpoints}
+
+
+class EnergyService:
+    """
+    Energy estimates for (route or origin/destination pair, wind, payload) flights, with routes, aircraft configs
+    and recent results kept in memory between requests.
+    routes maps route names to route CSV paths (served from their compiled bundles, see compiled_route) and
+    aircraft_configs config names to aircraft params JSON paths; the first config is the default.
+    A flight's payload replaces the aircraft's pax. The power model inherits its take-off mass from the original
+    model, mtom - pax * pax_mass, so a larger payload gives a lighter aircraft and a lower energy estimate.
+    """
+
+    def __init__(self, routes, aircraft_configs, workers=0, cache_bytes=DEFAULT_MAX_BYTES):
+        self.route_paths = dict(routes)
+        self.routes = {name: load_compiled_route(path) for name, path in self.route_paths.items()}
+        self.aircraft_configs = {name: load_config(path) for name, path in aircraft_configs.items()}
+        self.default_aircraft = next(iter(self.aircraft_configs))
+        self.cache = ResultCache(max_bytes=cache_bytes)
+        self.metrics = ServiceMetrics()
+        self.pool = None
+        if workers:
+            self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                            initargs=(self.route_paths, self.aircraft_configs))
+        # flight direction -> routes flying it, to resolve origin/destination pairs
+        self.routes_by_direction = defaultdict(list)
+        for name, columns in self.routes.items():
+            for direction in columns.flight_directions:
+                self.routes_by_direction[str(direction)].append(name)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+        self.cache.close()
+
+    def _resolve(self, flight):
+        """Validate one flight request; returns its (route, flight direction or None, aircraft, payload, frame, wind)."""
+        if not isinstance(flight, dict):
+            raise RequestError('A flight must be a JSON object.')
+        direction = flight.get('flight_direction')
+        if 'origin' in flight or 'destination' in flight:
+            direction = f'{flight.get("origin")}_{flight.get("destination")}'
+        route = flight.get('route')
+        if route is None:
+            candidates = self.routes_by_direction.get(direction, []) if direction else list(self.routes)
+            if len(candidates) != 1:
+                raise RequestError(f'{len(candidates)} routes fly {direction or "any direction"}; give a route.')
+            route = candidates[0]
+        if route not in self.routes:
+            raise RequestError(f'Unknown route {route!r}.', status=404)
+        if direction is not None and route not in self.routes_by_direction.get(direction, []):
+            raise RequestError(f'Route {route!r} does not fly {direction!r}.', status=404)
+        aircraft = flight.get('aircraft', self.default_aircraft)
+        if aircraft not in self.aircraft_configs:
+            raise RequestError(f'Unknown aircraft config {aircraft!r}.', status=404)
+        reference_frame = flight.get('reference_frame', 'relative_to_aircraft')
+        if reference_frame not in ('relative_to_aircraft', 'relative_to_north'):
+            raise RequestError('reference_frame must be either "relative_to_aircraft" or "relative_to_north"')
+        try:
+            payload = None if flight.get('payload') is None else float(flight['payload'])
+            wind = (float(flight.get('wind_speed', 0)), float(flight.get('wind_direction', 0)))
+        except (TypeError, ValueError):
+            raise RequestError('payload, wind_speed and wind_direction must be numbers.')
+        # json.loads accepts NaN and Infinity, which would come back as invalid JSON
+        if not all(math.isfinite(value) for value in (*wind, 0 if payload is None else payload)):
+            raise RequestError('payload, wind_speed and wind_direction must be finite.')
+        if wind[0] < 0 or (payload is not None and payload < 0):
+            raise RequestError('payload and wind_speed must not be negative.')
+        return route, direction, aircraft, payload, reference_frame, wind
+
+    def _result(self, route, direction, phase_totals):
+        """JSON result of one flight: energy (kWh) and time (s) per phase and in total, per flight direction."""
+        directions = self.routes[route].flight_directions
+        result = {}
+        for index, name in enumerate(directions):
+            if direction is not None and str(name) != direction:
+                continue
+            totals = phase_totals[index]
+            result[str(name)] = {'energy_consumption': float(totals[:, 0].sum()),
+                                 'flight_time': float(totals[:, 1].sum()),
+                                 'phase_energy': dict(zip(METRIC_PHASES, totals[:, 0].tolist())),
+                                 'phase_time': dict(zip(METRIC_PHASES, totals[:, 1].tolist()))}
+        return {'route': route, 'flight_directions': result}
+
+    def _groups(self, flights):
+        """Resolve flights and group their indices by (route, aircraft, payload, reference frame)."""
+        resolved = [self._resolve(flight) for flight in flights]
+        groups = defaultdict(list)
+        for index, (route, _, aircraft, payload, reference_frame, _) in enumerate(resolved):
+            groups[(route, aircraft, payload, reference_frame)].append(index)
+        return resolved, groups
+
+    def estimate(self, flights):
+        """Evaluate flights in the calling thread, one vectorized (and cached) pass per group."""
+        resolved, groups = self._groups(flights)
+        results = [None] * len(flights)
+        for (route, aircraft, payload, reference_frame), indices in groups.items():
+            winds = np.array([resolved[index][5] for index in indices])
+            phase_totals, _, _ = self.cache.evaluate_wind_cases(
+                columns=self.routes[route],
+                aircraft_params=_payload_params(self.aircraft_configs[aircraft], payload),
+                wind_speeds=winds[:, 0],
+                wind_directions=winds[:, 1],
+                reference_frame=reference_frame)
+            for index, totals in zip(indices, phase_totals):
+                results[index] = self._result(route, resolved[index][1], totals)
+        self.metrics.flights += len(flights)
+        return results
+
+    async def estimate_batch(self, flights):
+        """Evaluate a batch, on the worker pool when it has one and the batch is large enough to pay for it."""
+        if self.pool is None or len(flights) < POOL_MIN_FLIGHTS:
+            return self.estimate(flights)
+        resolved, groups = self._groups(flights)
+        loop = asyncio.get_running_loop()
+        jobs = []
+        for (route, aircraft, payload, reference_frame), indices in groups.items():
+            for start in range(0, len(indices), POOL_TASK_FLIGHTS):
+                chunk = indices[start:start + POOL_TASK_FLIGHTS]
+                winds = np.array([resolved[index][5] for index in chunk])
+                task = (route, aircraft, payload, reference_frame, winds[:, 0], winds[:, 1])
+                jobs.append((route, chunk, loop.run_in_executor(self.pool, _run_task, task)))
+        results = [None] * len(flights)
+        for route, chunk, future in jobs:
+            for index, totals in zip(chunk, await future):
+                results[index] = self._result(route, resolved[index][1], totals)
+        self.metrics.flights += len(flights)
+        return results
+
+    def describe(self):
+        return {'routes': {name: [str(direction) for direction in columns.flight_directions]
+                           for name, columns in self.routes.items()},
+                'aircraft_configs': list(self.aircraft_configs),
+                'default_aircraft': self.default_aircraft}
+
+    async def handle(self, method, path, body):
+        """Route one request; returns (status, JSON-serializable response)."""
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        if path == '/metrics':
+            return 200, dict(self.metrics.to_dict(), cache=dict(self.cache.stats, hit_rate=self.cache.hit_rate()))
+        if path == '/routes':
+            return 200, self.describe()
+        if path not in ('/estimate', '/estimate/batch'):
+            raise RequestError(f'No endpoint {path}.', status=404)
+        if method != 'POST':
+            raise RequestError(f'{path} takes POST requests.', status=405)
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            raise RequestError('The request body is not valid JSON.')
+        if path == '/estimate':
+            return 200, self.estimate([request])[0]
+        flights = request.get('flights') if isinstance(request, dict) else None
+        if not isinstance(flights, list):
+            raise RequestError('A batch is a JSON object with a "flights" list.')
+        return 200, {'results': await self.estimate_batch(flights)}
+
+
+async def _read_request(reader):
+    """Read one HTTP/1.1 request; returns (method, path, headers, body), or None once the client closes."""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, target, _ = request_line.decode('latin-1').split(' ', 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length > MAX_BODY_BYTES:
+        raise RequestError('Request body too large.', status=413)
+    body = await reader.readexactly(length) if length else b''
+    return method.upper(), target.split('?', 1)[0], headers, body
+
+
+def _response(status, payload, keep_alive):
+    body = json.dumps(payload).encode()
+    head = (f'HTTP/1.1 {status} {STATUS_TEXT.get(status, "")}\r\n'
+            f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+    return head.encode('latin-1') + body
+
+
+def connection_handler(service):
+    async def handle_connection(reader, writer):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except (ValueError, asyncio.IncompleteReadError):
+                    break
+                except RequestError as error:
+                    writer.write(_response(error.status, {'error': str(error)}, keep_alive=False))
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                start = time.perf_counter()
+                try:
+                    status, payload = await service.handle(method, path, body)
+                except RequestError as error:
+                    status, payload = error.status, {'error': str(error)}
+                except Exception as error:
+                    logging.exception('Failed to handle %s %s', method, path)
+                    status, payload = 500, {'error': repr(error)}
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                service.metrics.record(path, time.perf_counter() - start, status)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    return handle_connection
+
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    server = await asyncio.start_server(connection_handler(service), host, port)
+    logging.info('Energy service listening on %s:%s', host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def _names(paths, extension):
+    return {os.path.basename(path)[:-len(extension)] if path.endswith(extension) else path: path for path in paths}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve energy estimates over HTTP with routes and aircraft kept warm")
+    parser.add_argument('-f', '--file', nargs='+', required=True, help="Route files; served under their file names")
+    parser.add_argument('-p', '--aircraft_params', nargs='+', default=["data/aircraft_params.json"],
+                        help="Aircraft params files; served under their file names, the first is the default")
+    parser.add_argument('--host', default=DEFAULT_HOST, help="Interface to listen on")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument('-j', '--workers', type=int, default=0,
+                        help=f"Worker processes for batches of {POOL_MIN_FLIGHTS}+ flights (0 = evaluate inline)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    service = EnergyService(routes=_names(args.file, '.csv'),
+                            aircraft_configs=_names(args.aircraft_params, '.json'),
+                            workers=args.workers)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
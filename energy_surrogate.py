@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+from route_engine import RouteColumns
+from utils.helpers import load_config, params_hash
+from utils.interpolation import axis_step, multilinear
+from utils.units import mph_to_metersec, degrees_to_radians, sec_to_min
+from wind_sweep import evaluate_wind_grid, evaluate_wind_cases, DEFAULT_CHUNK_SIZE
+
+# Bump when the bundle layout or the meaning of the table changes
+SURROGATE_VERSION = 1
+META_FILE = 'meta.json'
+TABLE_FILE = 'table.npy'
+# Table axes, in order; the table has two more: flight directions and {energy kWh, flight time minutes}
+AXES = ('distance', 'wind_speed', 'wind_angle', 'payload')
+VALIDATION_POINTS = 256
+
+
+def _periodic_angles(wind_angles):
+    """Wind angle axis extended by one wrapped angle on each side, so any angle mod 360 lies inside it."""
+    wind_angles = np.asarray(wind_angles, dtype=np.float64)
+    if np.any(wind_angles < 0) or np.any(wind_angles >= 360):
+        raise ValueError('wind_angles must lie in [0, 360).')
+    return np.concatenate([wind_angles[-1:] - 360, wind_angles, wind_angles[:1] + 360])
+
+
+def _route_totals(columns, aircraft_params, wind_speeds, wind_angles, reference_frame, chunk_size):
+    """(wind speeds, wind angles, directions, {energy, time}) totals of one route and payload."""
+    phase_totals = evaluate_wind_grid(columns, aircraft_params, wind_speeds, wind_angles, reference_frame, chunk_size)
+    totals = phase_totals.sum(axis=-2).swapaxes(0, 1)
+    totals[..., 1] = sec_to_min(totals[..., 1])
+    return totals
+
+
+class EnergySurrogate:
+    """
+    Trip energy (kWh) and flight time (minutes) per flight direction, precomputed with the route engine over a
+    (distance, wind speed, wind angle, payload) grid and interpolated multilinearly. Distances are route lengths
+    in miles (the routes the grid was built from), wind speeds mph, wind angles degrees in the reference frame the
+    grid was built in and payloads a number of passengers. The wind angle is periodic; the other axes clamp to
+    the edge of the grid.
+    A payload is flown as aircraft_params['pax'], which the power model inherits from the original model: it takes
+    off at mtom - pax * pax_mass, so a larger payload makes the aircraft lighter and the trip cheaper.
+    table has shape (distances, wind speeds, wind angles + 2, payloads, flight directions, 2); its angle axis is
+    wrapped by one angle on each side (see _periodic_angles).
+    """
+
+    def __init__(self, distances, wind_speeds, wind_angles, payloads, flight_directions, table, meta=None):
+        self.wind_angles = np.asarray(wind_angles, dtype=np.float64)
+        self.axes = (np.asarray(distances, dtype=np.float64), np.asarray(wind_speeds, dtype=np.float64),
+                     _periodic_angles(self.wind_angles), np.asarray(payloads, dtype=np.float64))
+        for name, axis in zip(AXES, self.axes):
+            if not len(axis) or np.any(np.diff(axis) <= 0):
+                raise ValueError(f'The {name} axis must be non-empty and strictly ascending.')
+        self.flight_directions = list(flight_directions)
+        expected_shape = tuple(len(axis) for axis in self.axes) + (len(self.flight_directions), 2)
+        if table.shape != expected_shape:
+            raise ValueError(f'table must have shape {expected_shape}, got {table.shape}.')
+        self.table = table
+        self.steps = tuple(axis_step(axis) for axis in self.axes)
+        self.meta = meta or {}
+
+    @classmethod
+    def build(cls, routes, aircraft_params, wind_speeds, wind_angles, payloads,
+              reference_frame='relative_to_aircraft', chunk_size=DEFAULT_CHUNK_SIZE, validation_points=VALIDATION_POINTS,
+              validation_routes=None):
+        """
+        Evaluate the route engine over the grid. routes maps distances (miles) to route DataFrames or RouteColumns
+        flying the same flight directions. wind_angles are degrees in [0, 360); payloads are passenger counts.
+        The result's meta holds the interpolation errors of validate: 'grid_error' at validation_points random
+        off-grid winds and payloads on the grid routes, 'held_out_error' likewise on validation_routes (a dict like
+        routes, of distances between the grid distances) and 'distance_error' from leave_one_out_error.
+        Only held_out_error measures the whole interpolation error between grid distances.
+        """
+        distances = sorted(routes)
+        routes = {distance: route if isinstance(route, RouteColumns) else RouteColumns.from_dataframe(route)
+                  for distance, route in routes.items()}
+        flight_directions = routes[distances[0]].flight_directions
+        if any(routes[distance].flight_directions != flight_directions for distance in distances):
+            raise ValueError('All routes must fly the same flight directions.')
+        wind_speeds = np.asarray(wind_speeds, dtype=np.float64)
+        wind_angles = np.asarray(wind_angles, dtype=np.float64)
+        payloads = np.asarray(payloads, dtype=np.float64)
+
+        grid = np.empty((len(distances), len(wind_speeds), len(wind_angles), len(payloads), len(flight_directions), 2))
+        for i, distance in enumerate(distances):
+            for j, payload in enumerate(payloads):
+                grid[i, :, :, j] = _route_totals(routes[distance], dict(aircraft_params, pax=payload),
+                                                 wind_speeds, wind_angles, reference_frame, chunk_size)
+        table = np.concatenate([grid[:, :, -1:], grid, grid[:, :, :1]], axis=2)
+        meta = {'reference_frame': reference_frame, 'aircraft_params_hash': params_hash(aircraft_params)}
+        surrogate = cls(distances, wind_speeds, wind_angles, payloads, flight_directions, table, meta)
+        if validation_points:
+            surrogate.meta['grid_error'] = surrogate.validate(routes, aircraft_params, validation_points,
+                                                              chunk_size=chunk_size)
+            if validation_routes:
+                surrogate.meta['held_out_error'] = surrogate.validate(validation_routes, aircraft_params,
+                                                                      validation_points, chunk_size=chunk_size)
+        if len(distances) > 2:
+            surrogate.meta['distance_error'] = surrogate.leave_one_out_error()
+        return surrogate
+
+    def query(self, distance, wind_speed, wind_angle, payload):
+        """
+        Interpolated (energy kWh, flight time minutes) at broadcastable arrays of grid coordinates, each of shape
+        points + (flight directions,). payload is aircraft_params['pax'], so energy falls as it rises (see the class).
+        """
+        totals = multilinear(self.axes, self.steps, self.table,
+                             (distance, wind_speed, np.mod(wind_angle, 360), payload))
+        return totals[..., 0], totals[..., 1]
+
+    def validate(self, routes, aircraft_params, points=VALIDATION_POINTS, seed=0, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Largest absolute and relative error of the surrogate against the route engine. For every route (a dict of
+        distance in miles to route) and every payload half way between grid payloads, points random winds within the
+        grid are flown with the full model. Routes at grid distances only measure the error along the wind and
+        payload axes; pass routes between grid distances to include the error along the distance axis.
+        :return: {'energy_consumption': {'absolute': kWh, 'relative': ...}, 'flight_time': {'absolute': minutes, ...}}
+        """
+        rng = np.random.default_rng(seed)
+        payload_axis = self.axes[3]
+        payloads = (payload_axis[:-1] + payload_axis[1:]) / 2 if len(payload_axis) > 1 else payload_axis
+        reference_frame = self.meta.get('reference_frame', 'relative_to_aircraft')
+        errors = np.zeros((2, 2))  # {energy, time} x {absolute, relative}
+        for distance, route in routes.items():
+            columns = route if isinstance(route, RouteColumns) else RouteColumns.from_dataframe(route)
+            for payload in payloads:
+                wind_speeds = rng.uniform(self.axes[1][0], self.axes[1][-1], points)
+                wind_angles = rng.uniform(0, 360, points)
+                phase_totals = evaluate_wind_cases(columns, dict(aircraft_params, pax=payload),
+                                                   mph_to_metersec(wind_speeds), degrees_to_radians(wind_angles),
+                                                   reference_frame, chunk_size)
+                expected = phase_totals.sum(axis=-2)
+                expected[..., 1] = sec_to_min(expected[..., 1])
+                predicted = np.stack(self.query(distance, wind_speeds, wind_angles, payload), axis=-1)
+                absolute = np.abs(predicted - expected).reshape(-1, 2).max(axis=0)
+                relative = (np.abs(predicted - expected) / np.abs(expected)).reshape(-1, 2).max(axis=0)
+                errors = np.maximum(errors, np.stack([absolute, relative], axis=-1))
+        return {metric: {'absolute': float(errors[i, 0]), 'relative': float(errors[i, 1])}
+                for i, metric in enumerate(('energy_consumption', 'flight_time'))}
+
+    def leave_one_out_error(self):
+        """
+        Largest absolute and relative error of interpolating each inner grid distance from its two neighbours, over
+        every grid wind, payload and flight direction. The spacing is doubled, so this overstates the error between
+        grid distances; it needs no route engine runs and at least three distances.
+        :return: same layout as validate
+        """
+        distances = self.axes[0]
+        weight = ((distances[1:-1] - distances[:-2]) / (distances[2:] - distances[:-2]))
+        weight = weight.reshape((-1,) + (1,) * (self.table.ndim - 1))
+        table = np.asarray(self.table, dtype=np.float64)
+        predicted = table[:-2] + weight * (table[2:] - table[:-2])
+        expected = table[1:-1]
+        absolute = np.abs(predicted - expected).reshape(-1, 2).max(axis=0, initial=0.0)
+        relative = (np.abs(predicted - expected) / np.abs(expected)).reshape(-1, 2).max(axis=0, initial=0.0)
+        return {metric: {'absolute': float(absolute[i]), 'relative': float(relative[i])}
+                for i, metric in enumerate(('energy_consumption', 'flight_time'))}
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        # float32 keeps the table compact; its rounding is far below the interpolation error
+        np.save(os.path.join(path, TABLE_FILE), np.asarray(self.table, dtype=np.float32))
+        meta = dict(self.meta,
+                    version=SURROGATE_VERSION,
+                    distances=self.axes[0].tolist(),
+                    wind_speeds=self.axes[1].tolist(),
+                    wind_angles=self.wind_angles.tolist(),
+                    payloads=self.axes[3].tolist(),
+                    flight_directions=self.flight_directions)
+        with open(os.path.join(path, META_FILE), 'w') as file:
+            json.dump(meta, file, indent=4)
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        with open(os.path.join(path, META_FILE), 'r') as file:
+            meta = json.load(file)
+        if meta.get('version') != SURROGATE_VERSION:
+            raise ValueError(f'{path} was written by surrogate version {meta.get("version")}, '
+                             f'expected {SURROGATE_VERSION}.')
+        table = np.load(os.path.join(path, TABLE_FILE), mmap_mode='r' if mmap else None)
+        return cls(meta.pop('distances'), meta.pop('wind_speeds'), meta.pop('wind_angles'), meta.pop('payloads'),
+                   meta.pop('flight_directions'), table, meta)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute an interpolated energy and flight time surrogate")
+    parser.add_argument('-f', '--file', nargs='+', required=True, help="Paths to the route files")
+    parser.add_argument('-d', '--distances', type=float, nargs='+', required=True,
+                        help="Distance (miles) of each route file, in the same order")
+    parser.add_argument('-p', '--aircraft_params', default="data/aircraft_params.json", help="Aircraft params file")
+    parser.add_argument('-ws', '--wind_speeds', type=float, nargs=3, default=[0, 50, 2.5], metavar=('START', 'STOP', 'STEP'),
+                        help="Wind speed axis (mph), stop included")
+    parser.add_argument('-wa', '--wind_angle_step', type=float, default=5, help="Wind angle axis spacing (degrees)")
+    parser.add_argument('-pax', '--payloads', type=float, nargs='+', default=[0, 1, 2, 3, 4],
+                        help="Payload axis (passengers)")
+    parser.add_argument('-rf', '--reference_frame', choices=['relative_to_aircraft', 'relative_to_north'],
+                        default='relative_to_aircraft', help="Frame the wind angles are given in")
+    parser.add_argument('-vf', '--validation_file', nargs='+', default=[],
+                        help="Held-out route files between the grid distances, to measure the interpolation error along "
+                             "the distance axis")
+    parser.add_argument('-vd', '--validation_distances', type=float, nargs='+', default=[],
+                        help="Distance (miles) of each held-out route file, in the same order")
+    parser.add_argument('-o', '--output', required=True, help="Directory to write the surrogate bundle to")
+    args = parser.parse_args()
+    if len(args.file) != len(args.distances):
+        parser.error('give one distance per route file')
+    if len(args.validation_file) != len(args.validation_distances):
+        parser.error('give one validation distance per validation route file')
+
+    start, stop, step = args.wind_speeds
+    surrogate = EnergySurrogate.build(routes={distance: pd.read_csv(path) for distance, path in zip(args.distances, args.file)},
+                                      aircraft_params=load_config(args.aircraft_params),
+                                      wind_speeds=np.arange(start, stop + step / 2, step),
+                                      wind_angles=np.arange(0, 360, args.wind_angle_step),
+                                      payloads=args.payloads,
+                                      reference_frame=args.reference_frame,
+                                      validation_routes={distance: pd.read_csv(path) for distance, path
+                                                         in zip(args.validation_distances, args.validation_file)})
+    surrogate.save(args.output)
+    print(f'Saved {args.output}')
+    errors = {'grid_error': 'Error at grid distances (wind and payload axes only)',
+              'held_out_error': 'Error on held-out routes between grid distances',
+              'distance_error': 'Leave-one-out error along the distance axis (doubled spacing)'}
+    for key, label in errors.items():
+        if key in surrogate.meta:
+            print(f'{label}: {json.dumps(surrogate.meta[key])}')
@@ -1,4 +1,6 @@
 import numpy as np
+import pandas as pd
+from functools import lru_cache
 
 G_CONSTANT = 9.80665  # m/s^2
 
@@ -39,10 +41,17 @@ def climb_power_consumption_for_drag(altitude, atmosphere_condition, wing_area,
 def weight(mass):
     """
     Computes the weight of an aircraft given its mass
-    :param mass: in kg
-    :return: weight in N
-    """
-    return round(mass * G_CONSTANT)
+    :param mass: in kg (or an array of masses)
+    :return: weight in N, rounded to the Newton
+    """
+    weight = mass * G_CONSTANT
+    if isinstance(weight, float):
+        # Python's round also rounds half to even, without np.round's dispatch overhead on scalars
+        return np.float64(round(weight))
+    if np.iscomplexobj(weight):
+        # Complex-step derivatives (see route_derivatives) pass through the rounding
+        return np.round(weight.real) + 1j * weight.imag
+    return np.round(weight)
 
 def rotor_disk_area(mtom, disk_load):
     """
@@ -53,32 +62,124 @@ def rotor_disk_area(mtom, disk_load):
     """
     return mtom / disk_load
 
+# Ground temperature [K] and ground density [kg/m^3] of each atmosphere condition
+ATMOSPHERE_CONDITIONS = {
+    'good': (288.15, 1.225),
+    'bad': (300, 0.974)
+}
+
+# Altitude envelope of the precomputed atmosphere tables. The resolution is a power of two so that grid altitudes are
+# exact binary fractions: whole-meter (and 1/8 m) altitudes hit a grid point exactly.
+TABLE_MIN_ALTITUDE = -500  # m
+TABLE_MAX_ALTITUDE = 6000  # m
+TABLE_RESOLUTION = 0.125  # m
+
+_atmosphere_tables = {}
+
+
 def atmosphere_params(condition: str):
-    if condition == 'good':
-        tgl = 288.15 # Ground temperature [K]
-        dgl = 1.225 # Ground density [kg/m^3]
-        return tgl, dgl
-    elif condition == 'bad':
-        tgl = 300 # Ground temperature [K]
-        dgl = 0.974 # Ground density [kg/m^3]
-        return tgl, dgl
-    else:
-        raise ValueError('Invalid atmosphere condition. Choose between "good" and "bad"')
-
-def rho(altitude: float, atmosphere_condition: str='good'):
+    try:
+        return ATMOSPHERE_CONDITIONS[condition]
+    except KeyError:
+        raise ValueError(f'Invalid atmosphere condition. Choose between {", ".join(repr(c) for c in ATMOSPHERE_CONDITIONS)}') from None
+
+
+def register_atmosphere_condition(condition: str, ground_temperature: float, ground_density: float):
+    """
+    Adds a custom atmosphere condition (e.g. a hot-and-high day) usable as aircraft_params['atmosphere_condition']
+    :param ground_temperature: in K
+    :param ground_density: in kg/m^3
+    """
+    ATMOSPHERE_CONDITIONS[condition] = (ground_temperature, ground_density)
+    _atmosphere_tables.pop(condition, None)
+    _scalar_density.cache_clear()
+
+
+DENSITY_EXPONENT = (G_CONSTANT/(287*6.5*10**-3))-1
+
+
+def _density(altitude, atmosphere_condition):
+    tgl, dgl = atmosphere_params(atmosphere_condition)
+    density = dgl * (temperature(altitude)/tgl)**DENSITY_EXPONENT
+    return np.round(density, 4) if isinstance(density, np.ndarray) else round(density, 4)
+
+
+@lru_cache(maxsize=4096)
+def _scalar_density(altitude, atmosphere_condition):
+    return _density(altitude, atmosphere_condition)
+
+
+class AtmosphereTable:
+    """Density and temperature of one atmosphere condition, tabulated over the altitude envelope."""
+
+    def __init__(self, atmosphere_condition: str):
+        self.atmosphere_condition = atmosphere_condition
+        n_points = int((TABLE_MAX_ALTITUDE - TABLE_MIN_ALTITUDE) / TABLE_RESOLUTION) + 1
+        self.altitude = TABLE_MIN_ALTITUDE + np.arange(n_points) * TABLE_RESOLUTION
+        self.density = _density(self.altitude, atmosphere_condition)
+        self.temperature = temperature(self.altitude)
+
+    def lookup(self, table, altitude, exact_fallback, interpolate=False):
+        """
+        Look altitudes up in one of the tables.
+        Exact mode returns table values where the altitude falls on a grid point and exact_fallback(altitude) elsewhere,
+        so it always matches the closed-form result. Interpolate mode interpolates linearly between grid points.
+        Altitudes outside the envelope always use exact_fallback.
+        """
+        altitude = np.asarray(altitude, dtype=np.float64)
+        last = len(table) - 1
+        position = (altitude - TABLE_MIN_ALTITUDE) * (1 / TABLE_RESOLUTION)
+        index = position.astype(np.int64)
+        if interpolate:
+            fraction = position - index
+            lower = table.take(index, mode='clip')
+            values = lower + fraction * (table.take(index + 1, mode='clip') - lower)
+            covered = (position >= 0) & (position <= last)
+        else:
+            values = table.take(index, mode='clip')
+            covered = (index == position) & (index >= 0) & (index <= last)
+        if not covered.all():
+            # take made a fresh array; only the altitudes the table misses go through the closed form
+            values = np.asarray(values)
+            uncovered = ~covered
+            values[uncovered] = exact_fallback(altitude[uncovered])
+        return values[()] if values.ndim == 0 else values
+
+    def density_at(self, altitude, interpolate=False):
+        return self.lookup(self.density, altitude, lambda a: _density(a, self.atmosphere_condition), interpolate)
+
+    def temperature_at(self, altitude, interpolate=False):
+        return self.lookup(self.temperature, altitude, temperature, interpolate)
+
+
+def atmosphere_table(atmosphere_condition: str = 'good') -> AtmosphereTable:
+    """Returns the (cached) atmosphere table of a condition, building it on first use."""
+    table = _atmosphere_tables.get(atmosphere_condition)
+    if table is None:
+        table = _atmosphere_tables[atmosphere_condition] = AtmosphereTable(atmosphere_condition)
+    return table
+
+
+def rho(altitude: float, atmosphere_condition: str='good', interpolate: bool=False):
     """
     Computes the air density at a given altitude
-    :param altitude: in m
+    :param altitude: in m, scalar or array
+    :param interpolate: interpolate the density table instead of matching grid altitudes exactly
     :return: air density in kg/m^3
     """
-    tgl, dgl = atmosphere_params(atmosphere_condition)
-    return round(dgl * (temperature(altitude)/tgl)**((G_CONSTANT/(287*6.5*10**-3))-1), 4)
+    if interpolate or np.ndim(altitude) > 0 or isinstance(altitude, np.ndarray):
+        density = atmosphere_table(atmosphere_condition).density_at(altitude, interpolate)
+        # A Series keeps its index, as it did with the closed-form expression
+        return pd.Series(density, index=altitude.index) if isinstance(altitude, pd.Series) else density
+    # Routes only use a handful of altitudes, so single values are memoized rather than looked up
+    return _scalar_density(altitude, atmosphere_condition)
 
 def stall_speed(atmosphere_condition, altitude, mtom, wing_area, cl_max):
     """
     Computes the stall speed of an aircraft given its mass
     :param mass: in kg
+    :param altitude: in m, scalar or array
     :return: stall speed in m/s
     """
-    return round(np.sqrt((2*weight(mtom))/(rho(altitude, atmosphere_condition)*wing_area*cl_max)))
+    return np.round(np.sqrt((2*weight(mtom))/(rho(altitude, atmosphere_condition)*wing_area*cl_max)))
 
@@ -0,0 +1,103 @@
+from collections.abc import MutableMapping
+import numpy as np
+import pandas as pd
+
+# Phases metrics are kept for, in route phase code order
+METRIC_PHASES = ('hover_climb', 'climb_transition', 'climb', 'cruise', 'descent', 'descent_transition', 'hover_descent')
+METRIC_PHASE_INDEX = {phase: index for index, phase in enumerate(METRIC_PHASES)}
+# Index of the last totals axis
+ENERGY, TIME = 0, 1
+
+
+class PhaseTotalsView(MutableMapping):
+    """
+    {phase: value} view of one quantity (ENERGY or TIME) of one flight direction of a totals array. Reads and writes
+    go straight to the array, so metrics[direction]['phase_energy']['cruise'] += x updates the totals.
+    """
+    __slots__ = ('totals', 'direction', 'quantity')
+
+    def __init__(self, totals, direction, quantity):
+        self.totals = totals
+        self.direction = direction
+        self.quantity = quantity
+
+    def __getitem__(self, phase):
+        value = self.totals[..., self.direction, METRIC_PHASE_INDEX[phase], self.quantity]
+        return value[()] if value.ndim == 0 else value
+
+    def __setitem__(self, phase, value):
+        self.totals[..., self.direction, METRIC_PHASE_INDEX[phase], self.quantity] = value
+
+    def __delitem__(self, phase):
+        raise TypeError('Phases cannot be removed from flight metrics.')
+
+    def __iter__(self):
+        return iter(METRIC_PHASES)
+
+    def __len__(self):
+        return len(METRIC_PHASES)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class FlightMetrics:
+    """
+    Phase energy (kWh) and time (s) of every flight direction, held in a totals array of shape
+    (..., directions, phases, 2); leading axes are batched wind cases, if any.
+    Indexing by flight direction returns {'phase_energy': {...}, 'phase_time': {...}} like the dicts Aircraft.metrics
+    used to hold, with PhaseTotalsView writing through to totals, so metrics[direction]['phase_energy']['cruise'] keeps
+    working for reads and in-place updates alike.
+    """
+    __slots__ = ('flight_directions', 'direction_index', 'totals')
+
+    def __init__(self, flight_directions, totals=None):
+        self.flight_directions = list(flight_directions)
+        self.direction_index = {direction: index for index, direction in enumerate(self.flight_directions)}
+        self.totals = np.zeros((len(self.flight_directions), len(METRIC_PHASES), 2)) if totals is None else totals
+
+    def add(self, flight_direction, phase, energy=0.0, time=0.0):
+        """Add energy and time to a phase ('cruise' or its METRIC_PHASES index) of an unbatched direction."""
+        totals = self.totals[self.direction_index[flight_direction], METRIC_PHASE_INDEX.get(phase, phase)]
+        totals[ENERGY] += energy
+        totals[TIME] += time
+
+    def total_energy_consumption(self):
+        """Total energy (kWh) per direction, shape (..., directions)."""
+        return self.totals[..., ENERGY].sum(axis=-1)
+
+    def total_flight_time(self):
+        """Total flight time (s) per direction, shape (..., directions)."""
+        return self.totals[..., TIME].sum(axis=-1)
+
+    def to_dataframe(self):
+        """One row per (flight_direction, phase) with its energy_consumption (kWh) and flight_time (s)."""
+        if self.totals.ndim != 3:
+            raise ValueError('to_dataframe needs unbatched metrics; index the wind cases first.')
+        index = pd.MultiIndex.from_product([self.flight_directions, METRIC_PHASES], names=['flight_direction', 'phase'])
+        return pd.DataFrame(self.totals.reshape(-1, 2), index=index, columns=['energy_consumption', 'flight_time'])
+
+    def to_dict(self):
+        """Plain dict-of-dicts copy of the metrics."""
+        return {direction: {quantity: dict(phases) for quantity, phases in self[direction].items()}
+                for direction in self.flight_directions}
+
+    def __getitem__(self, flight_direction):
+        direction = self.direction_index[flight_direction]
+        return {'phase_energy': PhaseTotalsView(self.totals, direction, ENERGY),
+                'phase_time': PhaseTotalsView(self.totals, direction, TIME)}
+
+    def __iter__(self):
+        return iter(self.flight_directions)
+
+    def __len__(self):
+        return len(self.flight_directions)
+
+    def keys(self):
+        return list(self.flight_directions)
+
+    def items(self):
+        return [(direction, self[direction]) for direction in self.flight_directions]
+
+    def __repr__(self):
+        return f'FlightMetrics({self.to_dict()!r})'
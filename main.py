@@ -1,8 +1,24 @@
 import argparse
+import numpy as np
 import pandas as pd
 from aircraft import Aircraft
-from utils.helpers import load_config, update_is_first_last_time, save_to_database
+from utils.helpers import load_config, preprocess_route, save_to_database
 from wind.wind import Wind
+from wind.wind_field import WindField, FieldWind
+from route_engine import compute_energy_consumption_vectorized
+from sweep_executor import parallel_sweep
+from route_stream import stream_route_energy
+from utils.tracing import enable_tracing, disable_tracing
+from utils.profiling import Profiler
+from wind_ensemble import WindDistribution, wind_ensemble
+from wind_climatology import read_observations, replay_climatology, aggregate
+from design_sweep import variant_grid, design_sweep
+from route_engine import VARIANT_PARAMS
+from route_derivatives import route_derivatives
+from sensitivity import default_bounds, sobol_analysis, morris_analysis, WIND_INPUTS, DEFAULT_RELATIVE_RANGE
+from cruise_optimizer import optimal_cruise_speeds
+from results_store import ResultsStore
+from compiled_route import file_hash
 import logging
 import datetime
 import os
@@ -62,35 +78,223 @@ def setup_logging():
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description="Compute Energy Consumption for Flight Profile")
-    parser.add_argument('-f', '--file', required=True, help="Path to the route file")
-    parser.add_argument('-ws', '--wind_speed', type=int, required=True, help="Wind speed (int)")
-    parser.add_argument('-wd', '--wind_direction', type=int, required=True, help="Wind direction (int)")
-    return parser.parse_args()
+    parser.add_argument('-f', '--file', help="Path to the route file")
+    parser.add_argument('-ws', '--wind_speed', type=int, help="Wind speed (int)")
+    parser.add_argument('-wd', '--wind_direction', type=int, help="Wind direction (int)")
+    parser.add_argument('-e', '--engine', choices=['vectorized', 'loop'], default='vectorized',
+                        help="Vectorized route engine or the original row-by-row phase loop")
+    parser.add_argument('-t', '--trace',
+                        help="Write per-phase events and timing counters of Aircraft and Wind to this JSON file "
+                             "(the vectorized engine times whole routes rather than every phase)")
+    parser.add_argument('-pr', '--profile', metavar='FOLDED_FILE',
+                        help="Print the wall time and allocations of every pipeline stage and write the stage stacks "
+                             "to this file in flamegraph (collapsed stack) format")
+    parser.add_argument('-wf', '--wind_field', metavar='WIND_FIELD_DIR',
+                        help="Sample the wind along the route from this gridded wind field bundle instead of using "
+                             "a constant --wind_speed and --wind_direction")
+    parser.add_argument('-d', '--derivatives', action='store_true',
+                        help="Also print the derivatives of every direction's energy and flight time with respect to "
+                             "the aircraft params and the wind")
+    parser.add_argument('-s', '--stream', action='store_true',
+                        help="Read and evaluate the route one flight direction at a time (rows must be grouped by "
+                             "flight_direction), writing results as each direction completes")
 
+    subparsers = parser.add_subparsers(dest='command')
+    sweep_parser = subparsers.add_parser('sweep', help="Evaluate a grid of wind speeds and directions in one process")
+    sweep_parser.add_argument('-f', '--file', nargs='+', required=True, help="Paths to the route files")
+    sweep_parser.add_argument('-p', '--aircraft_params', nargs='+', default=["data/aircraft_params.json"],
+                              help="Paths to the aircraft params files")
+    sweep_parser.add_argument('-ws', '--wind_speeds', type=float, nargs='+', required=True, help="Wind speeds (mph)")
+    sweep_parser.add_argument('-wd', '--wind_directions', type=float, nargs='+', required=True, help="Wind directions (degrees)")
+    sweep_parser.add_argument('-rf', '--reference_frame', choices=['relative_to_aircraft', 'relative_to_north'],
+                              default='relative_to_aircraft', help="Frame the wind directions are given in")
+    sweep_parser.add_argument('-j', '--workers', type=int, default=1, help="Worker processes (0 = one per core)")
+    sweep_parser.add_argument('-o', '--output', help="CSV file to write the sweep results to")
+    sweep_parser.add_argument('-db', '--database', help="sqlite results store to add the sweep results to")
+    sweep_parser.add_argument('-pr', '--profile', metavar='FOLDED_FILE', default=argparse.SUPPRESS,
+                              help="Same as the top-level --profile")
 
-if __name__ == "__main__":
-    # setup_logging()
-    args = parse_arguments()
+    ensemble_parser = subparsers.add_parser('ensemble', help="Energy and flight time quantiles under random winds")
+    ensemble_parser.add_argument('-f', '--file', required=True, help="Path to the route file")
+    ensemble_parser.add_argument('-p', '--aircraft_params', default="data/aircraft_params.json", help="Aircraft params file")
+    distribution = ensemble_parser.add_mutually_exclusive_group(required=True)
+    distribution.add_argument('--weibull', type=float, nargs=2, metavar=('SHAPE', 'SCALE_MPH'),
+                              help="Weibull wind speed distribution (directions follow --von_mises)")
+    distribution.add_argument('--empirical', metavar='CSV',
+                              help="CSV of observed wind_speed_mph, wind_direction_degrees (and optional weight)")
+    ensemble_parser.add_argument('--von_mises', type=float, nargs=2, default=[0.0, 0.0], metavar=('MEAN_DEGREES', 'KAPPA'),
+                                 help="von Mises wind direction distribution (default: uniform)")
+    ensemble_parser.add_argument('-n', '--samples', type=int, default=20000, help="Maximum number of wind samples")
+    ensemble_parser.add_argument('-q', '--quantiles', type=float, nargs='+', default=[0.5, 0.9, 0.99])
+    ensemble_parser.add_argument('--tolerance', type=float,
+                                 help="Stop early once no quantile moves by more than this (relative) over a batch")
+    ensemble_parser.add_argument('--seed', type=int, help="Random seed")
+    ensemble_parser.add_argument('-rf', '--reference_frame', choices=['relative_to_aircraft', 'relative_to_north'],
+                                 default='relative_to_aircraft', help="Frame the wind directions are given in")
+    ensemble_parser.add_argument('-o', '--output', help="CSV file to write the quantiles to")
+    ensemble_parser.add_argument('-pr', '--profile', metavar='FOLDED_FILE', default=argparse.SUPPRESS,
+                                 help="Same as the top-level --profile")
+
+    climatology_parser = subparsers.add_parser('climatology', help="Replay a record of wind observations against routes")
+    climatology_parser.add_argument('-f', '--file', nargs='+', required=True, help="Paths to the route files")
+    climatology_parser.add_argument('-p', '--aircraft_params', default="data/aircraft_params.json", help="Aircraft params file")
+    climatology_parser.add_argument('-ob', '--observations', required=True,
+                                    help="CSV of timestamp, wind_speed_mph, wind_direction_degrees observations")
+    climatology_parser.add_argument('-rf', '--reference_frame', choices=['relative_to_aircraft', 'relative_to_north'],
+                                    default='relative_to_north', help="Frame the wind directions are given in")
+    climatology_parser.add_argument('-o', '--output', help="CSV file to write the time series to")
+    climatology_parser.add_argument('--seasonal', help="CSV file to write the seasonal aggregates to")
+    climatology_parser.add_argument('--hourly', help="CSV file to write the hour-of-day aggregates to")
+    climatology_parser.add_argument('-pr', '--profile', metavar='FOLDED_FILE', default=argparse.SUPPRESS,
+                                    help="Same as the top-level --profile")
+
+    design_parser = subparsers.add_parser('design', help="Evaluate a route for a grid of aircraft param variants")
+    design_parser.add_argument('-f', '--file', required=True, help="Path to the route file")
+    design_parser.add_argument('-p', '--aircraft_params', default="data/aircraft_params.json", help="Base aircraft params file")
+    design_parser.add_argument('-v', '--vary', nargs='+', action='append', required=True, metavar=('PARAM', 'VALUES'),
+                               help=f"An aircraft param and the values to try; repeat for a full factorial grid. "
+                                    f"One of {', '.join(VARIANT_PARAMS)}")
+    design_parser.add_argument('-ws', '--wind_speed', type=float, default=0, help="Wind speed (mph)")
+    design_parser.add_argument('-wd', '--wind_direction', type=float, default=0, help="Wind direction (degrees)")
+    design_parser.add_argument('-rf', '--reference_frame', choices=['relative_to_aircraft', 'relative_to_north'],
+                               default='relative_to_aircraft', help="Frame the wind direction is given in")
+    design_parser.add_argument('-o', '--output', help="CSV file to write the variant results to")
+    design_parser.add_argument('-pr', '--profile', metavar='FOLDED_FILE', default=argparse.SUPPRESS,
+                               help="Same as the top-level --profile")
+
+    sensitivity_parser = subparsers.add_parser('sensitivity', help="Sobol or Morris sensitivity of trip energy to the "
+                                                                    "aircraft params and the wind")
+    sensitivity_parser.add_argument('-f', '--file', required=True, help="Path to the route file")
+    sensitivity_parser.add_argument('-p', '--aircraft_params', default="data/aircraft_params.json", help="Aircraft params file")
+    sensitivity_parser.add_argument('-m', '--method', choices=['sobol', 'morris'], default='sobol')
+    sensitivity_parser.add_argument('-n', '--samples', type=int, default=10000,
+                                    help="Base samples (sobol) or trajectories (morris)")
+    sensitivity_parser.add_argument('-b', '--bounds', nargs=3, action='append', metavar=('INPUT', 'LOW', 'HIGH'),
+                                    help=f"Range of an input, one of {', '.join(VARIANT_PARAMS + WIND_INPUTS)}; repeat. "
+                                         f"Default: every input, aircraft params within --relative_range of their value")
+    sensitivity_parser.add_argument('--relative_range', type=float, default=DEFAULT_RELATIVE_RANGE,
+                                    help="Default range of the aircraft params, as a fraction of their value")
+    sensitivity_parser.add_argument('--metric', choices=['energy_consumption', 'flight_time'], default='energy_consumption')
+    sensitivity_parser.add_argument('-rf', '--reference_frame', choices=['relative_to_aircraft', 'relative_to_north'],
+                                    default='relative_to_aircraft', help="Frame the wind directions are given in")
+    sensitivity_parser.add_argument('-j', '--workers', type=int, default=0, help="Worker processes (0 = one per core)")
+    sensitivity_parser.add_argument('--seed', type=int, help="Random seed")
+    sensitivity_parser.add_argument('-o', '--output', help="CSV file to write the indices to")
+    sensitivity_parser.add_argument('-pr', '--profile', metavar='FOLDED_FILE', default=argparse.SUPPRESS,
+                                    help="Same as the top-level --profile")
+
+    cruise_parser = subparsers.add_parser('cruise', help="Energy-optimal cruise airspeed of every cruise segment for a "
+                                                         "grid of wind speeds and directions")
+    cruise_parser.add_argument('-f', '--file', required=True, help="Path to the route file")
+    cruise_parser.add_argument('-p', '--aircraft_params', default="data/aircraft_params.json", help="Aircraft params file")
+    cruise_parser.add_argument('-ws', '--wind_speeds', type=float, nargs='+', required=True, help="Wind speeds (mph)")
+    cruise_parser.add_argument('-wd', '--wind_directions', type=float, nargs='+', required=True, help="Wind directions (degrees)")
+    cruise_parser.add_argument('-rf', '--reference_frame', choices=['relative_to_aircraft', 'relative_to_north'],
+                               default='relative_to_aircraft', help="Frame the wind directions are given in")
+    cruise_parser.add_argument('-tw', '--time_weight', type=float, default=0.0,
+                               help="kWh one minute of flight time is worth (0 minimizes energy alone)")
+    cruise_parser.add_argument('-o', '--output', help="CSV file to write the per-segment results to")
+    cruise_parser.add_argument('-pr', '--profile', metavar='FOLDED_FILE', default=argparse.SUPPRESS,
+                               help="Same as the top-level --profile")
+
+    args = parser.parse_args()
+    if args.command == 'design' and any(len(vary) < 2 or vary[0] not in VARIANT_PARAMS for vary in args.vary):
+        parser.error(f'--vary takes one of {", ".join(VARIANT_PARAMS)} followed by its values')
+    if args.command is None and args.file is None:
+        parser.error('the following arguments are required: -f/--file')
+    if args.command is None and args.wind_field is None and (args.wind_speed is None or args.wind_direction is None):
+        parser.error('the following arguments are required: -ws/--wind_speed, -wd/--wind_direction (or -wf/--wind_field)')
+    if args.command is None and args.wind_field is not None and args.stream:
+        parser.error('-wf/--wind_field cannot be combined with -s/--stream')
+    return args
 
-    route = pd.read_csv(args.file)
+
+def run_sweep(args, profiler=None):
+    profiler = profiler or Profiler(enabled=False)
+    results = parallel_sweep(routes=args.file,
+                             aircraft_configs=args.aircraft_params,
+                             wind_speeds=args.wind_speeds,
+                             wind_directions=args.wind_directions,
+                             reference_frame=args.reference_frame,
+                             workers=args.workers or None,
+                             profiler=profiler)
+    if args.database:
+        with profiler.stage('sqlite write'), ResultsStore(args.database) as store:
+            store.add_sweep(results,
+                            aircraft_configs={path: load_config(path) for path in args.aircraft_params},
+                            route_hashes={path: file_hash(path) for path in args.file},
+                            reference_frame=args.reference_frame)
+    if args.output:
+        with profiler.stage('CSV write'):
+            results.to_csv(args.output, index=False)
+    elif not args.database:
+        print(results.to_string(index=False))
+
+
+def run_ensemble(args, profiler):
+    with profiler.stage('CSV load'):
+        route = pd.read_csv(args.file)
+        aircraft_params = load_config(args.aircraft_params)
+        if args.empirical:
+            distribution = WindDistribution.from_csv(args.empirical)
+        else:
+            distribution = WindDistribution.weibull_von_mises(*args.weibull, *args.von_mises)
+    with profiler.stage('wind ensemble'):
+        results = wind_ensemble(route=route,
+                                aircraft_params=aircraft_params,
+                                distribution=distribution,
+                                n_samples=args.samples,
+                                quantiles=args.quantiles,
+                                reference_frame=args.reference_frame,
+                                tolerance=args.tolerance,
+                                seed=args.seed)
+    _write_results(args, profiler, results)
+
+
+def _write_results(args, profiler, results):
+    if args.output:
+        with profiler.stage('CSV write'):
+            results.to_csv(args.output, index=False)
+    else:
+        print(results.to_string(index=False))
+
+
+def run_single(args, profiler):
+    with profiler.stage('CSV load'):
+        route = pd.read_csv(args.file)
     flight_directions = route['flight_direction'].unique()
     logging.info(f"Computing energy consumption for flight directions: {flight_directions}")
 
-    route = update_is_first_last_time(route, flight_directions)
+    with profiler.stage('preprocessing'):
+        route = preprocess_route(route, flight_directions, overwrite=False)
 
     reference_frame = 'relative_to_aircraft'
     wind_magnitude_mph = args.wind_speed
     wind_direction_degrees = args.wind_direction
 
-    wind = Wind(reference_frame=reference_frame,
-                wind_direction_degrees=wind_direction_degrees, 
-                wind_magnitude_mph=wind_magnitude_mph)
+    if args.wind_field:
+        with profiler.stage('wind field load'):
+            wind = FieldWind(WindField.load(args.wind_field))
+        reference_frame = wind.reference_frame
+        wind_magnitude_mph = wind_direction_degrees = None
+    else:
+        wind = Wind(reference_frame=reference_frame,
+                    wind_direction_degrees=wind_direction_degrees, 
+                    wind_magnitude_mph=wind_magnitude_mph)
 
     aircraft_params = load_config("data/aircraft_params.json")
     aircraft = Aircraft(aircraft_params=aircraft_params, flight_directions=flight_directions, wind=wind)
-    updated_route = compute_energy_consumption(route, flight_directions, aircraft)
+    if args.trace:
+        enable_tracing()
+    with profiler.stage(f'energy computation ({args.engine})'):
+        if args.engine == 'vectorized':
+            updated_route = compute_energy_consumption_vectorized(route, flight_directions, aircraft)
+        else:
+            updated_route = compute_energy_consumption(route, flight_directions, aircraft)
+    if args.trace:
+        disable_tracing().export_json(args.trace)
 
-    pprint.pprint(aircraft.metrics)
+    pprint.pprint(aircraft.metrics.to_dict())
     aircraft.print_total_energy_consumption()
     aircraft.print_total_flight_time()
 
@@ -98,13 +302,146 @@ if __name__ == "__main__":
     total_flight_time = aircraft.get_total_flight_time()
     print(total_energy_consumption)
     print(total_flight_time)
+    if args.derivatives:
+        if args.wind_field:
+            print('Derivatives need a constant wind; skipping them for the wind field.')
+        else:
+            print(route_derivatives(route, aircraft_params, wind_magnitude_mph, wind_direction_degrees,
+                                    reference_frame).to_string(index=False))
     logging.info(f"Total energy consumption: {total_energy_consumption}")
     logging.info(f"Total flight time: {total_flight_time}")
 
-    save_to_database(total_energy_consumption, 
-                     total_flight_time, 
-                     wind_direction_degrees, 
-                     wind_magnitude_mph)
+    with profiler.stage('sqlite write'):
+        save_to_database(total_energy_consumption, 
+                         total_flight_time, 
+                         wind_direction_degrees, 
+                         wind_magnitude_mph,
+                         reference_frame=reference_frame)
+
+    with profiler.stage('CSV write'):
+        updated_route.to_csv(f'updated_{args.file}_with_phases_energy', index=False)
 
-    updated_route.to_csv(f'updated_{args.file}_with_phases_energy', index=False)
 
+def run_stream(args, profiler):
+    wind = Wind(reference_frame='relative_to_aircraft',
+                wind_direction_degrees=args.wind_direction,
+                wind_magnitude_mph=args.wind_speed)
+    total_energy_consumption, total_flight_time = stream_route_energy(
+        csv_path=args.file,
+        aircraft_params=load_config("data/aircraft_params.json"),
+        wind=wind,
+        segments_path=f'updated_{args.file}_with_phases_energy',
+        totals_path=f'updated_{args.file}_totals',
+        profiler=profiler)
+    print(total_energy_consumption)
+    print(total_flight_time)
+    with profiler.stage('sqlite write'):
+        save_to_database(total_energy_consumption,
+                         total_flight_time,
+                         args.wind_direction,
+                         args.wind_speed)
+
+
+def run_climatology(args, profiler):
+    with profiler.stage('CSV load'):
+        aircraft_params = load_config(args.aircraft_params)
+        observations = read_observations(args.observations)
+        routes = {path: pd.read_csv(path) for path in args.file}
+    with profiler.stage('climatology replay'):
+        series = pd.concat([replay_climatology(route=route,
+                                               aircraft_params=aircraft_params,
+                                               observations=observations,
+                                               reference_frame=args.reference_frame).assign(route=path)
+                            for path, route in routes.items()])
+    with profiler.stage('CSV write'):
+        tables = {args.seasonal: 'season', args.hourly: 'hour'}
+        for path, by in tables.items():
+            if path:
+                series.groupby('route', sort=False).apply(aggregate, by=by).to_csv(path)
+        if args.output:
+            series.to_csv(args.output)
+        else:
+            print(series.groupby('route', sort=False).apply(aggregate, by='season').to_string())
+
+
+def run_design(args, profiler):
+    with profiler.stage('CSV load'):
+        route = pd.read_csv(args.file)
+        aircraft_params = load_config(args.aircraft_params)
+    variants = variant_grid(**{vary[0]: [float(value) for value in vary[1:]] for vary in args.vary})
+    with profiler.stage('design sweep'):
+        results = design_sweep(route=route,
+                               aircraft_params=aircraft_params,
+                               variants=variants,
+                               wind_speed=args.wind_speed,
+                               wind_direction=args.wind_direction,
+                               reference_frame=args.reference_frame)
+    _write_results(args, profiler, results)
+
+
+def run_sensitivity(args, profiler):
+    with profiler.stage('CSV load'):
+        route = pd.read_csv(args.file)
+        aircraft_params = load_config(args.aircraft_params)
+    if args.bounds:
+        bounds = {name: (float(low), float(high)) for name, low, high in args.bounds}
+    else:
+        bounds = default_bounds(aircraft_params, relative_range=args.relative_range)
+    options = dict(route=route, aircraft_params=aircraft_params, bounds=bounds, metric=args.metric,
+                   reference_frame=args.reference_frame, seed=args.seed, workers=args.workers or None)
+    with profiler.stage(f'sensitivity analysis ({args.method})'):
+        if args.method == 'sobol':
+            results = sobol_analysis(n_samples=args.samples, **options)
+        else:
+            results = morris_analysis(n_trajectories=args.samples, **options)
+    _write_results(args, profiler, results)
+
+
+def run_cruise(args, profiler):
+    with profiler.stage('CSV load'):
+        route = pd.read_csv(args.file)
+        aircraft_params = load_config(args.aircraft_params)
+    wind_speeds, wind_directions = (value.ravel() for value in np.meshgrid(args.wind_speeds, args.wind_directions))
+    with profiler.stage('cruise optimization'):
+        results = optimal_cruise_speeds(route=route,
+                                        aircraft_params=aircraft_params,
+                                        wind_speeds=wind_speeds,
+                                        wind_directions=wind_directions,
+                                        reference_frame=args.reference_frame,
+                                        time_weight=args.time_weight)
+    if args.output:
+        with profiler.stage('CSV write'):
+            results.to_csv(args.output, index=False)
+    else:
+        totals = results.groupby(['wind_direction', 'wind_speed', 'flight_direction'], sort=False)[
+            ['energy_consumption', 'optimal_energy_consumption', 'flight_time', 'optimal_flight_time']].sum()
+        print(totals.to_string())
+
+
+if __name__ == "__main__":
+    # setup_logging()
+    args = parse_arguments()
+    profiler = Profiler(enabled=args.profile is not None)
+    if profiler.enabled:
+        profiler.instrument()
+    with profiler.stage('main'):
+        if args.command == 'sweep':
+            run_sweep(args, profiler)
+        elif args.command == 'ensemble':
+            run_ensemble(args, profiler)
+        elif args.command == 'climatology':
+            run_climatology(args, profiler)
+        elif args.command == 'design':
+            run_design(args, profiler)
+        elif args.command == 'sensitivity':
+            run_sensitivity(args, profiler)
+        elif args.command == 'cruise':
+            run_cruise(args, profiler)
+        elif args.stream:
+            run_stream(args, profiler)
+        else:
+            run_single(args, profiler)
+    if profiler.enabled:
+        profiler.uninstrument()
+        print(profiler.summary())
+        profiler.write_folded(args.profile)
@@ -1,16 +1,28 @@
 from flight_helpers import rho, weight, temperature, lift_induced_drag_coef, rotor_disk_area, G_CONSTANT
 import numpy as np
 
-def transition_power(altitude, aircraft_params, tom):
+# Bump whenever a change to this module (or to how routes are evaluated) changes results, so cached results are dropped
+POWER_MODEL_VERSION = 1
+# New K to account for L/D correction in the climb and descent phases
+CLIMB_DESCENT_K_MULTIPLIER = 4/3
+
+def hover_power(altitude, aircraft_params, tom, vertical_velocity=0):
     """
-    Returns transition start or end power in kW
+    Returns hover power in kW at an altitude, moving vertically at vertical_velocity
     """
     density = rho(altitude=altitude, atmosphere_condition=aircraft_params['atmosphere_condition'])
 
     term1 = aircraft_params['f'] * weight(tom) / aircraft_params['FoM']
     term2 = np.sqrt(aircraft_params['f'] * weight(tom) / rotor_disk_area(tom, aircraft_params['disk_load']) / (2 * density))
+    term3 = weight(tom) * vertical_velocity / 2
 
-    return (term1 * term2) / aircraft_params['eta_hover']
+    return (term1 * term2 + term3) / aircraft_params['eta_hover']
+
+def transition_power(altitude, aircraft_params, tom):
+    """
+    Returns transition start or end power in kW
+    """
+    return hover_power(altitude=altitude, aircraft_params=aircraft_params, tom=tom)
 
 def climb_descent_power(aircraft_params, tom, altitude, vertical_velocity, air_speed, k_multiplier=1, direction='up'):
     """
@@ -28,16 +40,11 @@ def climb_descent_power(aircraft_params, tom, altitude, vertical_velocity, air_s
     return (term1 + term2 + term3) / aircraft_params['eta_hover']
 
 def vertical_takeoff_landing_phase_power(start_altitude, end_altitude, aircraft_params, tom, vertical_velocity):
-    start_density = rho(altitude=start_altitude, atmosphere_condition=aircraft_params['atmosphere_condition']) # This doesn't matter whether the operation is takeoff or landing as we take the average of the two.
-    end_density = rho(altitude=end_altitude, atmosphere_condition=aircraft_params['atmosphere_condition'])
-
-    term1 = aircraft_params['f'] * weight(tom) / aircraft_params['FoM']
-    term2_start = np.sqrt(aircraft_params['f'] * weight(tom) / rotor_disk_area(tom, aircraft_params['disk_load']) / (2 * start_density))
-    term2_end = np.sqrt(aircraft_params['f'] * weight(tom) / rotor_disk_area(tom, aircraft_params['disk_load']) / (2 * end_density))
-    term3 = weight(tom) * vertical_velocity / 2
-
-    start_power = max((term1 * term2_start + term3) / aircraft_params['eta_hover'], 0)
-    end_power = max((term1 * term2_end + term3) / aircraft_params['eta_hover'], 0)
+    # This doesn't matter whether the operation is takeoff or landing as we take the average of the two.
+    start_power = np.maximum(hover_power(altitude=start_altitude, aircraft_params=aircraft_params, tom=tom,
+                                         vertical_velocity=vertical_velocity), 0)
+    end_power = np.maximum(hover_power(altitude=end_altitude, aircraft_params=aircraft_params, tom=tom,
+                                       vertical_velocity=vertical_velocity), 0)
 
     return (start_power + end_power)/2
 
@@ -52,13 +59,13 @@ def climb_transition_phase_power(start_altitude,
                                  is_first_time):
     if is_first_time:
         climb_transition_start_power = transition_power(altitude=start_altitude, aircraft_params=aircraft_params, tom=tom)
-        climb_transition_start_power = max(climb_transition_start_power, 0)
+        climb_transition_start_power = np.maximum(climb_transition_start_power, 0)
         climb_transition_end_power = climb_descent_power(aircraft_params=aircraft_params, 
                                                          tom=tom, 
                                                          altitude=end_altitude, 
                                                          vertical_velocity=end_vertical_velocity, 
                                                          air_speed=end_air_speed)
-        climb_transition_end_power = max(climb_transition_end_power, 0)
+        climb_transition_end_power = np.maximum(climb_transition_end_power, 0)
         return (climb_transition_start_power + climb_transition_end_power)/2
     else:
         # Transition start
@@ -67,7 +74,7 @@ def climb_transition_phase_power(start_altitude,
                                                            altitude=start_altitude, 
                                                            vertical_velocity=start_vertical_velocity,
                                                            air_speed=start_air_speed)
-        climb_transition_start_power = max(climb_transition_start_power, 0)
+        climb_transition_start_power = np.maximum(climb_transition_start_power, 0)
 
         # Transition end
         climb_transition_end_power = climb_descent_power(aircraft_params=aircraft_params,
@@ -75,7 +82,7 @@ def climb_transition_phase_power(start_altitude,
                                                          altitude=end_altitude,
                                                          vertical_velocity=end_vertical_velocity,
                                                          air_speed=end_air_speed)
-        climb_transition_end_power = max(climb_transition_end_power, 0)
+        climb_transition_end_power = np.maximum(climb_transition_end_power, 0)
         return (climb_transition_start_power + climb_transition_end_power)/2
 
 def climb_phase_power(start_altitude, 
@@ -86,7 +93,7 @@ def climb_phase_power(start_altitude,
                       end_vertical_velocity,
                       start_air_speed, 
                       end_air_speed):
-    k_multiplier = 4/3  # New K to account for L/D correction
+    k_multiplier = CLIMB_DESCENT_K_MULTIPLIER
     # Climb start
     climb_start_power = climb_descent_power(aircraft_params=aircraft_params, 
                                             tom=tom, 
@@ -94,7 +101,7 @@ def climb_phase_power(start_altitude,
                                             vertical_velocity=start_vertical_velocity,
                                             air_speed=start_air_speed,
                                             k_multiplier=k_multiplier)
-    climb_start_power = max(climb_start_power, 0)
+    climb_start_power = np.maximum(climb_start_power, 0)
 
     # Climb end
     climb_end_power = climb_descent_power(aircraft_params=aircraft_params, 
@@ -103,11 +110,11 @@ def climb_phase_power(start_altitude,
                                           vertical_velocity=end_vertical_velocity,
                                           air_speed=end_air_speed,
                                           k_multiplier=k_multiplier)
-    climb_end_power = max(climb_end_power, 0)
+    climb_end_power = np.maximum(climb_end_power, 0)
     return (climb_start_power + climb_end_power)/2
 
 def cruise_phase_power(cruise_speed, aircraft_params, tom):
-    return max((weight(tom) * cruise_speed) / (0.85*aircraft_params['ld_max']) / aircraft_params['eta_cruise'], 0)
+    return np.maximum((weight(tom) * cruise_speed) / (0.85*aircraft_params['ld_max']) / aircraft_params['eta_cruise'], 0)
 
 def descent_phase_power(start_altitude, 
                         end_altitude, 
@@ -117,7 +124,7 @@ def descent_phase_power(start_altitude,
                         end_vertical_velocity,
                         start_air_speed, 
                         end_air_speed):
-    k_multiplier = 4/3  # New K to account for L/D correction
+    k_multiplier = CLIMB_DESCENT_K_MULTIPLIER
     descend_start_power = climb_descent_power(aircraft_params=aircraft_params, 
                                             tom=tom, 
                                             altitude=start_altitude, 
@@ -125,7 +132,7 @@ def descent_phase_power(start_altitude,
                                             air_speed=start_air_speed,
                                             k_multiplier=k_multiplier,
                                             direction='down')
-    descend_start_power = max(descend_start_power, 0)
+    descend_start_power = np.maximum(descend_start_power, 0)
     descend_end_power = climb_descent_power(aircraft_params=aircraft_params, 
                                             tom=tom, 
                                             altitude=end_altitude, 
@@ -133,7 +140,7 @@ def descent_phase_power(start_altitude,
                                             air_speed=end_air_speed,
                                             k_multiplier=k_multiplier,
                                             direction='down')
-    descend_end_power = max(descend_end_power, 0)
+    descend_end_power = np.maximum(descend_end_power, 0)
     return (descend_start_power + descend_end_power)/2
 
 def descent_transition_phase_power(start_altitude, 
@@ -152,9 +159,9 @@ def descent_transition_phase_power(start_altitude,
                                                             vertical_velocity=start_vertical_velocity,
                                                             air_speed=start_air_speed,
                                                             direction='down')
-        descend_transition_start_power = max(descend_transition_start_power, 0)
+        descend_transition_start_power = np.maximum(descend_transition_start_power, 0)
         descend_transition_end_power = transition_power(altitude=end_altitude, aircraft_params=aircraft_params, tom=tom)
-        descend_transition_end_power = max(descend_transition_end_power, 0)
+        descend_transition_end_power = np.maximum(descend_transition_end_power, 0)
         return (descend_transition_start_power + descend_transition_end_power)/2
     else:
         # Transition start
@@ -164,7 +171,7 @@ def descent_transition_phase_power(start_altitude,
                                                             vertical_velocity=start_vertical_velocity,
                                                             air_speed=start_air_speed,
                                                             direction='down')
-        descend_transition_start_power = max(descend_transition_start_power, 0)
+        descend_transition_start_power = np.maximum(descend_transition_start_power, 0)
 
         # Transition end
         descend_transition_end_power = climb_descent_power(aircraft_params=aircraft_params, 
@@ -173,5 +180,5 @@ def descent_transition_phase_power(start_altitude,
                                                           vertical_velocity=end_vertical_velocity,
                                                           air_speed=end_air_speed,
                                                           direction='down')
-        descend_transition_end_power = max(descend_transition_end_power, 0)
+        descend_transition_end_power = np.maximum(descend_transition_end_power, 0)
         return (descend_transition_start_power + descend_transition_end_power)/2
\ No newline at end of file
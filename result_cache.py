@@ -0,0 +1,175 @@
+import hashlib
+import sqlite3
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from power_model import POWER_MODEL_VERSION
+from route_engine import PHASES, METRIC_PHASES, evaluate_route, metrics_from_phase_totals
+from utils.helpers import params_hash
+from utils.units import mph_to_metersec, degrees_to_radians
+
+
+# Memory the in-memory level may hold, in bytes
+DEFAULT_MAX_BYTES = 128 * 2**20
+
+
+def _entry_bytes(entry):
+    return sum(array.nbytes for array in entry)
+
+
+def _to_blob(array):
+    return np.ascontiguousarray(array, dtype=np.float64).tobytes()
+
+
+def _from_blob(blob, shape):
+    # Shapes are not stored: the route contents are part of the key, so they are known at lookup time
+    return np.frombuffer(blob, dtype=np.float64).reshape(shape)
+
+
+class ResultCache:
+    """
+    Two-level cache of route evaluations keyed by (route contents, aircraft params, wind).
+    Level one is an in-memory LRU holding at most max_bytes of results; level two is an optional sqlite file that persists
+    across processes and sessions. Every entry keeps the per-direction phase totals and the per-segment energy and time.
+    Entries written by another POWER_MODEL_VERSION are dropped when the file is opened.
+    """
+
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+        self._connection = None
+        if path is not None:
+            self._connection = sqlite3.connect(path)
+            self._connection.execute('''CREATE TABLE IF NOT EXISTS results
+                                        (key TEXT PRIMARY KEY, phase_totals BLOB, energy BLOB, time BLOB)''')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS cache_meta (name TEXT PRIMARY KEY, value TEXT)')
+            row = self._connection.execute("SELECT value FROM cache_meta WHERE name = 'power_model_version'").fetchone()
+            if row is None or int(row[0]) != POWER_MODEL_VERSION:
+                self.invalidate()
+            self._connection.commit()
+
+    @staticmethod
+    def key(columns, aircraft_params_hash, reference_frame, wind_speed, wind_direction):
+        """Cache key of one wind case; wind_speed in mph, wind_direction in degrees."""
+        parts = (POWER_MODEL_VERSION, columns.content_hash(), aircraft_params_hash, reference_frame,
+                 repr(float(wind_speed)), repr(float(wind_direction)))
+        return hashlib.sha256('|'.join(map(str, parts)).encode()).hexdigest()
+
+    def invalidate(self):
+        """Drop every cached result, in memory and on disk."""
+        self._memory.clear()
+        self._memory_bytes = 0
+        if self._connection is not None:
+            with self._connection:
+                self._connection.execute('DELETE FROM results')
+                self._connection.execute("INSERT OR REPLACE INTO cache_meta (name, value) VALUES ('power_model_version', ?)",
+                                         (str(POWER_MODEL_VERSION),))
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def hit_rate(self):
+        lookups = sum(self.stats.values())
+        return (self.stats['memory_hits'] + self.stats['disk_hits']) / lookups if lookups else 0.0
+
+    def _remember(self, key, entry):
+        # Entries are copied: slices of a batch (or the buffer of a disk blob) would keep all of it alive
+        entry = tuple(array.copy() for array in entry)
+        if key in self._memory:
+            self._memory_bytes -= _entry_bytes(self._memory.pop(key))
+        self._memory[key] = entry
+        self._memory_bytes += _entry_bytes(entry)
+        while self._memory_bytes > self.max_bytes and self._memory:
+            self._memory_bytes -= _entry_bytes(self._memory.popitem(last=False)[1])
+
+    def _lookup(self, keys, columns):
+        """Returns {key: (phase_totals, energy, time)} for the cached keys, updating the hit/miss counters."""
+        found = {}
+        for key in keys:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                found[key] = self._memory[key]
+                self.stats['memory_hits'] += 1
+        remaining = [key for key in keys if key not in found]
+        if self._connection is not None and remaining:
+            totals_shape = (len(columns.flight_directions), len(METRIC_PHASES), 2)
+            for start in range(0, len(remaining), 500):
+                batch = remaining[start:start + 500]
+                rows = self._connection.execute(
+                    f'SELECT key, phase_totals, energy, time FROM results WHERE key IN ({",".join("?" * len(batch))})', batch)
+                for key, phase_totals, energy, time in rows:
+                    found[key] = (_from_blob(phase_totals, totals_shape), _from_blob(energy, -1), _from_blob(time, -1))
+                    self._remember(key, found[key])
+                    self.stats['disk_hits'] += 1
+        self.stats['misses'] += len(keys) - len(found)
+        return found
+
+    def _store(self, entries):
+        for key, entry in entries.items():
+            self._remember(key, entry)
+        if self._connection is not None and entries:
+            with self._connection:
+                self._connection.executemany('INSERT OR REPLACE INTO results (key, phase_totals, energy, time) VALUES (?, ?, ?, ?)',
+                                             [(key, _to_blob(phase_totals), _to_blob(energy), _to_blob(time))
+                                              for key, (phase_totals, energy, time) in entries.items()])
+
+    def evaluate_wind_cases(self, columns, aircraft_params, wind_speeds, wind_directions,
+                            reference_frame='relative_to_aircraft'):
+        """
+        Cached equivalent of evaluating each (wind_speed mph, wind_direction degrees) case with evaluate_route.
+        Cache misses are computed together in one vectorized pass.
+        Returns (phase_totals, energy, time) with a leading cases axis.
+        """
+        wind_speeds = np.asarray(wind_speeds, dtype=np.float64).ravel()
+        wind_directions = np.asarray(wind_directions, dtype=np.float64).ravel()
+        aircraft_params_hash = params_hash(aircraft_params)
+        keys = [ResultCache.key(columns, aircraft_params_hash, reference_frame, speed, direction)
+                for speed, direction in zip(wind_speeds, wind_directions)]
+        found = self._lookup(keys, columns)
+
+        missing = [i for i, key in enumerate(keys) if key not in found]
+        if missing:
+            energy, time, phase_totals = evaluate_route(columns=columns,
+                                                        aircraft_params=aircraft_params,
+                                                        wind_magnitude=mph_to_metersec(wind_speeds[missing])[:, np.newaxis],
+                                                        wind_angle=degrees_to_radians(wind_directions[missing])[:, np.newaxis],
+                                                        reference_frame=reference_frame)
+            computed = {keys[i]: (phase_totals[k], energy[k], time[k]) for k, i in enumerate(missing)}
+            self._store(computed)
+            found.update(computed)
+
+        if not keys:
+            return (np.zeros((0, len(columns.flight_directions), len(METRIC_PHASES), 2)),
+                    np.zeros((0, len(columns))), np.zeros((0, len(columns))))
+        entries = [found[key] for key in keys]
+        return tuple(np.stack([entry[k] for entry in entries]) for k in range(3))
+
+    def get(self, columns, aircraft_params, wind_speed, wind_direction, reference_frame='relative_to_aircraft',
+            segments=False):
+        """
+        Result of one route / aircraft / wind combination: a dict with the per-direction total 'energy_consumption'
+        (kWh) and 'flight_time' (s), the 'metrics' in the Aircraft.metrics layout and, if segments is True,
+        a 'segments' DataFrame with the energy and time of every route row.
+        """
+        phase_totals, energy, time = self.evaluate_wind_cases(columns, aircraft_params, [wind_speed], [wind_direction],
+                                                              reference_frame)
+        totals = phase_totals[0].sum(axis=-2)
+        result = {
+            'energy_consumption': dict(zip(columns.flight_directions, totals[:, 0])),
+            'flight_time': dict(zip(columns.flight_directions, totals[:, 1])),
+            'metrics': metrics_from_phase_totals(columns.flight_directions, phase_totals[0])
+        }
+        if segments:
+            result['segments'] = pd.DataFrame({
+                'row_index': columns.row_index,
+                'flight_direction': np.asarray(columns.flight_directions, dtype=object)[columns.direction_index],
+                'phase': np.asarray(PHASES, dtype=object)[columns.phase],
+                'energy_consumption': energy[0],
+                'time_to_complete': time[0]
+            })
+        return result
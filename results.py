@@ -1,22 +1,12 @@
-import sqlite3
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 import seaborn as sns
-
-
-def get_df(file_path, metric):
-    conn = sqlite3.connect(file_path)
-    query = f"SELECT id, {metric} FROM op_summary_statistics"
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    df[['distance', 'angle', 'speed']] = df['id'].str.split('_', expand=True)
-    df[['distance', 'angle', 'speed']] = df[['distance', 'angle', 'speed']].astype(int)
-    return df
+from results_query import get_df
 
 
 def surface_plot(metric_name, metric_label, distances, file_path):
-    df = get_df(file_path, metric_name)
+    df = get_df(file_path, metric_name, distance=list(distances))
 
     # Plotting 3D Surface Plot
     fig = plt.figure(figsize=(10, 7))
@@ -51,8 +41,8 @@ def surface_plot(metric_name, metric_label, distances, file_path):
 
 
 def line_plot_metric_vs_speed(metric_name, metric_label, file_path, wind_direction):
-    df = get_df(file_path, metric_name)
-    df_filtered = df[(df['angle'] == wind_direction) & (df['speed'] > 0)]
+    df = get_df(file_path, metric_name, angle=wind_direction)
+    df_filtered = df[df['speed'] > 0]
     
     # Setting up colors for different distances
     colors = ['red', 'blue', 'green', 'purple', 'orange']
@@ -78,10 +68,8 @@ def line_plot_metric_vs_speed(metric_name, metric_label, file_path, wind_directi
 
 
 def line_plot_vs_distance(metric_name, metric_label, file_path):
-    df = get_df(file_path, metric_name)
-    
-    # Filter data for wind speed = 0 and wind angle = 0
-    df_filtered = df[(df['speed'] == 0) & (df['angle'] == 0)]
+    # Data for wind speed = 0 and wind angle = 0
+    df_filtered = get_df(file_path, metric_name, angle=0, speed=0)
 
     # Sort the DataFrame by distance
     df_sorted = df_filtered.sort_values(by='distance')
@@ -104,8 +92,7 @@ def line_plot_vs_distance(metric_name, metric_label, file_path):
 
 
 def heatmap_wind_direction_speed(metric_name, metric_label, file_path, distance):
-    df = get_df(file_path, metric_name)
-    df = df[df['distance'] == distance]
+    df = get_df(file_path, metric_name, distance=distance)
 
     # Find the metric value at wind speed 0 and direction 0
     value_at_zero_speed = df.loc[(df['speed'] == 0) & (df['angle'] == 0), metric_name].iloc[0]
@@ -133,10 +120,8 @@ def heatmap_wind_direction_speed(metric_name, metric_label, file_path, distance)
 
 
 def heatmap_speed_distance(metric_name, metric_label, file_path, wind_direction):
-    df = get_df(file_path, metric_name)
-
-    # Filter the DataFrame for the specified wind direction
-    df = df[df['angle'] == wind_direction]
+    # Data for the specified wind direction
+    df = get_df(file_path, metric_name, angle=wind_direction)
 
     # Creating a pivot table for the heatmap
     # 'distance' as rows (y-axis), 'speed' as columns (x-axis)
@@ -156,8 +141,9 @@ def heatmap_speed_distance(metric_name, metric_label, file_path, wind_direction)
     plt.show()
 
 
-heatmap_speed_distance('fleet_size', 'Optimal Fleet Size', 'energy_and_flight_time/wind_variation_result_Jan18.sqlite', 180)
-heatmap_wind_direction_speed('fleet_size', 'Optimal Fleet Size', 'energy_and_flight_time/wind_variation_result_Jan18.sqlite', 60)
-line_plot_vs_distance('fleet_size', 'Optimal Fleet Size', 'energy_and_flight_time/wind_variation_result_Jan18.sqlite')
-line_plot_metric_vs_speed('fleet_size', 'Optimal Fleet Size', 'energy_and_flight_time/wind_variation_result_Jan18.sqlite', 0)
-surface_plot('fleet_size', 'Optimal Fleet Size', [20, 60], 'energy_and_flight_time/wind_variation_result_Jan18.sqlite')
+if __name__ == "__main__":
+    heatmap_speed_distance('fleet_size', 'Optimal Fleet Size', 'energy_and_flight_time/wind_variation_result_Jan18.sqlite', 180)
+    heatmap_wind_direction_speed('fleet_size', 'Optimal Fleet Size', 'energy_and_flight_time/wind_variation_result_Jan18.sqlite', 60)
+    line_plot_vs_distance('fleet_size', 'Optimal Fleet Size', 'energy_and_flight_time/wind_variation_result_Jan18.sqlite')
+    line_plot_metric_vs_speed('fleet_size', 'Optimal Fleet Size', 'energy_and_flight_time/wind_variation_result_Jan18.sqlite', 0)
+    surface_plot('fleet_size', 'Optimal Fleet Size', [20, 60], 'energy_and_flight_time/wind_variation_result_Jan18.sqlite')
@@ -0,0 +1,118 @@
+import os
+import sqlite3
+from functools import lru_cache
+import pandas as pd
+
+# Typed copy of the distance_angle_speed run ids of op_summary_statistics, kept next to it in the same file
+KEYS_TABLE = 'op_summary_keys'
+KEY_COLUMNS = ('distance', 'angle', 'speed')
+
+# _file_signature of each file right after its keys table was last brought up to date
+_indexed_signatures = {}
+
+
+def _connect(file_path):
+    connection = sqlite3.connect(file_path)
+    connection.execute(f'''CREATE TABLE IF NOT EXISTS {KEYS_TABLE}
+                           (id TEXT PRIMARY KEY, distance INTEGER, angle INTEGER, speed INTEGER)''')
+    connection.execute(f'CREATE INDEX IF NOT EXISTS {KEYS_TABLE}_distance_angle_speed ON {KEYS_TABLE} (distance, angle, speed)')
+    return connection
+
+
+def _file_signature(file_path):
+    """
+    (mtime, size) of the database file, plus those of its write-ahead log if it has one: in WAL mode commits only
+    append to the -wal file, and the main file changes when the log is checkpointed back into it.
+    """
+    stat = os.stat(file_path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    wal_path = f'{file_path}-wal'
+    if os.path.exists(wal_path):
+        stat = os.stat(wal_path)
+        signature += (stat.st_mtime_ns, stat.st_size)
+    return signature
+
+
+def _index_new_ids(file_path):
+    """Parse the ids added to op_summary_statistics since the last call into the typed keys table."""
+    if _indexed_signatures.get(file_path) == _file_signature(file_path):
+        return
+    connection = _connect(file_path)
+    try:
+        _insert_keys(connection)
+    finally:
+        connection.close()
+    _indexed_signatures[file_path] = _file_signature(file_path)
+
+
+def _insert_keys(connection):
+    new_ids = connection.execute(f'''SELECT DISTINCT id FROM op_summary_statistics
+                                     WHERE id NOT IN (SELECT id FROM {KEYS_TABLE})''').fetchall()
+    if new_ids:
+        with connection:
+            connection.executemany(f'INSERT INTO {KEYS_TABLE} (id, distance, angle, speed) VALUES (?, ?, ?, ?)',
+                                   [(id_, *map(int, id_.split('_'))) for (id_,) in new_ids])
+
+
+def _filter_value(value):
+    # Filters are part of the cache key, so lists and sets become frozensets
+    return frozenset(value) if isinstance(value, (list, set, frozenset)) else value
+
+
+def _where(filters):
+    """
+    SQL condition and parameters for ((column, value), ...) filters. A value is an exact match, a (low, high) tuple
+    an inclusive range (None leaves that side open) and a list or set the allowed values.
+    """
+    conditions, params = [], []
+    for column, value in filters:
+        if value is None:
+            continue
+        if isinstance(value, tuple):
+            low, high = value
+            if low is not None:
+                conditions.append(f'k.{column} >= ?')
+                params.append(low)
+            if high is not None:
+                conditions.append(f'k.{column} <= ?')
+                params.append(high)
+        elif isinstance(value, frozenset):
+            conditions.append(f'k.{column} IN ({",".join("?" * len(value))})')
+            params.extend(sorted(value))
+        else:
+            conditions.append(f'k.{column} = ?')
+            params.append(value)
+    return (' WHERE ' + ' AND '.join(conditions)) if conditions else '', params
+
+
+@lru_cache(maxsize=64)
+def _query(file_path, file_signature, metric, filters):
+    # file_signature is only part of the cache key, so a file that was written to misses the cache
+    connection = sqlite3.connect(file_path)
+    try:
+        columns = [row[1] for row in connection.execute('PRAGMA table_info(op_summary_statistics)')]
+        if metric not in columns:
+            raise ValueError(f'Unknown metric {metric!r}, op_summary_statistics has {columns}')
+        where, params = _where(filters)
+        query = f'''SELECT s.id, s."{metric}", k.distance, k.angle, k.speed
+                    FROM op_summary_statistics s JOIN {KEYS_TABLE} k ON s.id = k.id{where}'''
+        return pd.read_sql_query(query, connection, params=params)
+    finally:
+        connection.close()
+
+
+def get_df(file_path, metric, distance=None, angle=None, speed=None):
+    """
+    Returns the id and metric columns of op_summary_statistics, with the distance, angle and speed encoded in the id
+    as typed columns. distance, angle and speed filters are evaluated in SQL: pass a value, a (low, high) range or
+    a list of values. Frames are cached per file, metric and filters until the file changes.
+    """
+    file_path = os.path.abspath(file_path)
+    _index_new_ids(file_path)
+    filters = tuple((column, _filter_value(value)) for column, value in zip(KEY_COLUMNS, (distance, angle, speed)))
+    return _query(file_path, _file_signature(file_path), metric, filters).copy()
+
+
+def clear_cache():
+    _query.cache_clear()
+    _indexed_signatures.clear()
@@ -0,0 +1,153 @@
+import datetime
+import json
+import sqlite3
+import numpy as np
+import pandas as pd
+from power_model import POWER_MODEL_VERSION
+from utils.helpers import params_hash
+
+# Stored in PRAGMA user_version; bump together with a migration in ResultsStore._migrate
+SCHEMA_VERSION = 1
+
+RESULT_COLUMNS = ('wind_direction_degrees', 'wind_magnitude_mph', 'flight_direction', 'energy_consumption', 'flight_time')
+# Schema of version 1, one statement each so the migration can run them inside its transaction
+SCHEMA_STATEMENTS = (
+    """CREATE TABLE IF NOT EXISTS aircraft_configs
+           (params_hash TEXT PRIMARY KEY, params_json TEXT NOT NULL)""",
+    """CREATE TABLE IF NOT EXISTS runs
+           (run_id INTEGER PRIMARY KEY, created_at TEXT NOT NULL,
+            route TEXT, route_hash TEXT,
+            aircraft_config TEXT, params_hash TEXT REFERENCES aircraft_configs (params_hash),
+            reference_frame TEXT, power_model_version INTEGER)""",
+    """CREATE TABLE IF NOT EXISTS flight_results
+           (run_id INTEGER NOT NULL REFERENCES runs (run_id),
+            wind_direction_degrees REAL, wind_magnitude_mph REAL, flight_direction TEXT,
+            energy_consumption REAL, flight_time REAL)""",
+    'CREATE INDEX IF NOT EXISTS runs_route_params ON runs (route_hash, params_hash)',
+    'CREATE INDEX IF NOT EXISTS runs_route ON runs (route)',
+    'CREATE INDEX IF NOT EXISTS flight_results_run ON flight_results (run_id)',
+    'CREATE INDEX IF NOT EXISTS flight_results_wind ON flight_results (wind_direction_degrees, wind_magnitude_mph)',
+    'CREATE INDEX IF NOT EXISTS flight_results_direction ON flight_results (flight_direction)',
+    """CREATE VIEW IF NOT EXISTS flight_results_view AS
+           SELECT runs.run_id, runs.created_at, runs.route, runs.route_hash, runs.aircraft_config,
+                  runs.params_hash, runs.reference_frame, runs.power_model_version,
+                  flight_results.wind_direction_degrees, flight_results.wind_magnitude_mph,
+                  flight_results.flight_direction, flight_results.energy_consumption,
+                  flight_results.flight_time
+           FROM flight_results JOIN runs USING (run_id)"""
+)
+
+
+class ResultsStore:
+    """
+    sqlite store for energy and flight time results.
+    Each batch of results belongs to a run, which records the route, the aircraft params and the wind reference frame
+    it was computed with. Results are inserted with executemany inside one transaction per call, and the database runs
+    in WAL mode so several sweep workers can write to it concurrently.
+    Units follow save_to_database: energy_consumption in kWh, flight_time in minutes.
+    """
+
+    def __init__(self, path, timeout=60):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=timeout)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self._migrate()
+
+    def _schema_version(self):
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise ValueError(f'{self.path} has schema version {version}, newer than the supported version {SCHEMA_VERSION}.')
+        return version
+
+    def _migrate(self):
+        if self._schema_version() == SCHEMA_VERSION:
+            return
+        # One explicit transaction for the whole migration: executescript would commit before running, and DDL does
+        # not open a transaction by itself. IMMEDIATE takes the write lock up front, so of several workers opening a
+        # new database one migrates and the others find it migrated
+        with self.connection:
+            self.connection.execute('BEGIN IMMEDIATE')
+            if self._schema_version() < 1:
+                for statement in SCHEMA_STATEMENTS:
+                    self.connection.execute(statement)
+                self._migrate_flight_metrics()
+            self.connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def _migrate_flight_metrics(self):
+        """
+        Copy the rows the old save_to_database wrote to flight_metrics into one run with unknown route, params and
+        reference frame, so they show up in flight_results_view. flight_metrics itself is left in place.
+        """
+        if self.connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'flight_metrics'").fetchone() is None:
+            return
+        if self.connection.execute('SELECT COUNT(*) FROM flight_metrics').fetchone()[0] == 0:
+            return
+        cursor = self.connection.execute('INSERT INTO runs (created_at, aircraft_config) VALUES (?, ?)',
+                                         (datetime.datetime.now().isoformat(), 'flight_metrics'))
+        self.connection.execute(f'''INSERT INTO flight_results (run_id, {", ".join(RESULT_COLUMNS)})
+                                    SELECT ?, {", ".join(RESULT_COLUMNS)} FROM flight_metrics ORDER BY id''',
+                                (cursor.lastrowid,))
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _insert_run(self, route, route_hash, aircraft_config, aircraft_params, reference_frame):
+        aircraft_params_hash = None
+        if aircraft_params is not None:
+            aircraft_params_hash = params_hash(aircraft_params)
+            self.connection.execute('INSERT OR IGNORE INTO aircraft_configs (params_hash, params_json) VALUES (?, ?)',
+                                    (aircraft_params_hash, json.dumps(aircraft_params, sort_keys=True)))
+        cursor = self.connection.execute(
+            '''INSERT INTO runs (created_at, route, route_hash, aircraft_config, params_hash, reference_frame, power_model_version)
+               VALUES (?, ?, ?, ?, ?, ?, ?)''',
+            (datetime.datetime.now().isoformat(), route, route_hash, aircraft_config, aircraft_params_hash,
+             reference_frame, POWER_MODEL_VERSION))
+        return cursor.lastrowid
+
+    def add_results(self, results, route=None, route_hash=None, aircraft_config=None, aircraft_params=None,
+                    reference_frame='relative_to_aircraft'):
+        """
+        Store a results table (see wind_sweep.results_table) as one run, in a single transaction.
+        Returns the run_id.
+        """
+        with self.connection:
+            run_id = self._insert_run(route, route_hash, aircraft_config, aircraft_params, reference_frame)
+            self._insert_results(run_id, results)
+        return run_id
+
+    def add_sweep(self, results, aircraft_configs=None, route_hashes=None, reference_frame='relative_to_aircraft'):
+        """
+        Store a sweep_executor results table, one run per (route, aircraft_config), in a single transaction.
+        aircraft_configs maps aircraft_config names to their params dicts, route_hashes route names to content hashes.
+        Returns the run_ids.
+        """
+        aircraft_configs = aircraft_configs or {}
+        route_hashes = route_hashes or {}
+        run_ids = []
+        with self.connection:
+            for (route, aircraft_config), run in results.groupby(['route', 'aircraft_config'], sort=False):
+                run_id = self._insert_run(route, route_hashes.get(route), aircraft_config,
+                                          aircraft_configs.get(aircraft_config), reference_frame)
+                self._insert_results(run_id, run)
+                run_ids.append(run_id)
+        return run_ids
+
+    def _insert_results(self, run_id, results):
+        rows = zip(np.full(len(results), run_id).tolist(),
+                   *(results[column].tolist() for column in RESULT_COLUMNS))
+        self.connection.executemany(
+            f'INSERT INTO flight_results (run_id, {", ".join(RESULT_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def read_results(self, **filters):
+        """Read flight_results_view as a DataFrame, keeping rows whose columns equal the given keyword values."""
+        query = 'SELECT * FROM flight_results_view'
+        if filters:
+            query += ' WHERE ' + ' AND '.join(f'{column} = ?' for column in filters)
+        return pd.read_sql_query(query, self.connection, params=list(filters.values()))
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+from route_engine import RouteColumns, evaluate_route, VARIANT_PARAMS
+from utils.units import mph_to_metersec, degrees_to_radians
+
+# Imaginary step of complex-step differentiation. It never meets a subtraction, so it can be tiny: derivatives are
+# exact to round-off, unlike finite differences
+COMPLEX_STEP = 1e-100
+WIND_INPUTS = ('wind_magnitude', 'wind_angle')
+DERIVATIVE_INPUTS = VARIANT_PARAMS + WIND_INPUTS
+
+
+def evaluate_route_derivatives(columns, aircraft_params, wind_magnitude, wind_angle, reference_frame, inputs=None):
+    """
+    evaluate_route for one aircraft and one wind (m/s, radians), together with the derivatives of its phase totals
+    with respect to inputs (aircraft params and/or wind_magnitude, wind_angle; default all of them).
+    Every input gets its own complex-step perturbation on a leading axis, so the forward pass and all derivatives
+    come out of a single batched evaluation. Derivatives are those of the active branch where the model has kinks
+    (np.maximum, wind fallbacks), and of the unrounded aircraft weight.
+    :return: (phase_totals of shape (directions, phases, 2), derivatives of shape (inputs, directions, phases, 2))
+    """
+    inputs = list(DERIVATIVE_INPUTS if inputs is None else inputs)
+    unknown = set(inputs) - set(DERIVATIVE_INPUTS)
+    if unknown:
+        raise ValueError(f'Derivatives are available for {", ".join(DERIVATIVE_INPUTS)}, not {", ".join(sorted(unknown))}.')
+    params = dict(aircraft_params)
+    wind = {'wind_magnitude': wind_magnitude, 'wind_angle': wind_angle}
+    # Row i of the leading axis perturbs input i only
+    steps = 1j * COMPLEX_STEP * np.eye(len(inputs))
+    for i, name in enumerate(inputs):
+        values = wind if name in WIND_INPUTS else params
+        values[name] = float(values[name]) + steps[:, i, np.newaxis]
+    # END rows have no heading; complex trigonometry warns about their NaNs where real trigonometry stays quiet
+    with np.errstate(invalid='ignore'):
+        _, _, phase_totals = evaluate_route(columns=columns,
+                                            aircraft_params=params,
+                                            wind_magnitude=wind['wind_magnitude'],
+                                            wind_angle=wind['wind_angle'],
+                                            reference_frame=reference_frame)
+    phase_totals = np.broadcast_to(phase_totals, (max(len(inputs), 1),) + phase_totals.shape[-3:])
+    return phase_totals[0].real.copy(), phase_totals[:len(inputs)].imag / COMPLEX_STEP
+
+
+def route_derivatives(route, aircraft_params, wind_speed=0.0, wind_direction=0.0,
+                      reference_frame='relative_to_aircraft', inputs=None, flight_directions=None):
+    """
+    Trip energy and flight time of every flight direction and their derivatives with respect to the aircraft
+    params and the wind, from one batched evaluation (see evaluate_route_derivatives).
+    :param route: route DataFrame (as read from a route CSV) or RouteColumns
+    :param wind_speed: wind magnitude in mph
+    :param wind_direction: wind direction in degrees, interpreted in reference_frame like Wind does
+    :param inputs: aircraft params and/or 'wind_speed', 'wind_direction' (default all of them)
+    :return: DataFrame with one row per (flight_direction, input) holding the energy_consumption (kWh) and
+             flight_time (s) and their derivatives per unit of the input (per mph and per degree for the wind)
+    """
+    columns = route if isinstance(route, RouteColumns) else RouteColumns.from_dataframe(route, flight_directions)
+    names = list(VARIANT_PARAMS + ('wind_speed', 'wind_direction') if inputs is None else inputs)
+    engine_inputs = {'wind_speed': 'wind_magnitude', 'wind_direction': 'wind_angle'}
+    # d/d(mph) and d/d(degree) from the engine's d/d(m/s) and d/d(radian)
+    scales = np.array([mph_to_metersec(1.0) if name == 'wind_speed' else degrees_to_radians(1.0)
+                       if name == 'wind_direction' else 1.0 for name in names])
+    phase_totals, derivatives = evaluate_route_derivatives(columns=columns,
+                                                           aircraft_params=aircraft_params,
+                                                           wind_magnitude=mph_to_metersec(wind_speed),
+                                                           wind_angle=degrees_to_radians(wind_direction),
+                                                           reference_frame=reference_frame,
+                                                           inputs=[engine_inputs.get(name, name) for name in names])
+    totals = phase_totals.sum(axis=-2)
+    # (inputs, directions, {energy, time}) -> rows direction by direction
+    derivatives = (derivatives.sum(axis=-2) * scales[:, np.newaxis, np.newaxis]).swapaxes(0, 1)
+    n_inputs = len(names)
+    return pd.DataFrame({
+        'flight_direction': np.repeat(np.asarray(columns.flight_directions, dtype=object), n_inputs),
+        'input': np.tile(np.asarray(names, dtype=object), len(columns.flight_directions)),
+        'energy_consumption': np.repeat(totals[:, 0], n_inputs),
+        'flight_time': np.repeat(totals[:, 1], n_inputs),
+        'd_energy_consumption': derivatives[..., 0].ravel(),
+        'd_flight_time': derivatives[..., 1].ravel()
+    })
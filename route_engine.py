@@ -0,0 +1,390 @@
+import hashlib
+import json
+from time import perf_counter
+import numpy as np
+import pandas as pd
+from power_model import hover_power, climb_descent_power, cruise_phase_power, CLIMB_DESCENT_K_MULTIPLIER
+from utils.helpers import preprocess_route, ROUTE_DERIVED_COLUMNS
+from utils.units import sec_to_hr, watt_to_kw
+from wind.wind import Wind
+from utils.vector_math import norm
+from utils.tracing import get_tracer
+from flight_metrics import FlightMetrics, METRIC_PHASES
+
+# Phase codes follow the order in which phases appear in a route file. END rows carry no energy or time.
+PHASES = ('HOVER CLIMB', 'CLIMB TRANSITION', 'CLIMB', 'CRUISE', 'DESCENT', 'DESCENT TRANSITION', 'HOVER DESCENT', 'END')
+PHASE_CODES = {phase: code for code, phase in enumerate(PHASES)}
+HOVER_CLIMB, CLIMB_TRANSITION, CLIMB, CRUISE, DESCENT, DESCENT_TRANSITION, HOVER_DESCENT, END = range(len(PHASES))
+
+
+# Phases flown at a fixed ground speed (RTA velocity) rather than by crabbing at a fixed airspeed
+RTA_PHASES = (CLIMB_TRANSITION, CLIMB, DESCENT, DESCENT_TRANSITION)
+# Indexed by phase code; cheaper than np.isin on every route
+IS_RTA_PHASE = np.isin(np.arange(len(PHASES)), RTA_PHASES)
+IS_CLIMBING_PHASE = np.isin(np.arange(len(PHASES)), (HOVER_CLIMB, CLIMB_TRANSITION, CLIMB))
+IS_DESCENDING_PHASE = np.isin(np.arange(len(PHASES)), (DESCENT, DESCENT_TRANSITION, HOVER_DESCENT))
+IS_HOVER_PHASE = np.isin(np.arange(len(PHASES)), (HOVER_CLIMB, HOVER_DESCENT))
+# climb_descent_power's direction='down' flips the vertical velocity
+VERTICAL_VELOCITY_SIGN = np.where(np.isin(np.arange(len(PHASES)), (DESCENT, DESCENT_TRANSITION)), -1.0, 1.0)
+K_MULTIPLIER = np.where(np.isin(np.arange(len(PHASES)), (CLIMB, DESCENT)), CLIMB_DESCENT_K_MULTIPLIER, 1.0)
+
+GROUND_SPEED_THRESHOLD = 0.1  # m/s, same threshold Aircraft uses for the cruise phase
+
+# Aircraft params evaluate_route accepts as arrays, to evaluate many aircraft variants in one pass
+VARIANT_PARAMS = ('mtom', 'pax', 'pax_mass', 'wing_area', 'disk_load', 'f', 'FoM', 'cd_0', 'ld_max',
+                  'eta_hover', 'eta_climb', 'eta_descend', 'eta_cruise')
+
+
+class RouteColumns:
+    """
+    Column-oriented view of a route. Rows are ordered the way compute_energy_consumption visits them:
+    direction by direction, in file order within each direction.
+    """
+
+    # Per-row arrays, in constructor argument order
+    ARRAY_FIELDS = ('direction_index', 'phase', 'horizontal_distance', 'vertical_distance', 'horizontal_velocity',
+                    'vertical_velocity', 'travel_time', 'altitude', 'is_first_last_time', 'destination_heading',
+                    'latitude', 'longitude', 'row_index')
+
+    def __init__(self, flight_directions, direction_index, phase, horizontal_distance, vertical_distance,
+                 horizontal_velocity, vertical_velocity, travel_time, altitude, is_first_last_time,
+                 destination_heading, latitude=None, longitude=None, row_index=None):
+        self.flight_directions = list(flight_directions)
+        self.direction_index = np.asarray(direction_index, dtype=np.int64)
+        self.phase = np.asarray(phase, dtype=np.int8)
+        self.horizontal_distance = np.asarray(horizontal_distance, dtype=np.float64)
+        self.vertical_distance = np.asarray(vertical_distance, dtype=np.float64)
+        self.horizontal_velocity = np.asarray(horizontal_velocity, dtype=np.float64)
+        self.vertical_velocity = np.asarray(vertical_velocity, dtype=np.float64)
+        self.travel_time = np.asarray(travel_time, dtype=np.float64)
+        self.altitude = np.asarray(altitude, dtype=np.float64)
+        self.is_first_last_time = np.asarray(is_first_last_time, dtype=bool)
+        self.destination_heading = np.asarray(destination_heading, dtype=np.float64)
+        # Waypoint positions (degrees) are only needed to sample spatially varying winds
+        self.latitude = np.full(len(self.phase), np.nan) if latitude is None else np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.full(len(self.phase), np.nan) if longitude is None else np.asarray(longitude, dtype=np.float64)
+        self.row_index = np.arange(len(self.phase)) if row_index is None else np.asarray(row_index, dtype=np.int64)
+
+        counts = np.bincount(self.direction_index, minlength=len(self.flight_directions))
+        self.direction_stops = np.cumsum(counts)
+        self.direction_starts = self.direction_stops - counts
+
+    def __len__(self):
+        return len(self.phase)
+
+    def content_hash(self):
+        """Stable hash of the route contents, computed once per object."""
+        if getattr(self, '_content_hash', None) is None:
+            digest = hashlib.sha256(json.dumps([str(direction) for direction in self.flight_directions]).encode())
+            for field in self.ARRAY_FIELDS:
+                digest.update(np.ascontiguousarray(getattr(self, field)).tobytes())
+            self._content_hash = digest.hexdigest()
+        return self._content_hash
+
+    @classmethod
+    def from_dataframe(cls, route, flight_directions=None):
+        if flight_directions is None:
+            flight_directions = route['flight_direction'].unique()
+        if not set(ROUTE_DERIVED_COLUMNS) <= set(route.columns):
+            route = preprocess_route(route.copy(), flight_directions, overwrite=False)
+
+        # Rows grouped by flight direction, in flight_directions order; rows of other directions are left out.
+        # Labels are looked up in dicts: pandas indexers cost more than the whole evaluation on routes this size
+        direction_codes = _codes(route['flight_direction'].to_numpy(), flight_directions)
+        selected = np.flatnonzero(direction_codes >= 0)
+        order = selected[np.argsort(direction_codes[selected], kind='stable')]
+        direction_index = direction_codes[order]
+
+        phase = _codes(route['phase'].to_numpy()[order], PHASES)
+        if (phase < 0).any():
+            raise ValueError('phase must be one of the following: HOVER CLIMB, CLIMB TRANSITION, CLIMB, CRUISE, DESCENT, DESCENT TRANSITION, HOVER DESCENT')
+
+        def column(name):
+            return route[name].to_numpy(dtype=np.float64)[order]
+
+        return cls(flight_directions=flight_directions,
+                   direction_index=direction_index,
+                   phase=phase,
+                   horizontal_distance=column('distance_to_next_meters'),
+                   vertical_distance=column('altitude_difference'),
+                   horizontal_velocity=column('horizontal_velocity'),
+                   vertical_velocity=column('vertical_velocity'),
+                   travel_time=column('time_to_complete'),
+                   altitude=column('altitude'),
+                   is_first_last_time=route['is_first_last_time'].to_numpy(dtype=bool)[order],
+                   destination_heading=column('destination_heading_radians'),
+                   latitude=column('latitude'),
+                   longitude=column('longitude'),
+                   row_index=order)
+
+    def evaluation_plan(self):
+        """The EvaluationPlan of the route, computed once per object."""
+        if getattr(self, '_evaluation_plan', None) is None:
+            self._evaluation_plan = EvaluationPlan(self)
+        return self._evaluation_plan
+
+    def previous_row_index(self):
+        """
+        Index of the row whose end state (velocity) the aircraft carries into each row, or -1 for the first one.
+        END rows do not update the aircraft, so they are skipped.
+        """
+        positions = np.where(self.phase != END, np.arange(len(self)), -1)
+        last_flown = np.maximum.accumulate(positions) if len(self) else positions
+        return np.concatenate(([-1], last_flown[:-1]))
+
+
+def _codes(values, labels):
+    """Position of every value in labels, -1 for values not in it."""
+    positions = {label: code for code, label in enumerate(labels)}
+    return np.fromiter((positions.get(value, -1) for value in values), dtype=np.int64, count=len(values))
+
+
+class EvaluationPlan:
+    """
+    The arrays evaluate_route derives from the route alone, so evaluating a route again (another wind, another
+    aircraft) only does the work that depends on them.
+    Every flown row but cruise draws the mean of the power at its start and at its end. Endpoint arrays hold the
+    start of each of these rows followed by its end; an endpoint either hovers (the hover phases, and the vertiport
+    end of the first climb transition and last descent transition) or climbs/descends.
+    """
+
+    def __init__(self, columns):
+        phase = columns.phase
+        self.is_rta = IS_RTA_PHASE[phase]
+        self.is_cruise = phase == CRUISE
+        self.is_flown = phase != END
+        self.cruise_rows = np.flatnonzero(self.is_cruise)
+        rows = self.sustained_rows = np.flatnonzero(self.is_flown & ~self.is_cruise)
+        row_phase = phase[rows]
+
+        # The row whose end velocity each row starts with (see RouteColumns.previous_row_index)
+        previous = columns.previous_row_index()[rows]
+        self.has_previous = previous >= 0
+        self.previous = np.maximum(previous, 0)
+        self.previous_is_rta = self.is_rta[self.previous]
+        self.previous_is_cruise = self.is_cruise[self.previous]
+        self.previous_horizontal_velocity = columns.horizontal_velocity[self.previous]
+        previous_vertical_velocity = columns.vertical_velocity[self.previous]
+        self.previous_vertical_velocity = np.where(self.has_previous, previous_vertical_velocity, 0)
+        self.previous_vertical_velocity_squared = previous_vertical_velocity**2
+        self.vertical_velocity_squared = columns.vertical_velocity[rows]**2
+
+        altitude = columns.altitude[rows]
+        vertical_distance = columns.vertical_distance[rows]
+        end_altitude = np.where(IS_CLIMBING_PHASE[row_phase], altitude + vertical_distance,
+                                np.where(IS_DESCENDING_PHASE[row_phase], altitude - vertical_distance, altitude))
+        hover = IS_HOVER_PHASE[row_phase]
+        first_last = columns.is_first_last_time[rows]
+        self.endpoint_altitude = np.concatenate((altitude, end_altitude))
+        self.endpoint_hovers = np.concatenate((hover | ((row_phase == CLIMB_TRANSITION) & first_last),
+                                               hover | ((row_phase == DESCENT_TRANSITION) & first_last)))
+        hover_vertical_velocity = np.where(hover, columns.vertical_velocity[rows], 0)
+        self.endpoint_hover_vertical_velocity = np.concatenate((hover_vertical_velocity, hover_vertical_velocity))
+        sign = VERTICAL_VELOCITY_SIGN[row_phase]
+        self.endpoint_vertical_velocity = np.concatenate((sign * self.previous_vertical_velocity,
+                                                          sign * columns.vertical_velocity[rows]))
+        k_multiplier = K_MULTIPLIER[row_phase]
+        self.endpoint_k_multiplier = np.concatenate((k_multiplier, k_multiplier))
+
+        # Flown rows sorted by (direction, phase), and where each non-empty (direction, phase) group starts
+        group = columns.direction_index * len(METRIC_PHASES) + phase
+        flown_rows = np.flatnonzero(self.is_flown)
+        self.group_order = flown_rows[np.argsort(group[flown_rows], kind='stable')]
+        sorted_group = group[self.group_order]
+        self.group_starts = np.flatnonzero(np.concatenate(([True], sorted_group[1:] != sorted_group[:-1]))) \
+            if len(sorted_group) else np.zeros(0, dtype=np.int64)
+        self.groups = sorted_group[self.group_starts]
+        self.n_groups = len(columns.flight_directions) * len(METRIC_PHASES)
+
+
+def _wind_adjusted_velocities(columns, wind_magnitude, wind_angle, reference_frame):
+    """
+    Returns (|true_v|, |ground_v|) for every row, matching Aircraft.adjust_speed_based_on_wind.
+    wind_magnitude (m/s) and wind_angle (radians) may be arrays that broadcast against the route rows, e.g. shape (M, 1).
+    """
+    plan = columns.evaluation_plan()
+    speed = columns.horizontal_velocity
+    along_wind, cross_wind = Wind.track_wind_components(reference_frame, wind_magnitude, wind_angle,
+                                                        columns.destination_heading)
+    true_speed = np.array(np.broadcast_to(speed, along_wind.shape), dtype=np.result_type(speed, along_wind))
+    ground_speed = true_speed.copy()
+
+    # RTA phases: the ground velocity is fixed, the aircraft flies whatever true velocity that takes
+    selection = plan.is_rta
+    true_along, true_cross = Wind.rta_velocity_wind_adjusted_batch(speed[selection],
+                                                                   along_wind[..., selection],
+                                                                   cross_wind[..., selection])
+    true_speed[..., selection] = norm(true_along, true_cross)
+
+    # Cruise: crab at the desired airspeed unless the wind is too strong
+    selection = plan.is_cruise
+    true_along, true_cross, ground_speed[..., selection] = Wind.wind_adjusted_true_velocity_batch(speed[selection],
+                                                                                                  along_wind[..., selection],
+                                                                                                  cross_wind[..., selection],
+                                                                                                  GROUND_SPEED_THRESHOLD)
+    true_speed[..., selection] = norm(true_along, true_cross)
+    return true_speed, ground_speed
+
+
+def _wind_correction(columns, wind_magnitude, wind_angle, reference_frame):
+    """
+    (crab angle (radians), |true_v|, |ground_v|) of every row, and a mask of the rows flown through the wind: the
+    RTA and cruise phases, the ones Aircraft.adjust_speed_based_on_wind corrects.
+    """
+    plan = columns.evaluation_plan()
+    speed = columns.horizontal_velocity
+    along_wind, cross_wind = Wind.track_wind_components(reference_frame, wind_magnitude, wind_angle,
+                                                        columns.destination_heading)
+    true_along, true_cross = Wind.rta_velocity_wind_adjusted_batch(speed, along_wind, cross_wind)
+    ground_speed = np.broadcast_to(speed, true_along.shape)
+    cruise = plan.is_cruise
+    cruise_along, cruise_cross, cruise_ground_speed = Wind.wind_adjusted_true_velocity_batch(speed, along_wind,
+                                                                                          cross_wind,
+                                                                                          GROUND_SPEED_THRESHOLD)
+    true_along = np.where(cruise, cruise_along, true_along)
+    true_cross = np.where(cruise, cruise_cross, true_cross)
+    ground_speed = np.where(cruise, cruise_ground_speed, ground_speed)
+    # Headings are clockwise from north and the cross-track axis points right of the track
+    crab_angle = np.arctan2(true_cross, true_along)
+    return crab_angle, norm(true_along, true_cross), ground_speed, plan.is_rta | cruise
+
+
+def _trace_route(tracer, columns, energy, time, wind_magnitude, wind_angle, reference_frame):
+    """Record the per-phase events Aircraft records when traced, one per flown row, in the order it flies them."""
+    crab_angle, true_speed, ground_speed, corrected = _wind_correction(columns, wind_magnitude, wind_angle,
+                                                                        reference_frame)
+    for row in np.flatnonzero(columns.phase != END):
+        wind_correction = None
+        if corrected[row]:
+            wind_correction = {'crab_angle_radians': float(crab_angle[row]),
+                               'true_airspeed': float(true_speed[row]),
+                               'ground_speed': float(ground_speed[row])}
+        tracer.add_phase_event(columns.flight_directions[columns.direction_index[row]], PHASES[columns.phase[row]],
+                               energy[row], time[row], wind_correction)
+
+
+def _phase_power(columns, aircraft_params, true_speed):
+    """
+    Power (W) every row draws at the true speeds of _wind_adjusted_velocities, NaN on END rows: the phase power
+    functions of power_model, evaluated for both ends of every row in one pass.
+    """
+    plan = columns.evaluation_plan()
+    tom = aircraft_params['mtom'] - aircraft_params['pax'] * aircraft_params['pax_mass']
+    rows = plan.sustained_rows
+
+    # Velocity the aircraft carries out of the previous row, then out of the row
+    previous_true_speed = true_speed[..., plan.previous]
+    previous_exit_velocity = np.where(plan.previous_is_rta,
+                                      np.sqrt(plan.previous_vertical_velocity_squared + previous_true_speed**2),
+                                      np.where(plan.previous_is_cruise, previous_true_speed,
+                                               plan.previous_horizontal_velocity))
+    start_air_speed = np.sqrt(np.where(plan.has_previous, previous_exit_velocity, 0)**2
+                              + plan.previous_vertical_velocity**2)
+    end_air_speed = np.sqrt(plan.vertical_velocity_squared + true_speed[..., rows]**2)
+
+    hover = hover_power(altitude=plan.endpoint_altitude,
+                        aircraft_params=aircraft_params,
+                        tom=tom,
+                        vertical_velocity=plan.endpoint_hover_vertical_velocity)
+    # Hovering endpoints have no airspeed; their climb power is computed, then discarded
+    with np.errstate(divide='ignore', invalid='ignore'):
+        climb = climb_descent_power(aircraft_params=aircraft_params,
+                                    tom=tom,
+                                    altitude=plan.endpoint_altitude,
+                                    vertical_velocity=plan.endpoint_vertical_velocity,
+                                    air_speed=np.concatenate(np.broadcast_arrays(start_air_speed, end_air_speed), axis=-1),
+                                    k_multiplier=plan.endpoint_k_multiplier)
+    endpoint_power = np.maximum(np.where(plan.endpoint_hovers, hover, climb), 0)
+    sustained = (endpoint_power[..., :len(rows)] + endpoint_power[..., len(rows):]) / 2
+    cruise = cruise_phase_power(cruise_speed=true_speed[..., plan.cruise_rows], aircraft_params=aircraft_params, tom=tom)
+
+    power = np.full(np.broadcast_shapes(sustained.shape[:-1], cruise.shape[:-1]) + (len(columns),), np.nan,
+                    dtype=np.result_type(sustained, cruise))
+    power[..., rows] = sustained
+    power[..., plan.cruise_rows] = cruise
+    return power
+
+
+def evaluate_route(columns, aircraft_params, wind_magnitude, wind_angle, reference_frame):
+    """
+    Vectorized equivalent of walking the route with the Aircraft phase methods.
+    wind_magnitude is in m/s and wind_angle in radians; both may be arrays broadcasting against the rows.
+    So may the VARIANT_PARAMS of aircraft_params, e.g. shape (variants, 1) to evaluate many aircraft at once.
+
+    Returns (energy, time, phase_totals): per-row energy (kWh) and time (s) in column order, NaN on END rows,
+    and an array of shape (..., directions, phases, 2) holding the phase energy and phase time totals.
+    """
+    plan = columns.evaluation_plan()
+    true_speed, ground_speed = _wind_adjusted_velocities(columns, wind_magnitude, wind_angle, reference_frame)
+    power = _phase_power(columns, aircraft_params, true_speed)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cruise_time = columns.horizontal_distance / ground_speed
+    time = np.where(plan.is_cruise, cruise_time, columns.travel_time)
+
+    energy = sec_to_hr(watt_to_kw(power) * time)
+    phase_totals = _phase_totals(columns, energy, time)
+
+    # Aircraft rounds the travel time it reports for every phase but cruise
+    energy = np.where(plan.is_flown, energy, np.nan)
+    time = np.where(plan.is_flown, np.where(plan.is_cruise, time, np.round(time, 2)), np.nan)
+    return energy, time, phase_totals
+
+
+def _phase_totals(columns, energy, time):
+    """Sum energy and time per (direction, phase). Returns an array of shape (..., directions, phases, 2)."""
+    plan = columns.evaluation_plan()
+    values = np.stack(np.broadcast_arrays(energy, time), axis=-1)[..., plan.group_order, :]
+    totals = np.zeros(values.shape[:-2] + (plan.n_groups, 2), dtype=values.dtype)
+    if len(plan.groups):
+        totals[..., plan.groups, :] = np.add.reduceat(values, plan.group_starts, axis=-2)
+    return totals.reshape(values.shape[:-2] + (len(columns.flight_directions), len(METRIC_PHASES), 2))
+
+
+def metrics_from_phase_totals(flight_directions, phase_totals):
+    """Wrap a (..., directions, phases, 2) totals array as the FlightMetrics Aircraft.metrics holds."""
+    return FlightMetrics(flight_directions, phase_totals)
+
+
+def compute_route_energy(columns, aircraft_params, wind):
+    """
+    Evaluate a RouteColumns for a single Wind. Returns (energy, time, metrics).
+    With tracing on (see utils.tracing), records the per-phase events and the evaluation time.
+    """
+    if wind.spatial:
+        # Winds that vary along the route (see wind.wind_field) give every row its own wind
+        wind_magnitude, wind_angle = wind.route_wind(columns)
+    else:
+        wind_magnitude, wind_angle = wind.wind_magnitude, wind.wind_angle
+    tracer = get_tracer()
+    start = perf_counter() if tracer is not None else None
+    energy, time, phase_totals = evaluate_route(columns=columns,
+                                                aircraft_params=aircraft_params,
+                                                wind_magnitude=wind_magnitude,
+                                                wind_angle=wind_angle,
+                                                reference_frame=wind.reference_frame)
+    if tracer is not None:
+        tracer.count_function('route_engine.evaluate_route', perf_counter() - start)
+        _trace_route(tracer, columns, energy, time, wind_magnitude, wind_angle, wind.reference_frame)
+    return energy, time, metrics_from_phase_totals(columns.flight_directions, phase_totals)
+
+
+def compute_energy_consumption_vectorized(route, flight_directions, aircraft, columns=None):
+    """
+    Drop-in replacement for main.compute_energy_consumption: adds the energy_consumption and time_to_complete
+    columns to the route and fills aircraft.metrics, without stepping the aircraft through every row.
+    Parsing the route takes about as long as evaluating it, so callers evaluating one route many times should pass
+    its RouteColumns (RouteColumns.from_dataframe(route, flight_directions), or compiled_route.load_compiled_route).
+    """
+    if columns is None:
+        columns = RouteColumns.from_dataframe(route, flight_directions)
+    energy, time, metrics = compute_route_energy(columns, aircraft.aircraft_params, aircraft.wind)
+
+    energy_consumption = np.full(len(route), np.nan)
+    time_to_complete = np.full(len(route), np.nan)
+    energy_consumption[columns.row_index] = energy
+    time_to_complete[columns.row_index] = time
+    route['energy_consumption'] = energy_consumption
+    route['time_to_complete'] = time_to_complete
+    aircraft.metrics = metrics
+    return route
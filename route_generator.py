@@ -0,0 +1,274 @@
+import argparse
+import numpy as np
+import pandas as pd
+from route_engine import RouteColumns, PHASES, HOVER_CLIMB, CLIMB_TRANSITION, CLIMB, CRUISE, DESCENT, \
+    DESCENT_TRANSITION, HOVER_DESCENT, END
+from compiled_route import save_compiled_route, compiled_route_path, file_hash
+from utils.helpers import haversine_dist, load_config
+from utils.units import miles_to_m
+from utils.vector_math import lat_long_to_heading
+
+# Radius (m) haversine_dist measures meters with, so generated waypoints sit where the derived distances put them
+EARTH_RADIUS = 6367000
+DEFAULT_CRUISE_SEGMENT_LENGTH = miles_to_m(1)
+# Waypoint slots of a flight direction, in flight order; the CRUISE slot repeats once per cruise segment
+HOVER_CLIMB_SLOT, CLIMB_TRANSITION_SLOT, CLIMB_SLOT, CRUISE_SLOT, DESCENT_SLOT, DESCENT_TRANSITION_SLOT, \
+    HOVER_DESCENT_SLOT, END_SLOT = range(8)
+# Phase of every slot
+SLOT_PHASES = np.array([HOVER_CLIMB, CLIMB_TRANSITION, CLIMB, CRUISE, DESCENT, DESCENT_TRANSITION, HOVER_DESCENT, END],
+                       dtype=np.int8)
+# Route CSV columns, in file order
+CSV_COLUMNS = ('flight_direction', 'waypoint_id', 'latitude', 'longitude', 'altitude', 'phase', 'distance_to_next_meters',
+               'altitude_difference', 'vertical_velocity', 'horizontal_velocity', 'time_to_complete',
+               'destination_heading_radians')
+
+
+def phase_profile(aircraft_params):
+    """
+    Vertical profile of every flight from the aircraft_params phase fields, per waypoint slot (see SLOT_PHASES):
+    altitude (m), vertical and horizontal velocity (m/s) and the ground distance (m) from the origin (departure slots)
+    or to the destination (arrival slots). Transitions accelerate from or decelerate to a hover over their
+    time_climb_transition / time_descend_transition, so they cover half the ground their horizontal velocity would;
+    climb and descent fly the rest of the way between the transitions and cruise_altitude.
+    """
+    ground = aircraft_params['ground_altitude']
+    hover = ground + aircraft_params['hover_altitude']
+    cruise = ground + aircraft_params['cruise_altitude']
+    climb_transition_time = aircraft_params['time_climb_transition']
+    descent_transition_time = aircraft_params['time_descend_transition']
+    climb_start = hover + aircraft_params['climb_transition_vertical_velocity'] * climb_transition_time
+    descent_end = hover + aircraft_params['descend_transition_vertical_velocity'] * descent_transition_time
+    if not hover < climb_start < cruise or not hover < descent_end < cruise:
+        raise ValueError('The climb and descent transitions must end between hover_altitude and cruise_altitude.')
+
+    climb_velocity = aircraft_params['climb_phase_vertical_velocity']
+    descent_velocity = aircraft_params['descend_phase_vertical_velocity']
+    climb_ground = aircraft_params['climb_phase_end_forward_velocity'] * (cruise - climb_start) / climb_velocity
+    descent_ground = aircraft_params['descend_phase_end_forward_velocity'] * (cruise - descent_end) / descent_velocity
+    climb_transition_ground = aircraft_params['climb_transition_end_forward_velocity'] * climb_transition_time / 2
+    descent_transition_ground = (aircraft_params['descend_phase_end_forward_velocity'] +
+                                 aircraft_params['descend_transition_end_forward_velocity']) * descent_transition_time / 2
+    return {
+        'altitude': np.array([ground, hover, climb_start, cruise, cruise, descent_end, hover, ground], dtype=np.float64),
+        'vertical_velocity': np.array([aircraft_params['vertical_takeoff_velocity'],
+                                       aircraft_params['climb_transition_vertical_velocity'],
+                                       climb_velocity, 0, descent_velocity,
+                                       aircraft_params['descend_transition_vertical_velocity'],
+                                       aircraft_params['vertical_landing_velocity'], np.nan], dtype=np.float64),
+        'horizontal_velocity': np.array([0, aircraft_params['climb_transition_end_forward_velocity'],
+                                         aircraft_params['climb_phase_end_forward_velocity'],
+                                         aircraft_params['cruise_speed'],
+                                         aircraft_params['descend_phase_end_forward_velocity'],
+                                         aircraft_params['descend_phase_end_forward_velocity'], 0, np.nan],
+                                        dtype=np.float64),
+        'ground_distance': np.array([0, 0, climb_transition_ground, climb_transition_ground + climb_ground,
+                                     descent_ground + descent_transition_ground, descent_transition_ground, 0, 0],
+                                    dtype=np.float64)
+    }
+
+
+def _unit_vectors(latitude, longitude):
+    latitude, longitude = np.radians(latitude), np.radians(longitude)
+    return np.stack([np.cos(latitude) * np.cos(longitude), np.cos(latitude) * np.sin(longitude), np.sin(latitude)], axis=-1)
+
+
+def _central_angles(start, end):
+    """Angle (radians) between unit vectors, accurate for nearby and antipodal points alike."""
+    return np.arctan2(np.linalg.norm(np.cross(start, end), axis=-1), np.sum(start * end, axis=-1))
+
+
+def _vertiport_points(vertiports):
+    return _unit_vectors(vertiports['latitude'].to_numpy(dtype=np.float64),
+                         vertiports['longitude'].to_numpy(dtype=np.float64))
+
+
+def all_pairs(vertiports, aircraft_params=None):
+    """
+    (origin, destination) index pairs of every ordered pair of distinct vertiports. Given aircraft_params, pairs too
+    close to fit the climb and descent (see phase_profile) are left out.
+    """
+    origins, destinations = np.nonzero(~np.eye(len(vertiports), dtype=bool))
+    if aircraft_params is not None:
+        profile = phase_profile(aircraft_params)
+        points = _vertiport_points(vertiports)
+        distance = EARTH_RADIUS * _central_angles(points[origins], points[destinations])
+        reachable = distance > profile['ground_distance'][CRUISE_SLOT] + profile['ground_distance'][DESCENT_SLOT]
+        origins, destinations = origins[reachable], destinations[reachable]
+    return origins, destinations
+
+
+def generate_waypoints(vertiports, origins, destinations, aircraft_params,
+                       cruise_segment_length=DEFAULT_CRUISE_SEGMENT_LENGTH, cruise_segments=None):
+    """
+    Phase-segmented waypoints of one flight direction per (origin, destination) pair, for all pairs at once.
+    Flights follow the great circle between the vertiports: hover climb, climb transition and climb out of the
+    origin, cruise_segments equal cruise segments (default: as many as it takes to keep them no longer than
+    cruise_segment_length meters), then descent, descent transition and hover descent into the destination.
+    Derived columns follow preprocess_route.
+    :param vertiports: DataFrame of name, latitude, longitude (degrees)
+    :param origins: row positions in vertiports of each flight's origin; destinations likewise
+    :return: dict of flat per-waypoint arrays, direction by direction, holding the numeric route CSV columns (phase
+             as PHASES codes), the direction_index (pair position), slot (see SLOT_PHASES) and waypoint_number
+    """
+    origins = np.asarray(origins, dtype=np.int64).ravel()
+    destinations = np.asarray(destinations, dtype=np.int64).ravel()
+    profile = phase_profile(aircraft_params)
+    departure_distance = profile['ground_distance'][CRUISE_SLOT]
+    arrival_distance = profile['ground_distance'][DESCENT_SLOT]
+
+    points = _vertiport_points(vertiports)
+    start, end = points[origins], points[destinations]
+    angle = _central_angles(start, end)
+    distance = EARTH_RADIUS * angle
+    cruise_distance = distance - departure_distance - arrival_distance
+    if np.any(cruise_distance <= 0):
+        raise ValueError(f'{np.count_nonzero(cruise_distance <= 0)} pairs are too close to climb to and descend from '
+                         f'cruise_altitude ({departure_distance + arrival_distance:.0f} m); see all_pairs.')
+    if cruise_segments is None:
+        n_cruise = np.ceil(cruise_distance / cruise_segment_length).astype(np.int64)
+    else:
+        n_cruise = np.full(len(origins), int(cruise_segments), dtype=np.int64)
+
+    # Each direction has every slot once and the CRUISE slot n_cruise times
+    counts = len(SLOT_PHASES) - 1 + n_cruise
+    direction = np.repeat(np.arange(len(origins)), counts)
+    position = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    n_row_cruise = n_cruise[direction]
+    slot = np.where(position < CRUISE_SLOT, position,
+                    np.where(position < CRUISE_SLOT + n_row_cruise, CRUISE_SLOT, position - n_row_cruise + 1))
+    # Cruise waypoints and the top of descent after them are numbered from 1 within their flight direction
+    waypoint_number = np.where((slot == CRUISE_SLOT) | (slot == DESCENT_SLOT), position - CRUISE_SLOT + 1, 0)
+
+    # Ground distance flown from the origin, then the point that far along the great circle
+    along = np.where(slot <= CRUISE_SLOT, profile['ground_distance'][slot],
+                     distance[direction] - profile['ground_distance'][slot])
+    along = along + np.where(slot == CRUISE_SLOT, waypoint_number - 1, 0) * (cruise_distance / n_cruise)[direction]
+    row_angle = angle[direction]
+    fraction = along / distance[direction]
+    weights = np.stack([np.sin((1 - fraction) * row_angle), np.sin(fraction * row_angle)]) / np.sin(row_angle)
+    point = weights[0, :, np.newaxis] * start[direction] + weights[1, :, np.newaxis] * end[direction]
+    latitude = np.degrees(np.arcsin(np.clip(point[:, 2], -1, 1)))
+    longitude = np.degrees(np.arctan2(point[:, 1], point[:, 0]))
+    # The hover waypoints sit exactly over the vertiports
+    for over_vertiport, index in ((slot <= CLIMB_TRANSITION_SLOT, origins), (slot >= HOVER_DESCENT_SLOT, destinations)):
+        vertiport = index[direction[over_vertiport]]
+        latitude[over_vertiport] = vertiports['latitude'].to_numpy(dtype=np.float64)[vertiport]
+        longitude[over_vertiport] = vertiports['longitude'].to_numpy(dtype=np.float64)[vertiport]
+
+    altitude = profile['altitude'][slot]
+    vertical_velocity = profile['vertical_velocity'][slot]
+    horizontal_velocity = profile['horizontal_velocity'][slot]
+    has_next = slot[:-1] != END_SLOT
+    distance_to_next = np.zeros(len(slot))
+    distance_to_next[:-1] = np.where(has_next, haversine_dist(latitude[:-1], longitude[:-1],
+                                                              latitude[1:], longitude[1:], unit='meter'), 0)
+    altitude_difference = np.full(len(slot), np.nan)
+    altitude_difference[:-1] = np.where(has_next, altitude[1:] - altitude[:-1], np.nan)
+    heading = np.full(len(slot), np.nan)
+    heading[:-1] = np.where(has_next, np.mod(lat_long_to_heading(np.radians(latitude[:-1]), np.radians(longitude[:-1]),
+                                                                 np.radians(latitude[1:]), np.radians(longitude[1:])),
+                                             2 * np.pi), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        time_to_complete = np.where(vertical_velocity > 0, np.abs(altitude_difference) / vertical_velocity,
+                                    distance_to_next / horizontal_velocity)
+    return {
+        'direction_index': direction,
+        'latitude': latitude,
+        'longitude': longitude,
+        'altitude': altitude,
+        'phase': SLOT_PHASES[slot],
+        'distance_to_next_meters': distance_to_next,
+        'altitude_difference': altitude_difference,
+        'vertical_velocity': vertical_velocity,
+        'horizontal_velocity': horizontal_velocity,
+        'time_to_complete': np.where(np.isnan(altitude_difference), np.nan, time_to_complete),
+        'destination_heading_radians': heading,
+        'slot': slot,
+        'waypoint_number': waypoint_number
+    }
+
+
+def flight_direction_names(vertiports, origins, destinations):
+    names = vertiports['name'].astype(str).to_numpy(dtype=object)
+    return list(names[np.asarray(origins)] + '_' + names[np.asarray(destinations)])
+
+
+def generate_route_columns(vertiports, origins, destinations, aircraft_params,
+                           cruise_segment_length=DEFAULT_CRUISE_SEGMENT_LENGTH, cruise_segments=None):
+    """
+    RouteColumns of one flight direction per (origin, destination) pair (see generate_waypoints), ready for
+    evaluate_route without a round trip through a route file.
+    """
+    waypoints = generate_waypoints(vertiports, origins, destinations, aircraft_params, cruise_segment_length,
+                                   cruise_segments)
+    phase = waypoints['phase']
+    # Every direction has a single climb and descent transition, both at a vertiport
+    return RouteColumns(flight_directions=flight_direction_names(vertiports, origins, destinations),
+                        direction_index=waypoints['direction_index'],
+                        phase=phase,
+                        horizontal_distance=waypoints['distance_to_next_meters'],
+                        vertical_distance=waypoints['altitude_difference'],
+                        horizontal_velocity=waypoints['horizontal_velocity'],
+                        vertical_velocity=waypoints['vertical_velocity'],
+                        travel_time=waypoints['time_to_complete'],
+                        altitude=waypoints['altitude'],
+                        is_first_last_time=(phase == CLIMB_TRANSITION) | (phase == DESCENT_TRANSITION),
+                        destination_heading=waypoints['destination_heading_radians'],
+                        latitude=waypoints['latitude'],
+                        longitude=waypoints['longitude'])
+
+
+def generate_route(vertiports, origins, destinations, aircraft_params,
+                   cruise_segment_length=DEFAULT_CRUISE_SEGMENT_LENGTH, cruise_segments=None):
+    """Route DataFrame in the route CSV format, one flight direction per (origin, destination) pair (see generate_waypoints)."""
+    waypoints = generate_waypoints(vertiports, origins, destinations, aircraft_params, cruise_segment_length,
+                                   cruise_segments)
+    direction = waypoints['direction_index']
+    names = vertiports['name'].astype(str).to_numpy(dtype=object)
+    origin = names[np.asarray(origins)][direction]
+    destination = names[np.asarray(destinations)][direction]
+    slot = waypoints['slot']
+    slot_names = np.array(['_FATO', '_hover_fix', '_departure_fix', '', '', '_approach_fix', '_hover_fix', '_FATO'],
+                          dtype=object)
+    waypoint_id = np.where(slot <= CLIMB_SLOT, origin, destination) + slot_names[slot]
+    numbered = waypoints['waypoint_number'] > 0
+    waypoint_id[numbered] = (origin[numbered] + '_' + destination[numbered] + '_waypoint_' +
+                             waypoints['waypoint_number'][numbered].astype(str).astype(object))
+    route = pd.DataFrame({column: waypoints[column] for column in CSV_COLUMNS if column in waypoints})
+    route['flight_direction'] = origin + '_' + destination
+    route['waypoint_id'] = waypoint_id
+    route['phase'] = np.asarray(PHASES, dtype=object)[waypoints['phase']]
+    return route[list(CSV_COLUMNS)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate phase-segmented route files between vertiports")
+    parser.add_argument('-v', '--vertiports', required=True, help="CSV of vertiport name, latitude, longitude")
+    parser.add_argument('-p', '--aircraft_params', default="data/aircraft_params.json", help="Aircraft params file")
+    parser.add_argument('-od', '--origin_destination', nargs=2, action='append', metavar=('ORIGIN', 'DESTINATION'),
+                        help="Vertiport pair to fly both ways; repeat. Default: every pair far enough apart")
+    segmentation = parser.add_mutually_exclusive_group()
+    segmentation.add_argument('-sl', '--cruise_segment_length', type=float, default=DEFAULT_CRUISE_SEGMENT_LENGTH,
+                              help="Longest cruise segment (m)")
+    segmentation.add_argument('-n', '--cruise_segments', type=int, help="Number of cruise segments of every flight")
+    parser.add_argument('-o', '--output', required=True, help="Route CSV file to write")
+    parser.add_argument('-c', '--compile', action='store_true', help="Also write the compiled bundle of the route")
+    args = parser.parse_args()
+
+    vertiports = pd.read_csv(args.vertiports)
+    aircraft_params = load_config(args.aircraft_params)
+    if args.origin_destination:
+        index = pd.Index(vertiports['name'].astype(str))
+        pairs = index.get_indexer([name for pair in args.origin_destination for name in pair]).reshape(-1, 2)
+        if np.any(pairs < 0):
+            parser.error('every --origin_destination vertiport must be in --vertiports')
+        # Both ways, like the route files: origin to destination, then back
+        origins, destinations = pairs.ravel(), pairs[:, ::-1].ravel()
+    else:
+        origins, destinations = all_pairs(vertiports, aircraft_params)
+    options = dict(vertiports=vertiports, origins=origins, destinations=destinations, aircraft_params=aircraft_params,
+                   cruise_segment_length=args.cruise_segment_length, cruise_segments=args.cruise_segments)
+    generate_route(**options).to_csv(args.output, index=False)
+    if args.compile:
+        save_compiled_route(generate_route_columns(**options), compiled_route_path(args.output), file_hash(args.output))
+    print(f'Wrote {len(origins)} flight directions to {args.output}')
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+from route_engine import RouteColumns, compute_route_energy
+from utils.helpers import preprocess_route
+from utils.profiling import Profiler
+
+# Rows read from the route CSV at a time
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+def iter_route_directions(csv_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield (flight_direction, rows DataFrame) from a route CSV, one flight direction at a time, without reading the
+    whole file. Each direction's rows must be contiguous in the file; a direction is yielded as soon as the first row
+    of the next one is read, so at most one direction plus one chunk is held in memory.
+    """
+    finished = set()
+    pending = []
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        directions = chunk['flight_direction'].to_numpy()
+        boundaries = np.flatnonzero(directions[1:] != directions[:-1]) + 1
+        for part in np.split(np.arange(len(chunk)), boundaries):
+            rows = chunk.iloc[part]
+            direction = rows['flight_direction'].iat[0]
+            if pending and pending[0]['flight_direction'].iat[0] != direction:
+                yield _finish_direction(pending, finished)
+                pending = []
+            if direction in finished:
+                raise ValueError(f'Rows of flight direction {direction} are not contiguous in {csv_path}; '
+                                 'sort the route by flight_direction to stream it.')
+            pending.append(rows)
+    if pending:
+        yield _finish_direction(pending, finished)
+
+
+def _finish_direction(parts, finished):
+    rows = pd.concat(parts, ignore_index=True)
+    direction = rows['flight_direction'].iat[0]
+    finished.add(direction)
+    return direction, rows
+
+
+def stream_route_energy(csv_path, aircraft_params, wind, segments_path=None, totals_path=None,
+                        chunk_size=DEFAULT_CHUNK_SIZE, profiler=None):
+    """
+    Streaming equivalent of main.py's single run for route files too large to hold in memory.
+    Every flight direction is preprocessed and evaluated as soon as its last row is read. Its rows, with the
+    energy_consumption and time_to_complete columns added, are appended to segments_path, and its total
+    energy_consumption (kWh) and flight_time (s) to totals_path.
+    With a utils.profiling.Profiler, preprocessing, evaluation and writes are timed as stages, once per direction.
+    Returns the total energy consumption and flight time of every direction, as two dicts.
+    """
+    profiler = profiler or Profiler(enabled=False)
+    total_energy_consumption, total_flight_time = {}, {}
+    for k, (direction, route) in enumerate(iter_route_directions(csv_path, chunk_size)):
+        with profiler.stage('preprocessing'):
+            route = preprocess_route(route, [direction], overwrite=False)
+            columns = RouteColumns.from_dataframe(route, [direction])
+        with profiler.stage('energy computation (vectorized)'):
+            energy, time, metrics = compute_route_energy(columns, aircraft_params, wind)
+
+            route['energy_consumption'] = np.full(len(route), np.nan)
+            route['time_to_complete'] = np.full(len(route), np.nan)
+            route.loc[columns.row_index, 'energy_consumption'] = energy
+            route.loc[columns.row_index, 'time_to_complete'] = time
+            total_energy_consumption[direction] = sum(metrics[direction]['phase_energy'].values())
+            total_flight_time[direction] = sum(metrics[direction]['phase_time'].values())
+
+        with profiler.stage('CSV write'):
+            if segments_path is not None:
+                route.to_csv(segments_path, mode='w' if k == 0 else 'a', header=k == 0, index=False)
+            if totals_path is not None:
+                pd.DataFrame({'flight_direction': [direction],
+                              'energy_consumption': [total_energy_consumption[direction]],
+                              'flight_time': [total_flight_time[direction]]}).to_csv(
+                    totals_path, mode='w' if k == 0 else 'a', header=k == 0, index=False)
+    return total_energy_consumption, total_flight_time
@@ -1,12 +1,20 @@
-# Run main.py multiple times with different wind configs
-import subprocess
+# Run the route with different wind configs in one process (previously one main.py subprocess per config)
+import pandas as pd
+from results_store import ResultsStore
+from utils.helpers import load_config
+from wind_sweep import wind_sweep
 
 wind_speeds = [10, 20, 30, 40] # mph
 wind_directions = [0, 90, 180] # degrees
 file_path = 'routes/sfo_sjc_route_60_miles.csv'
 
-for ws in wind_speeds:
-    for wd in wind_directions:
-        command = f'python3 main.py --file {file_path} --wind_speed {ws} --wind_direction {wd}'
-        subprocess.run(command, shell=True)
-        print(f'Completed run with wind speed {ws}mph and wind direction {wd} degrees relative to the aircraft.')
+route = pd.read_csv(file_path)
+aircraft_params = load_config("data/aircraft_params.json")
+results = wind_sweep(route=route,
+                     aircraft_params=aircraft_params,
+                     wind_speeds=wind_speeds,
+                     wind_directions=wind_directions)
+
+with ResultsStore('energy_and_flight_time_60_mile_route.sqlite') as store:
+    store.add_results(results, route=file_path, aircraft_params=aircraft_params)
+print(f'Completed {len(wind_speeds) * len(wind_directions)} runs with wind speeds {wind_speeds}mph and wind directions {wind_directions} degrees relative to the aircraft.')
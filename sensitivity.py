@@ -0,0 +1,236 @@
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+from route_engine import RouteColumns, evaluate_route, VARIANT_PARAMS
+from utils.units import mph_to_metersec, degrees_to_radians, sec_to_min
+
+# Inputs besides the VARIANT_PARAMS of aircraft_params; wind speed in mph, wind direction in degrees
+WIND_INPUTS = ('wind_speed', 'wind_direction')
+DEFAULT_WIND_BOUNDS = {'wind_speed': (0.0, 40.0), 'wind_direction': (0.0, 360.0)}
+# VARIANT_PARAMS the power model never reads (climb and descent draw through eta_hover), left out of the default bounds
+UNREAD_PARAMS = ('eta_climb', 'eta_descend')
+# Default range of an aircraft param: its value in aircraft_params, plus or minus this fraction
+DEFAULT_RELATIVE_RANGE = 0.1
+# Samples evaluated together, so that (samples x route rows) arrays stay a few MB
+SAMPLE_CHUNK_SIZE = 4096
+BOOTSTRAP_RESAMPLES = 100
+CONFIDENCE_LEVEL = 0.95
+METRICS = {'energy_consumption': 0, 'flight_time': 1}
+
+# Route and aircraft a worker evaluates, set once per process by _init_worker
+_worker_state = {}
+
+
+def default_bounds(aircraft_params, names=None, relative_range=DEFAULT_RELATIVE_RANGE):
+    """
+    Uniform (low, high) bounds of inputs: aircraft params within relative_range of their value, plus the wind.
+    By default every VARIANT_PARAMS entry the power model reads and aircraft_params sets, and the wind.
+    """
+    names = names or [name for name in VARIANT_PARAMS
+                      if name not in UNREAD_PARAMS and aircraft_params.get(name)] + list(WIND_INPUTS)
+    bounds = {}
+    for name in names:
+        if name in DEFAULT_WIND_BOUNDS:
+            bounds[name] = DEFAULT_WIND_BOUNDS[name]
+        else:
+            value = float(aircraft_params[name])
+            bounds[name] = tuple(sorted((value * (1 - relative_range), value * (1 + relative_range))))
+    return bounds
+
+
+def _check_bounds(bounds):
+    unknown = set(bounds) - set(VARIANT_PARAMS) - set(WIND_INPUTS)
+    if unknown:
+        raise ValueError(f'Only {", ".join(VARIANT_PARAMS + WIND_INPUTS)} can vary, not {", ".join(sorted(unknown))}.')
+    if any(not low < high for low, high in bounds.values()):
+        raise ValueError('Every input needs low < high bounds.')
+
+
+def evaluate_samples(columns, aircraft_params, names, samples, reference_frame='relative_to_aircraft'):
+    """
+    Energy (kWh) and flight time (minutes) of every flight direction for samples of shape (n, len(names)), where
+    each row is one aircraft variant flying in its own wind. Returns an array of shape (n, directions, 2).
+    """
+    params = dict(aircraft_params)
+    wind = {'wind_speed': np.zeros((len(samples), 1)), 'wind_direction': np.zeros((len(samples), 1))}
+    for i, name in enumerate(names):
+        (wind if name in WIND_INPUTS else params)[name] = samples[:, i, np.newaxis]
+    _, _, phase_totals = evaluate_route(columns=columns,
+                                        aircraft_params=params,
+                                        wind_magnitude=mph_to_metersec(wind['wind_speed']),
+                                        wind_angle=degrees_to_radians(wind['wind_direction']),
+                                        reference_frame=reference_frame)
+    totals = phase_totals.sum(axis=-2)
+    totals[..., 1] = sec_to_min(totals[..., 1])
+    return totals
+
+
+def _init_worker(columns, aircraft_params, names, reference_frame):
+    _worker_state.update(columns=columns, aircraft_params=aircraft_params, names=names, reference_frame=reference_frame)
+
+
+def _run_task(samples):
+    return evaluate_samples(samples=samples, **_worker_state)
+
+
+class SampleEvaluator:
+    """
+    Evaluates chunks of unit-cube samples, scaled to the input bounds, on a process pool (or inline with one worker).
+    Chunks are evaluated in submission order; use as a context manager so the pool is shut down.
+    """
+
+    def __init__(self, columns, aircraft_params, bounds, reference_frame='relative_to_aircraft', workers=None):
+        _check_bounds(bounds)
+        self.names = list(bounds)
+        self.low = np.array([bounds[name][0] for name in self.names])
+        self.span = np.array([bounds[name][1] - bounds[name][0] for name in self.names])
+        self.state = (columns, aircraft_params, self.names, reference_frame)
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = None
+
+    def __enter__(self):
+        if self.workers > 1:
+            self.pool = multiprocessing.Pool(processes=self.workers, initializer=_init_worker, initargs=self.state)
+        else:
+            _init_worker(*self.state)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def evaluate(self, unit_chunks):
+        """Returns the concatenated (n, directions, 2) outputs of an iterable of (chunk, inputs) unit samples."""
+        scaled = (self.low + chunk * self.span for chunk in unit_chunks)
+        results = self.pool.imap(_run_task, scaled) if self.pool is not None else map(_run_task, scaled)
+        return np.concatenate(list(results))
+
+
+def _chunks(n, chunk_size, make_chunk):
+    for start in range(0, n, chunk_size):
+        yield make_chunk(start, min(start + chunk_size, n))
+
+
+def _sobol_indices(y_a, y_b, y_ab):
+    """First-order (Saltelli 2010) and total (Jansen) indices from outputs of shape (n, ...) and (inputs, n, ...)."""
+    variance = np.var(np.concatenate([y_a, y_b]), axis=0)
+    first_order = np.mean(y_b * (y_ab - y_a), axis=1) / variance
+    total = 0.5 * np.mean((y_a - y_ab) ** 2, axis=1) / variance
+    return first_order, total
+
+
+def sobol_analysis(route, aircraft_params, bounds=None, n_samples=10_000, metric='energy_consumption',
+                   reference_frame='relative_to_aircraft', bootstrap=BOOTSTRAP_RESAMPLES,
+                   confidence=CONFIDENCE_LEVEL, seed=None, workers=None, chunk_size=SAMPLE_CHUNK_SIZE):
+    """
+    First-order and total Sobol indices of the trip energy (or flight time) of every flight direction, with
+    bootstrap confidence intervals. Inputs are uniform within bounds (see default_bounds). The Saltelli design
+    takes n_samples * (inputs + 2) model evaluations; it is generated chunk by chunk, so only the two base sample
+    matrices and the outputs are ever held in memory.
+    :param route: route DataFrame (as read from a route CSV) or RouteColumns
+    :return: DataFrame with one row per (flight_direction, input) holding S1 and ST and their confidence bounds
+    """
+    columns = route if isinstance(route, RouteColumns) else RouteColumns.from_dataframe(route)
+    bounds = bounds or default_bounds(aircraft_params)
+    rng = np.random.default_rng(seed)
+    n_inputs = len(bounds)
+    a = rng.random((n_samples, n_inputs))
+    b = rng.random((n_samples, n_inputs))
+
+    def ab_chunk(i):
+        def make_chunk(start, stop):
+            chunk = a[start:stop].copy()
+            chunk[:, i] = b[start:stop, i]
+            return chunk
+        return make_chunk
+
+    output = METRICS[metric]
+    with SampleEvaluator(columns, aircraft_params, bounds, reference_frame, workers) as evaluator:
+        y_a = evaluator.evaluate(_chunks(n_samples, chunk_size, lambda start, stop: a[start:stop]))[..., output]
+        y_b = evaluator.evaluate(_chunks(n_samples, chunk_size, lambda start, stop: b[start:stop]))[..., output]
+        y_ab = np.stack([evaluator.evaluate(_chunks(n_samples, chunk_size, ab_chunk(i)))[..., output]
+                         for i in range(n_inputs)])
+
+    first_order, total = _sobol_indices(y_a, y_b, y_ab)
+    resampled = [[], []]
+    for _ in range(bootstrap):
+        rows = rng.integers(0, n_samples, n_samples)
+        for estimates, index in zip(resampled, _sobol_indices(y_a[rows], y_b[rows], y_ab[:, rows])):
+            estimates.append(index)
+    tails = 100 * np.array([(1 - confidence) / 2, (1 + confidence) / 2])
+    if bootstrap:
+        (s1_low, s1_high), (st_low, st_high) = (np.percentile(estimates, tails, axis=0) for estimates in resampled)
+    else:
+        s1_low = s1_high = st_low = st_high = np.full_like(first_order, np.nan)
+
+    # Index arrays are (inputs, directions); rows go direction by direction
+    n_flight_directions = len(columns.flight_directions)
+    return pd.DataFrame({
+        'flight_direction': np.repeat(np.asarray(columns.flight_directions, dtype=object), n_inputs),
+        'input': np.tile(np.asarray(list(bounds), dtype=object), n_flight_directions),
+        'S1': first_order.T.ravel(),
+        'S1_low': s1_low.T.ravel(),
+        'S1_high': s1_high.T.ravel(),
+        'ST': total.T.ravel(),
+        'ST_low': st_low.T.ravel(),
+        'ST_high': st_high.T.ravel()
+    })
+
+
+def morris_trajectories(rng, n_trajectories, n_inputs, levels=4):
+    """
+    Morris one-at-a-time trajectories in the unit cube, of shape (trajectories, inputs + 1, inputs), and the
+    signed step taken on each input, of shape (trajectories, inputs). Each trajectory moves every input once, in a
+    random order, by +/- levels / (2 (levels - 1)).
+    """
+    delta = levels / (2 * (levels - 1))
+    grid = np.arange(levels) / (levels - 1)
+    start_levels = grid[grid <= 1 - delta + 1e-12]
+    base = rng.choice(start_levels, size=(n_trajectories, n_inputs))
+    signs = rng.choice((-1.0, 1.0), size=(n_trajectories, n_inputs))
+    # Inputs stepped down start delta higher, so every point stays on the grid inside the unit cube
+    base = base + np.where(signs < 0, delta, 0)
+    orders = np.argsort(rng.random((n_trajectories, n_inputs)), axis=1)
+
+    trajectories = np.repeat(base[:, np.newaxis], n_inputs + 1, axis=1)
+    steps = signs * delta
+    for step in range(n_inputs):
+        moved = orders[:, step]
+        rows = np.arange(n_trajectories)
+        trajectories[rows, step + 1:, moved] += steps[rows, moved][:, np.newaxis]
+    return trajectories, steps, orders
+
+
+def morris_analysis(route, aircraft_params, bounds=None, n_trajectories=100, levels=4, metric='energy_consumption',
+                    reference_frame='relative_to_aircraft', seed=None, workers=None, chunk_size=SAMPLE_CHUNK_SIZE):
+    """
+    Morris elementary effects screening: n_trajectories * (inputs + 1) model evaluations.
+    Effects are in output units per unit of the input's range.
+    :return: DataFrame with one row per (flight_direction, input) holding mu, mu_star and sigma of the effects
+    """
+    columns = route if isinstance(route, RouteColumns) else RouteColumns.from_dataframe(route)
+    bounds = bounds or default_bounds(aircraft_params)
+    rng = np.random.default_rng(seed)
+    n_inputs = len(bounds)
+    trajectories, steps, orders = morris_trajectories(rng, n_trajectories, n_inputs, levels)
+    points = trajectories.reshape(-1, n_inputs)
+    with SampleEvaluator(columns, aircraft_params, bounds, reference_frame, workers) as evaluator:
+        y = evaluator.evaluate(_chunks(len(points), chunk_size, lambda start, stop: points[start:stop]))
+    y = y[..., METRICS[metric]].reshape(n_trajectories, n_inputs + 1, -1)
+
+    # Effect of the input moved at each step of each trajectory, scattered back to input order
+    rows = np.arange(n_trajectories)[:, np.newaxis]
+    effects = np.empty((n_trajectories, n_inputs, y.shape[-1]))
+    effects[rows, orders] = np.diff(y, axis=1) / steps[rows, orders][..., np.newaxis]
+
+    n_flight_directions = len(columns.flight_directions)
+    return pd.DataFrame({
+        'flight_direction': np.repeat(np.asarray(columns.flight_directions, dtype=object), n_inputs),
+        'input': np.tile(np.asarray(list(bounds), dtype=object), n_flight_directions),
+        'mu': effects.mean(axis=0).T.ravel(),
+        'mu_star': np.abs(effects).mean(axis=0).T.ravel(),
+        'sigma': effects.std(axis=0, ddof=1).T.ravel() if n_trajectories > 1 else np.nan
+    })
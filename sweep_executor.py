@@ -0,0 +1,142 @@
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+from compiled_route import load_compiled_route
+from route_engine import RouteColumns, METRIC_PHASES
+from utils.helpers import load_config
+from utils.profiling import Profiler
+from utils.units import mph_to_metersec, degrees_to_radians
+from wind_sweep import evaluate_wind_cases, results_table
+
+# Each worker task covers this many wind cases at most, so a task stays in the tens of milliseconds
+MAX_CASES_PER_TASK = 2048
+# Aim for several tasks per worker so that uneven routes still balance across the pool
+TASKS_PER_WORKER = 4
+
+# Routes and aircraft configs a worker evaluates, set once per process by _init_worker
+_worker_state = {}
+
+
+def _init_worker(routes, aircraft_configs, reference_frame):
+    # Routes given as CSV paths are memory-mapped from their compiled bundle rather than unpickled
+    _worker_state['routes'] = {name: load_compiled_route(route) if isinstance(route, str) else route
+                               for name, route in routes.items()}
+    _worker_state['aircraft_configs'] = aircraft_configs
+    _worker_state['reference_frame'] = reference_frame
+
+
+def _run_task(task):
+    """Evaluate one chunk of wind cases for one (route, aircraft config) pair inside a worker."""
+    route_name, config_name, wind_magnitudes, wind_angles = task
+    return evaluate_wind_cases(columns=_worker_state['routes'][route_name],
+                               aircraft_params=_worker_state['aircraft_configs'][config_name],
+                               wind_magnitudes=wind_magnitudes,
+                               wind_angles=wind_angles,
+                               reference_frame=_worker_state['reference_frame'])
+
+
+def _load_routes(routes):
+    """
+    Accept a list of route CSV paths or a {name: path | DataFrame | RouteColumns} dict; parse every route once.
+    Returns the RouteColumns of every route, and what to ship to the workers: the CSV path when the route has a
+    compiled bundle the workers can map, the RouteColumns otherwise.
+    """
+    if not isinstance(routes, dict):
+        routes = {path: path for path in routes}
+    loaded, shipped = {}, {}
+    for name, route in routes.items():
+        if isinstance(route, str):
+            loaded[name] = load_compiled_route(route)
+        else:
+            loaded[name] = route if isinstance(route, RouteColumns) else RouteColumns.from_dataframe(route)
+        shipped[name] = route if isinstance(route, str) else loaded[name]
+    return loaded, shipped
+
+
+def _load_aircraft_configs(aircraft_configs):
+    """Accept a list of aircraft params JSON paths or a {name: params dict} dict."""
+    if not isinstance(aircraft_configs, dict):
+        aircraft_configs = {path: path for path in aircraft_configs}
+    return {name: load_config(params) if isinstance(params, str) else params for name, params in aircraft_configs.items()}
+
+
+def _cases_per_task(n_jobs, n_cases, workers):
+    target_tasks = max(workers * TASKS_PER_WORKER, 1)
+    chunks_per_job = max(int(np.ceil(target_tasks / max(n_jobs, 1))), 1)
+    return int(min(max(np.ceil(n_cases / chunks_per_job), 1), MAX_CASES_PER_TASK))
+
+
+def _sweep_table(route_name, config_name, flight_directions, wind_speeds, wind_directions, phase_totals):
+    """results_table of one (route, aircraft config) chunk, with the route and aircraft_config columns in front."""
+    table = results_table(flight_directions=flight_directions,
+                          wind_speeds=wind_speeds,
+                          wind_directions=wind_directions,
+                          phase_totals=phase_totals)
+    table.insert(0, 'aircraft_config', config_name)
+    table.insert(0, 'route', route_name)
+    return table
+
+
+def iter_sweep(routes, aircraft_configs, wind_speeds, wind_directions, reference_frame='relative_to_aircraft',
+               workers=None, profiler=None):
+    """
+    Evaluate routes x aircraft configs x (wind_direction, wind_speed) on a process pool.
+    Routes and configs are parsed here and shipped to each worker once, when the pool starts; tasks only carry
+    names and the wind cases of their chunk. Routes given as CSV paths are compiled (see compiled_route) and
+    memory-mapped by the workers.
+
+    Yields result tables (see wind_sweep.results_table) with extra route and aircraft_config columns, chunk by chunk,
+    in a deterministic order: route, then aircraft config, then wind direction, then wind speed.
+    With a utils.profiling.Profiler, loading, evaluation and result tables are timed as stages; with several
+    workers, evaluation is the time spent waiting on the pool.
+    """
+    profiler = profiler or Profiler(enabled=False)
+    with profiler.stage('load routes and aircraft configs'):
+        routes, shipped_routes = _load_routes(routes)
+        aircraft_configs = _load_aircraft_configs(aircraft_configs)
+    workers = workers or os.cpu_count() or 1
+
+    wind_speeds = np.asarray(wind_speeds, dtype=np.float64).ravel()
+    wind_directions = np.asarray(wind_directions, dtype=np.float64).ravel()
+    case_speeds = np.tile(wind_speeds, len(wind_directions))
+    case_directions = np.repeat(wind_directions, len(wind_speeds))
+    case_magnitudes = mph_to_metersec(case_speeds)
+    case_angles = degrees_to_radians(case_directions)
+
+    step = _cases_per_task(len(routes) * len(aircraft_configs), len(case_speeds), workers)
+    jobs = [(route_name, config_name, start, min(start + step, len(case_speeds)))
+            for route_name in routes
+            for config_name in aircraft_configs
+            for start in range(0, len(case_speeds), step)]
+    tasks = ((route_name, config_name, case_magnitudes[start:stop], case_angles[start:stop])
+             for route_name, config_name, start, stop in jobs)
+
+    def tables(results):
+        results = iter(results)
+        for route_name, config_name, start, stop in jobs:
+            with profiler.stage('evaluate wind cases'):
+                phase_totals = next(results)
+            with profiler.stage('results table'):
+                table = _sweep_table(route_name, config_name, routes[route_name].flight_directions,
+                                     case_speeds[start:stop], case_directions[start:stop], phase_totals)
+            yield table
+
+    if workers == 1:
+        _init_worker(routes, aircraft_configs, reference_frame)
+        yield from tables(map(_run_task, tasks))
+        return
+
+    with multiprocessing.Pool(processes=workers, initializer=_init_worker,
+                              initargs=(shipped_routes, aircraft_configs, reference_frame)) as pool:
+        # imap keeps submission order, so results stream back deterministically whatever worker finishes first
+        yield from tables(pool.imap(_run_task, tasks))
+
+
+def parallel_sweep(routes, aircraft_configs, wind_speeds, wind_directions, reference_frame='relative_to_aircraft',
+                   workers=None, profiler=None):
+    """Collect iter_sweep into a single DataFrame; with no routes, configs or wind cases it has no rows, same columns."""
+    tables = list(iter_sweep(routes, aircraft_configs, wind_speeds, wind_directions, reference_frame, workers, profiler))
+    if not tables:
+        return _sweep_table('', '', [], np.zeros(0), np.zeros(0), np.zeros((0, 0, len(METRIC_PHASES), 2)))
+    return pd.concat(tables, ignore_index=True)
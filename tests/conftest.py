@@ -0,0 +1,25 @@
+import os
+import sys
+import pandas as pd
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The modules live flat at the repository root
+sys.path.insert(0, REPO_ROOT)
+
+from route_engine import RouteColumns  # noqa: E402
+from utils.helpers import load_config  # noqa: E402
+
+ROUTE_FILES = sorted(os.path.join(REPO_ROOT, 'routes', name) for name in os.listdir(os.path.join(REPO_ROOT, 'routes'))
+                     if name.endswith('.csv'))
+
+
+@pytest.fixture(scope='session')
+def aircraft_params():
+    return load_config(os.path.join(REPO_ROOT, 'data', 'aircraft_params.json'))
+
+
+@pytest.fixture(scope='session')
+def columns():
+    """RouteColumns of the shortest route."""
+    return RouteColumns.from_dataframe(pd.read_csv(ROUTE_FILES[0]))
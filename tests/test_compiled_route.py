@@ -0,0 +1,39 @@
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+from compiled_route import compile_route, load_compiled_route, save_compiled_route
+from route_engine import RouteColumns
+from conftest import ROUTE_FILES
+
+
+def assert_columns_equal(loaded, parsed):
+    assert loaded.flight_directions == parsed.flight_directions
+    assert [type(direction) for direction in loaded.flight_directions] == \
+        [type(direction) for direction in parsed.flight_directions]
+    for field in RouteColumns.ARRAY_FIELDS:
+        np.testing.assert_array_equal(getattr(loaded, field), getattr(parsed, field), err_msg=field)
+    assert loaded.content_hash() == parsed.content_hash()
+
+
+@pytest.mark.parametrize('labels', ('names', 'numbers'))
+@pytest.mark.parametrize('mmap', (True, False))
+def test_compiled_route_loads_back_equal_to_csv_parse(tmp_path, labels, mmap):
+    path = str(tmp_path / 'route.csv')
+    if labels == 'names':
+        shutil.copyfile(ROUTE_FILES[0], path)
+    else:
+        route = pd.read_csv(ROUTE_FILES[0])
+        route['flight_direction'] = route['flight_direction'].map({'SFO_SJC': 1, 'SJC_SFO': 2})
+        route.to_csv(path, index=False)
+    parsed = RouteColumns.from_dataframe(pd.read_csv(path))
+    # The first load compiles the bundle, the second reads it back
+    for _ in range(2):
+        assert_columns_equal(load_compiled_route(path, mmap=mmap), parsed)
+
+
+def test_mixed_labels_are_rejected(tmp_path):
+    columns = compile_route(ROUTE_FILES[0], str(tmp_path / 'bundle'))
+    columns.flight_directions = ['SFO_SJC', 2]
+    with pytest.raises(ValueError, match='all strings or all numbers'):
+        save_compiled_route(columns, str(tmp_path / 'mixed'), source_hash='')
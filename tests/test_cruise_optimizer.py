@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from cruise_optimizer import cruise_segment_cost, cruise_speed_bounds, optimize_cruise_speeds
+from route_engine import CRUISE
+from utils.units import mph_to_metersec, degrees_to_radians
+from wind.wind import Wind
+
+REFERENCE_FRAMES = ('relative_to_aircraft', 'relative_to_north')
+# (wind speed mph, wind direction degrees): still air, head, tail, cross and quartering winds, and a wind stronger
+# than the aircraft
+WINDS = np.array([(0, 0), (20, 0), (20, 180), (25, 90), (30, 150), (40, 225), (250, 45)])
+SCAN_POINTS = 4001
+
+
+@pytest.mark.parametrize('reference_frame', REFERENCE_FRAMES)
+@pytest.mark.parametrize('time_weight', (0, 0.05, 0.5))
+def test_optimal_speeds_match_brute_force_scan(columns, aircraft_params, reference_frame, time_weight):
+    wind_magnitude = mph_to_metersec(WINDS[:, :1])
+    wind_angle = degrees_to_radians(WINDS[:, 1:])
+    rows, airspeed, energy, time = optimize_cruise_speeds(columns, aircraft_params, wind_magnitude, wind_angle,
+                                                          reference_frame, time_weight)
+    np.testing.assert_array_equal(rows, np.flatnonzero(columns.phase == CRUISE))
+
+    along_wind, cross_wind = Wind.track_wind_components(reference_frame, wind_magnitude, wind_angle,
+                                                        columns.destination_heading[rows])
+    tom = aircraft_params['mtom'] - aircraft_params['pax'] * aircraft_params['pax_mass']
+    lowest, highest = cruise_speed_bounds(columns, aircraft_params, rows)
+    # (scan points, cases, cruise rows)
+    speeds = lowest + np.linspace(0, 1, SCAN_POINTS)[:, np.newaxis, np.newaxis] * (highest - lowest)
+    _, _, scan_cost = cruise_segment_cost(speeds, along_wind, cross_wind, columns.horizontal_distance[rows],
+                                          aircraft_params, tom, time_weight)
+    _, _, cost = cruise_segment_cost(airspeed, along_wind, cross_wind, columns.horizontal_distance[rows],
+                                     aircraft_params, tom, time_weight)
+    assert ((airspeed >= lowest) & (airspeed <= highest)).all()
+    assert (cost <= scan_cost.min(axis=0) + 1e-10).all()
+    np.testing.assert_allclose(cost, energy + time_weight * time / 60, rtol=1e-12)
+
+
+@pytest.mark.parametrize('reference_frame', REFERENCE_FRAMES)
+def test_still_air_ties_resolve_to_the_fastest_speed(columns, aircraft_params, reference_frame):
+    # Without wind, cruise power and ground speed both scale with airspeed, so the energy does not depend on it
+    _, airspeed, _, _ = optimize_cruise_speeds(columns, aircraft_params, 0.0, 0.0, reference_frame)
+    np.testing.assert_array_equal(airspeed, aircraft_params['max_horizontal_velocity'])
@@ -0,0 +1,8 @@
+from design_sweep import evaluate_aircraft_variants, design_sweep
+from flight_metrics import METRIC_PHASES
+
+
+def test_evaluate_aircraft_variants_without_variants(columns, aircraft_params):
+    phase_totals = evaluate_aircraft_variants(columns, aircraft_params, {'mtom': []})
+    assert phase_totals.shape == (0, len(columns.flight_directions), len(METRIC_PHASES), 2)
+    assert design_sweep(columns, aircraft_params, {'mtom': []}).empty
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import os
+import numpy as np
+import pytest
+from energy_service import EnergyService, connection_handler
+from route_engine import evaluate_route
+from utils.units import mph_to_metersec, degrees_to_radians
+from conftest import REPO_ROOT, ROUTE_FILES
+
+ROUTE = 'sfo_sjc_route_20_miles'
+
+
+@pytest.fixture(scope='module')
+def service():
+    service = EnergyService(routes={ROUTE: ROUTE_FILES[0]},
+                            aircraft_configs={'aircraft_params': os.path.join(REPO_ROOT, 'data', 'aircraft_params.json')})
+    yield service
+    service.close()
+
+
+def post(service, path, body):
+    """Send one request to the service over a local HTTP connection; returns (status, decoded JSON response)."""
+    async def exchange():
+        server = await asyncio.start_server(connection_handler(service), '127.0.0.1', 0)
+        async with server:
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+            data = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+            writer.write(f'POST {path} HTTP/1.1\r\nContent-Length: {len(data)}\r\nConnection: close\r\n\r\n'.encode()
+                         + data)
+            response = await reader.read()
+            writer.close()
+        head, _, payload = response.partition(b'\r\n\r\n')
+        return int(head.split()[1]), json.loads(payload)
+    return asyncio.run(exchange())
+
+
+def expected_energy(service, wind_speed, wind_direction, payload=None):
+    params = dict(service.aircraft_configs['aircraft_params'])
+    if payload is not None:
+        params['pax'] = payload
+    _, _, phase_totals = evaluate_route(service.routes[ROUTE], params, mph_to_metersec(wind_speed),
+                                        degrees_to_radians(wind_direction), 'relative_to_aircraft')
+    return phase_totals.sum(axis=-2)[:, 0]
+
+
+def test_estimate(service):
+    status, result = post(service, '/estimate', {'origin': 'SFO', 'destination': 'SJC', 'wind_speed': 10,
+                                                 'wind_direction': 90, 'payload': 2})
+    assert status == 200
+    assert result['route'] == ROUTE
+    assert list(result['flight_directions']) == ['SFO_SJC']
+    flight = result['flight_directions']['SFO_SJC']
+    assert flight['energy_consumption'] == pytest.approx(expected_energy(service, 10, 90, payload=2)[0], rel=1e-12)
+    assert flight['energy_consumption'] == pytest.approx(sum(flight['phase_energy'].values()), rel=1e-12)
+
+
+def test_estimate_batch(service):
+    winds = [(0, 0), (15, 45), (30, 180)]
+    flights = [{'route': ROUTE, 'wind_speed': speed, 'wind_direction': direction} for speed, direction in winds]
+    status, response = post(service, '/estimate/batch', {'flights': flights})
+    assert status == 200
+    assert len(response['results']) == len(winds)
+    for result, (speed, direction) in zip(response['results'], winds):
+        energy = [flight['energy_consumption'] for flight in result['flight_directions'].values()]
+        np.testing.assert_allclose(energy, expected_energy(service, speed, direction), rtol=1e-12)
+
+
+@pytest.mark.parametrize('path', ('/estimate', '/estimate/batch'))
+@pytest.mark.parametrize('field, value', (('wind_speed', 'NaN'), ('wind_speed', 'Infinity'),
+                                          ('wind_direction', '-Infinity'), ('payload', 'NaN'),
+                                          ('wind_speed', '-5'), ('payload', '-1'), ('wind_speed', '"fast"')))
+def test_invalid_flights_are_rejected(service, path, field, value):
+    flight = f'{{"route": "{ROUTE}", "{field}": {value}}}'
+    status, response = post(service, path, flight if path == '/estimate' else f'{{"flights": [{flight}]}}')
+    assert status == 400
+    assert field.split('_')[0] in response['error']
+
+
+@pytest.mark.parametrize('path, body, status', (('/estimate', '{"route": "nowhere"}', 404),
+                                                ('/estimate', 'not json', 400),
+                                                ('/estimate/batch', '{"flights": 3}', 400),
+                                                ('/unknown', '{}', 404)))
+def test_bad_requests(service, path, body, status):
+    assert post(service, path, body)[0] == status
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+from energy_surrogate import EnergySurrogate
+from route_engine import RouteColumns
+from utils.units import mph_to_metersec, degrees_to_radians, sec_to_min
+from wind_sweep import evaluate_wind_cases
+from conftest import ROUTE_FILES
+
+# Route files are 20, 30, ... 60 miles long; the 30-mile route is held out between the grid distances
+DISTANCES = (20, 30, 40)
+POINTS = 64
+
+
+@pytest.fixture(scope='module')
+def routes():
+    return {distance: RouteColumns.from_dataframe(pd.read_csv(path)) for distance, path in zip(DISTANCES, ROUTE_FILES)}
+
+
+@pytest.fixture(scope='module')
+def surrogate(routes, aircraft_params):
+    return EnergySurrogate.build({distance: routes[distance] for distance in (20, 40)}, aircraft_params,
+                                 wind_speeds=np.arange(0, 31, 5.0), wind_angles=np.arange(0, 360, 15.0),
+                                 payloads=[0, 2, 4], validation_points=0)
+
+
+@pytest.mark.parametrize('distance, tolerance', ((20, 0.005), (40, 0.005), (30, 0.02)))
+def test_query_error_at_off_grid_points(routes, aircraft_params, surrogate, distance, tolerance):
+    rng = np.random.default_rng(1)
+    wind_speeds = rng.uniform(0, 30, POINTS)
+    wind_angles = rng.uniform(0, 360, POINTS)
+    for payload in (1, 3.5):
+        phase_totals = evaluate_wind_cases(routes[distance], dict(aircraft_params, pax=payload),
+                                           mph_to_metersec(wind_speeds), degrees_to_radians(wind_angles))
+        totals = phase_totals.sum(axis=-2)
+        energy, time = surrogate.query(distance, wind_speeds, wind_angles, payload)
+        np.testing.assert_allclose(energy, totals[..., 0], rtol=tolerance)
+        np.testing.assert_allclose(time, sec_to_min(totals[..., 1]), rtol=tolerance)
+
+
+def test_payload_lightens_the_aircraft(surrogate):
+    # payload is aircraft_params['pax'], which the power model subtracts from mtom
+    energy, _ = surrogate.query(20, 10, 90, np.array([[0], [2], [4]]))
+    assert (np.diff(energy, axis=0) < 0).all()
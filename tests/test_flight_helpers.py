@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+from flight_helpers import atmosphere_table, rho, temperature, _density, TABLE_RESOLUTION, TABLE_MAX_ALTITUDE, \
+    TABLE_MIN_ALTITUDE
+
+# Altitudes on the grid, between grid points (OFF_GRID) and outside the table envelope
+OFF_GRID = 450.3
+OUTSIDE = (TABLE_MAX_ALTITUDE + 100, TABLE_MIN_ALTITUDE - 100)
+ALTITUDES = np.array([0, TABLE_RESOLUTION, 15, OFF_GRID, OUTSIDE[0], OUTSIDE[1], 200])
+
+
+@pytest.mark.parametrize('interpolate', (False, True))
+def test_fallback_only_sees_uncovered_altitudes(interpolate):
+    table = atmosphere_table('good')
+    seen = []
+
+    def fallback(altitude):
+        seen.append(altitude)
+        return temperature(altitude)
+
+    values = table.lookup(table.temperature, ALTITUDES, fallback, interpolate)
+    assert len(seen) == 1
+    outside = np.isin(ALTITUDES, OUTSIDE)
+    off_grid = outside if interpolate else outside | (ALTITUDES == OFF_GRID)
+    np.testing.assert_array_equal(seen[0], ALTITUDES[off_grid])
+    np.testing.assert_allclose(values, temperature(ALTITUDES), rtol=1e-6 if interpolate else 1e-12)
+
+
+def test_exact_density_matches_closed_form():
+    np.testing.assert_array_equal(rho(ALTITUDES), [_density(float(altitude), 'good') for altitude in ALTITUDES])
+    assert rho(np.float64(OFF_GRID)) == _density(OFF_GRID, 'good')
+    assert rho(np.array(OFF_GRID)) == _density(OFF_GRID, 'good')
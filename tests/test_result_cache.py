@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+from result_cache import ResultCache
+from wind_sweep import wind_sweep
+
+WIND_SPEEDS, WIND_DIRECTIONS = [0, 15, 30], [0, 90, 180]
+
+
+@pytest.fixture
+def cache():
+    cache = ResultCache()
+    yield cache
+    cache.close()
+
+
+def test_cached_wind_sweep_matches_uncached(columns, aircraft_params, cache):
+    cached = wind_sweep(columns, aircraft_params, wind_speeds=[0, 15], wind_directions=[0, 90], cache=cache)
+    pd.testing.assert_frame_equal(cached, wind_sweep(columns, aircraft_params, wind_speeds=[0, 15],
+                                                     wind_directions=[0, 90]))
+
+
+def test_memory_hits(columns, aircraft_params, cache):
+    first = cache.evaluate_wind_cases(columns, aircraft_params, WIND_SPEEDS, WIND_DIRECTIONS)
+    assert cache.stats == {'memory_hits': 0, 'disk_hits': 0, 'misses': 3}
+    second = cache.evaluate_wind_cases(columns, aircraft_params, WIND_SPEEDS[::-1], WIND_DIRECTIONS[::-1])
+    assert cache.stats == {'memory_hits': 3, 'disk_hits': 0, 'misses': 3}
+    for computed, cached in zip(first, second):
+        np.testing.assert_array_equal(cached, computed[::-1])
+    # Entries own their arrays rather than viewing the batch they were computed in
+    assert all(array.base is None for entry in cache._memory.values() for array in entry)
+
+
+def test_disk_hits(tmp_path, columns, aircraft_params):
+    path = str(tmp_path / 'cache.sqlite')
+    writer = ResultCache(path)
+    expected = writer.evaluate_wind_cases(columns, aircraft_params, WIND_SPEEDS, WIND_DIRECTIONS)
+    writer.close()
+
+    reader = ResultCache(path)
+    for _ in range(2):
+        found = reader.evaluate_wind_cases(columns, aircraft_params, WIND_SPEEDS, WIND_DIRECTIONS)
+        for computed, cached in zip(expected, found):
+            np.testing.assert_array_equal(cached, computed)
+    reader.close()
+    # Disk hits are remembered in memory
+    assert reader.stats == {'memory_hits': 3, 'disk_hits': 3, 'misses': 0}
+
+
+def test_eviction_keeps_memory_under_max_bytes(columns, aircraft_params):
+    cache = ResultCache()
+    cache.evaluate_wind_cases(columns, aircraft_params, [0], [0])
+    entry_bytes = cache._memory_bytes
+    cache = ResultCache(max_bytes=2 * entry_bytes)
+    cache.evaluate_wind_cases(columns, aircraft_params, WIND_SPEEDS, WIND_DIRECTIONS)
+    assert len(cache._memory) == 2
+    assert cache._memory_bytes == 2 * entry_bytes
+
+    # The oldest case was evicted; the two most recent ones are still cached
+    cache.evaluate_wind_cases(columns, aircraft_params, WIND_SPEEDS[1:], WIND_DIRECTIONS[1:])
+    assert cache.stats['memory_hits'] == 2
+    cache.evaluate_wind_cases(columns, aircraft_params, WIND_SPEEDS[:1], WIND_DIRECTIONS[:1])
+    assert cache.stats['misses'] == 4
+    assert len(cache._memory) == 2
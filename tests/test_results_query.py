@@ -0,0 +1,46 @@
+import os
+import sqlite3
+import pytest
+import results_query
+from results_query import get_df
+
+
+@pytest.fixture
+def writer(tmp_path):
+    """A WAL-mode op_summary_statistics database, with a connection kept open so commits stay in the -wal file."""
+    results_query.clear_cache()
+    connection = sqlite3.connect(str(tmp_path / 'results.sqlite'))
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('CREATE TABLE op_summary_statistics (fleet_size REAL, id TEXT)')
+    connection.executemany('INSERT INTO op_summary_statistics VALUES (?, ?)',
+                           [(34.0, '60_90_20'), (23.0, '30_0_20'), (25.0, '30_90_10')])
+    connection.commit()
+    yield connection
+    connection.close()
+    results_query.clear_cache()
+
+
+def database_path(connection):
+    return connection.execute('PRAGMA database_list').fetchone()[2]
+
+
+def test_filters(writer):
+    frame = get_df(database_path(writer), 'fleet_size', distance=30)
+    assert sorted(frame['fleet_size']) == [23.0, 25.0]
+    assert list(get_df(database_path(writer), 'fleet_size', distance=(40, None), angle=[0, 90])['id']) == ['60_90_20']
+    with pytest.raises(ValueError, match='Unknown metric'):
+        get_df(database_path(writer), 'energy')
+
+
+def test_write_after_cached_read_is_seen(writer):
+    path = database_path(writer)
+    assert len(get_df(path, 'fleet_size', speed=20)) == 2
+    main_file = os.stat(path)
+
+    writer.execute("INSERT INTO op_summary_statistics VALUES (40.0, '50_180_20')")
+    writer.commit()
+    # The commit only went to the write-ahead log
+    assert (os.stat(path).st_mtime_ns, os.stat(path).st_size) == (main_file.st_mtime_ns, main_file.st_size)
+
+    frame = get_df(path, 'fleet_size', speed=20)
+    assert sorted(frame['distance']) == [30, 50, 60]
@@ -0,0 +1,68 @@
+import os
+import shutil
+import sqlite3
+import pandas as pd
+import pytest
+from results_store import ResultsStore, RESULT_COLUMNS, SCHEMA_VERSION
+from wind_sweep import wind_sweep
+from conftest import REPO_ROOT
+
+LEGACY_DATABASE = os.path.join(REPO_ROOT, 'energy_and_flight_time', 'energy_and_flight_time_60_mile_route.sqlite')
+
+
+@pytest.fixture
+def legacy_path(tmp_path):
+    path = tmp_path / 'legacy.sqlite'
+    shutil.copyfile(LEGACY_DATABASE, path)
+    return str(path)
+
+
+def read_flight_metrics(path):
+    with sqlite3.connect(path) as connection:
+        return pd.read_sql_query(f'SELECT {", ".join(RESULT_COLUMNS)} FROM flight_metrics ORDER BY id', connection)
+
+
+def test_legacy_flight_metrics_are_migrated_once(legacy_path):
+    expected = read_flight_metrics(legacy_path)
+    assert len(expected) == 26
+    for _ in range(2):
+        with ResultsStore(legacy_path) as store:
+            results = store.read_results()
+            assert store.connection.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    assert (results['aircraft_config'] == 'flight_metrics').all()
+    assert results['run_id'].nunique() == 1
+    pd.testing.assert_frame_equal(results[list(RESULT_COLUMNS)], expected, check_dtype=False)
+    # flight_metrics itself is left in place
+    pd.testing.assert_frame_equal(read_flight_metrics(legacy_path), expected)
+
+
+def test_failed_migration_leaves_the_database_untouched(legacy_path, monkeypatch):
+    def fail(store):
+        raise RuntimeError('migration failed')
+
+    monkeypatch.setattr(ResultsStore, '_migrate_flight_metrics', fail)
+    with pytest.raises(RuntimeError):
+        ResultsStore(legacy_path)
+    with sqlite3.connect(legacy_path) as connection:
+        assert connection.execute('PRAGMA user_version').fetchone()[0] == 0
+        assert [name for name, in connection.execute('SELECT name FROM sqlite_master')] == ['flight_metrics']
+
+
+def test_newer_schema_is_rejected(tmp_path):
+    path = str(tmp_path / 'newer.sqlite')
+    with sqlite3.connect(path) as connection:
+        connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION + 1}')
+    with pytest.raises(ValueError, match='newer'):
+        ResultsStore(path)
+
+
+def test_results_round_trip(tmp_path, columns, aircraft_params):
+    results = wind_sweep(columns, aircraft_params, wind_speeds=[0, 10], wind_directions=[0, 90])
+    with ResultsStore(str(tmp_path / 'results.sqlite')) as store:
+        first = store.add_results(results, route='20_miles', aircraft_params=aircraft_params)
+        second = store.add_results(results.iloc[:2], route='other')
+        stored = store.read_results(route='20_miles')
+        assert len(store.read_results(run_id=second)) == 2
+    assert (stored['run_id'] == first).all()
+    assert stored['params_hash'].notna().all()
+    pd.testing.assert_frame_equal(stored[list(RESULT_COLUMNS)], results, check_dtype=False)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+import power_model
+from flight_helpers import G_CONSTANT
+from route_derivatives import route_derivatives
+
+REFERENCE_FRAMES = ('relative_to_aircraft', 'relative_to_north')
+# Away from the kinks of the model (np.maximum, the strong wind fallback), where finite differences are smooth
+WIND_SPEED, WIND_DIRECTION = 10.0, 30.0
+SMOOTH_INPUTS = ('ld_max', 'cd_0', 'FoM', 'eta_cruise', 'disk_load', 'wind_speed', 'wind_direction')
+MASS_INPUTS = ('mtom', 'pax_mass')
+
+
+def totals(columns, aircraft_params, reference_frame, name=None, value=None):
+    """(directions, {energy, time}) trip totals, with input name set to value."""
+    params = dict(aircraft_params)
+    wind = {'wind_speed': WIND_SPEED, 'wind_direction': WIND_DIRECTION}
+    if name is not None:
+        (wind if name in wind else params)[name] = value
+    result = route_derivatives(columns, params, reference_frame=reference_frame, inputs=['ld_max'], **wind)
+    return result[['energy_consumption', 'flight_time']].to_numpy()
+
+
+def central_difference(columns, aircraft_params, reference_frame, name):
+    value = {'wind_speed': WIND_SPEED, 'wind_direction': WIND_DIRECTION}.get(name, aircraft_params.get(name))
+    step = 1e-5 * abs(value)
+    return (totals(columns, aircraft_params, reference_frame, name, value + step)
+            - totals(columns, aircraft_params, reference_frame, name, value - step)) / (2 * step)
+
+
+def derivatives(columns, aircraft_params, reference_frame, inputs):
+    result = route_derivatives(columns, aircraft_params, wind_speed=WIND_SPEED, wind_direction=WIND_DIRECTION,
+                               reference_frame=reference_frame, inputs=list(inputs))
+    return {name: group[['d_energy_consumption', 'd_flight_time']].to_numpy()
+            for name, group in result.groupby('input', sort=False)}
+
+
+@pytest.mark.parametrize('reference_frame', REFERENCE_FRAMES)
+def test_derivatives_match_central_differences(columns, aircraft_params, reference_frame):
+    exact = derivatives(columns, aircraft_params, reference_frame, SMOOTH_INPUTS)
+    for name in SMOOTH_INPUTS:
+        np.testing.assert_allclose(exact[name], central_difference(columns, aircraft_params, reference_frame, name),
+                                   rtol=1e-5, atol=1e-9, err_msg=name)
+
+
+@pytest.mark.parametrize('reference_frame', REFERENCE_FRAMES)
+def test_mass_derivatives_are_those_of_the_unrounded_weight(columns, aircraft_params, reference_frame, monkeypatch):
+    exact = derivatives(columns, aircraft_params, reference_frame, MASS_INPUTS)
+    # take-off mass is mtom - pax * pax_mass
+    np.testing.assert_allclose(exact['pax_mass'], -aircraft_params['pax'] * exact['mtom'], rtol=1e-12)
+
+    # The model rounds the weight to the Newton, so its finite differences depend on the step. The exact
+    # derivatives are those of the unrounded weight: taking the rounding out moves them only by the shift of the
+    # evaluation point, and they then agree with finite differences
+    monkeypatch.setattr(power_model, 'weight', lambda mass: mass * G_CONSTANT)
+    unrounded = derivatives(columns, aircraft_params, reference_frame, MASS_INPUTS)
+    for name in MASS_INPUTS:
+        np.testing.assert_allclose(exact[name], unrounded[name], rtol=1e-4, err_msg=name)
+        np.testing.assert_allclose(unrounded[name], central_difference(columns, aircraft_params, reference_frame, name),
+                                   rtol=1e-5, atol=1e-9, err_msg=name)
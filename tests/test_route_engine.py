@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+from aircraft import Aircraft
+from main import compute_energy_consumption
+from route_engine import RouteColumns, evaluate_route, compute_energy_consumption_vectorized
+from utils.helpers import preprocess_route
+from utils.tracing import tracing
+from wind.wind import Wind
+from conftest import ROUTE_FILES
+
+REFERENCE_FRAMES = ('relative_to_aircraft', 'relative_to_north')
+# (wind speed mph, wind direction degrees); 300 mph is stronger than the aircraft and hits the cruise fallback
+WINDS = ((0, 0), (10, 30), (40, 200), (300, 180))
+
+
+def loop_engine(path, aircraft_params, wind):
+    """Per-row energy and time and the metrics of the original row-by-row engine."""
+    route = pd.read_csv(path)
+    flight_directions = route['flight_direction'].unique()
+    route = preprocess_route(route, flight_directions)
+    aircraft = Aircraft(aircraft_params=aircraft_params, flight_directions=flight_directions, wind=wind)
+    route = compute_energy_consumption(route, flight_directions, aircraft)
+    return route, flight_directions, aircraft.metrics
+
+
+@pytest.mark.parametrize('path', ROUTE_FILES)
+@pytest.mark.parametrize('reference_frame', REFERENCE_FRAMES)
+@pytest.mark.parametrize('wind_speed, wind_direction', WINDS)
+def test_evaluate_route_matches_loop_engine(path, reference_frame, wind_speed, wind_direction, aircraft_params):
+    wind = Wind(reference_frame=reference_frame, wind_direction_degrees=wind_direction, wind_magnitude_mph=wind_speed)
+    route, flight_directions, metrics = loop_engine(path, aircraft_params, wind)
+
+    columns = RouteColumns.from_dataframe(route, flight_directions)
+    energy, time, phase_totals = evaluate_route(columns, aircraft_params, wind.wind_magnitude, wind.wind_angle,
+                                                reference_frame)
+    np.testing.assert_allclose(energy, route['energy_consumption'].to_numpy()[columns.row_index], rtol=1e-9)
+    np.testing.assert_allclose(time, route['time_to_complete'].to_numpy()[columns.row_index], rtol=1e-9)
+    for d, direction in enumerate(flight_directions):
+        for k, quantity in enumerate(('phase_energy', 'phase_time')):
+            np.testing.assert_allclose(phase_totals[d, :, k], list(metrics[direction][quantity].values()), rtol=1e-9)
+
+
+@pytest.mark.parametrize('reference_frame', REFERENCE_FRAMES)
+def test_vectorized_engine_is_a_drop_in_replacement(reference_frame, aircraft_params):
+    wind = Wind(reference_frame=reference_frame, wind_direction_degrees=60, wind_magnitude_mph=20)
+    expected, flight_directions, expected_metrics = loop_engine(ROUTE_FILES[-1], aircraft_params, wind)
+
+    route = preprocess_route(pd.read_csv(ROUTE_FILES[-1]), flight_directions)
+    columns = RouteColumns.from_dataframe(route, flight_directions)
+    for given_columns in (None, columns):
+        aircraft = Aircraft(aircraft_params=aircraft_params, flight_directions=flight_directions, wind=wind)
+        result = compute_energy_consumption_vectorized(route.copy(), flight_directions, aircraft, columns=given_columns)
+        for column in ('energy_consumption', 'time_to_complete'):
+            np.testing.assert_allclose(result[column], expected[column], rtol=1e-9)
+        for direction in flight_directions:
+            assert aircraft.metrics.to_dict()[direction].keys() == expected_metrics.to_dict()[direction].keys()
+            assert aircraft.get_total_energy_consumption()[direction] == \
+                pytest.approx(sum(expected_metrics[direction]['phase_energy'].values()), rel=1e-9)
+
+
+def test_vectorized_trace_matches_loop_trace(aircraft_params):
+    wind = Wind(reference_frame='relative_to_north', wind_direction_degrees=200, wind_magnitude_mph=40)
+    route = pd.read_csv(ROUTE_FILES[0])
+    flight_directions = route['flight_direction'].unique()
+    route = preprocess_route(route, flight_directions)
+    traces = []
+    for engine in (compute_energy_consumption, compute_energy_consumption_vectorized):
+        aircraft = Aircraft(aircraft_params=aircraft_params, flight_directions=flight_directions, wind=wind)
+        with tracing() as tracer:
+            engine(route.copy(), flight_directions, aircraft)
+        traces.append(tracer.events)
+
+    expected, events = traces
+    assert [(event['direction'], event['phase']) for event in events] == \
+           [(event['direction'], event['phase']) for event in expected]
+    for event, expected_event in zip(events, expected):
+        for field in ('energy_consumption', 'time_to_complete', 'power'):
+            assert event[field] == pytest.approx(expected_event[field], rel=1e-9)
+        if expected_event['wind_correction'] is None:
+            assert event['wind_correction'] is None
+        else:
+            assert event['wind_correction'] == pytest.approx(expected_event['wind_correction'], rel=1e-9, abs=1e-12)
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+from aircraft import Aircraft
+from main import compute_energy_consumption
+from route_engine import evaluate_route
+from route_generator import all_pairs, generate_route, generate_route_columns, generate_waypoints
+from utils.helpers import preprocess_route, ROUTE_DERIVED_COLUMNS
+from wind.wind import Wind
+
+# SFO_PAD is too close to SFO to climb to cruise_altitude and descend again
+VERTIPORTS = pd.DataFrame({'name': ['SFO', 'SJC', 'OAK', 'SFO_PAD'],
+                           'latitude': [37.6189, 37.3639, 37.7126, 37.6200],
+                           'longitude': [-122.3750, -121.9289, -122.2197, -122.3800]})
+
+
+@pytest.fixture(scope='module')
+def pairs(aircraft_params):
+    return all_pairs(VERTIPORTS, aircraft_params)
+
+
+def test_all_pairs_drops_pairs_too_close_to_fly(aircraft_params, pairs):
+    origins, destinations = pairs
+    near = {(0, 3), (3, 0)}
+    every_pair = set(zip(*all_pairs(VERTIPORTS)))
+    assert len(every_pair) == len(VERTIPORTS) * (len(VERTIPORTS) - 1)
+    assert set(zip(origins, destinations)) == every_pair - near
+    with pytest.raises(ValueError, match='too close'):
+        generate_waypoints(VERTIPORTS, [0], [3], aircraft_params)
+
+
+def test_generated_route_round_trips_through_preprocess_route(aircraft_params, pairs):
+    route = generate_route(VERTIPORTS, *pairs, aircraft_params)
+    preprocessed = preprocess_route(route.copy())
+    for column in route.columns:
+        if route[column].dtype.kind == 'f':
+            np.testing.assert_allclose(preprocessed[column], route[column], rtol=1e-9, atol=1e-9, err_msg=column)
+        else:
+            assert (preprocessed[column] == route[column]).all(), column
+    columns = generate_route_columns(VERTIPORTS, *pairs, aircraft_params)
+    np.testing.assert_array_equal(columns.is_first_last_time, preprocessed['is_first_last_time'])
+    assert set(ROUTE_DERIVED_COLUMNS) <= set(preprocessed.columns)
+
+
+@pytest.mark.parametrize('reference_frame', ('relative_to_aircraft', 'relative_to_north'))
+def test_generated_columns_match_loop_engine_on_generated_route(aircraft_params, pairs, reference_frame):
+    wind = Wind(reference_frame=reference_frame, wind_direction_degrees=120, wind_magnitude_mph=15)
+    route = generate_route(VERTIPORTS, *pairs, aircraft_params)
+    flight_directions = route['flight_direction'].unique()
+    aircraft = Aircraft(aircraft_params=aircraft_params, flight_directions=flight_directions, wind=wind)
+    compute_energy_consumption(preprocess_route(route, flight_directions), flight_directions, aircraft)
+
+    columns = generate_route_columns(VERTIPORTS, *pairs, aircraft_params)
+    assert list(columns.flight_directions) == list(flight_directions)
+    _, _, phase_totals = evaluate_route(columns, aircraft_params, wind.wind_magnitude, wind.wind_angle,
+                                        reference_frame)
+    for d, direction in enumerate(flight_directions):
+        assert phase_totals[d, :, 0].sum() == pytest.approx(aircraft.get_total_energy_consumption()[direction], rel=1e-9)
+        assert phase_totals[d, :, 1].sum() == \
+            pytest.approx(sum(aircraft.metrics[direction]['phase_time'].values()), rel=1e-9)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from sensitivity import default_bounds, _sobol_indices, UNREAD_PARAMS
+
+# Ishigami function, whose Sobol indices are known in closed form
+A, B = 7.0, 0.1
+
+
+def ishigami(x):
+    return np.sin(x[..., 0]) + A * np.sin(x[..., 1]) ** 2 + B * x[..., 2] ** 4 * np.sin(x[..., 0])
+
+
+def ishigami_indices():
+    v1 = 0.5 * (1 + B * np.pi ** 4 / 5) ** 2
+    v2 = A ** 2 / 8
+    v13 = 8 * B ** 2 * np.pi ** 8 / 225
+    variance = v1 + v2 + v13
+    return np.array([v1, v2, 0]) / variance, np.array([v1 + v13, v2, v13]) / variance
+
+
+def test_sobol_indices_of_the_ishigami_function():
+    rng = np.random.default_rng(0)
+    n = 200_000
+    a = rng.uniform(-np.pi, np.pi, (n, 3))
+    b = rng.uniform(-np.pi, np.pi, (n, 3))
+    ab = np.repeat(a[np.newaxis], 3, axis=0)
+    for i in range(3):
+        ab[i, :, i] = b[:, i]
+    first_order, total = _sobol_indices(ishigami(a), ishigami(b), ishigami(ab))
+    expected_first_order, expected_total = ishigami_indices()
+    np.testing.assert_allclose(first_order, expected_first_order, atol=0.02)
+    np.testing.assert_allclose(total, expected_total, atol=0.02)
+
+
+def test_default_bounds_skip_params_the_power_model_ignores(aircraft_params):
+    bounds = default_bounds(aircraft_params)
+    assert not set(UNREAD_PARAMS) & set(bounds)
+    assert {'mtom', 'eta_hover', 'eta_cruise', 'wind_speed', 'wind_direction'} <= set(bounds)
+    assert bounds['mtom'] == pytest.approx((0.9 * aircraft_params['mtom'], 1.1 * aircraft_params['mtom']))
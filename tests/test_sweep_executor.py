@@ -0,0 +1,28 @@
+import pandas as pd
+import pytest
+from sweep_executor import parallel_sweep
+from conftest import ROUTE_FILES
+
+COLUMNS = ['route', 'aircraft_config', 'wind_direction_degrees', 'wind_magnitude_mph', 'flight_direction',
+           'energy_consumption', 'flight_time']
+
+
+@pytest.fixture(scope='module')
+def aircraft_configs(aircraft_params):
+    return {'default': aircraft_params, 'heavy': dict(aircraft_params, mtom=aircraft_params['mtom'] * 1.1)}
+
+
+def test_workers_give_identical_results(aircraft_configs):
+    sweeps = [parallel_sweep(ROUTE_FILES[:2], aircraft_configs, wind_speeds=[0, 10, 20], wind_directions=[0, 45, 180],
+                             workers=workers) for workers in (1, 3)]
+    assert list(sweeps[0].columns) == COLUMNS
+    assert len(sweeps[0]) == 2 * 2 * 9 * 2
+    pd.testing.assert_frame_equal(sweeps[0], sweeps[1])
+
+
+@pytest.mark.parametrize('wind_speeds, routes', (([], ROUTE_FILES[:1]), ([10], [])))
+def test_empty_sweep_keeps_its_columns(aircraft_configs, wind_speeds, routes):
+    results = parallel_sweep(routes, aircraft_configs, wind_speeds=wind_speeds, wind_directions=[0, 90], workers=1)
+    assert results.empty
+    assert list(results.columns) == COLUMNS
+    assert (results.dtypes[['wind_direction_degrees', 'energy_consumption', 'flight_time']] == 'float64').all()
@@ -0,0 +1,12 @@
+import numpy as np
+import pandas as pd
+from wind_climatology import replay_climatology
+
+
+def test_replay_climatology_without_observations(columns, aircraft_params):
+    observations = pd.DataFrame({'timestamp': pd.to_datetime([]),
+                                 'wind_speed_mph': np.zeros(0),
+                                 'wind_direction_degrees': np.zeros(0)})
+    series = replay_climatology(columns, aircraft_params, observations)
+    assert series.empty
+    assert series.index.name == 'timestamp'
@@ -0,0 +1,27 @@
+import pytest
+from flight_metrics import METRIC_PHASES
+from result_cache import ResultCache
+from wind_sweep import evaluate_wind_grid, wind_sweep
+
+
+@pytest.fixture
+def cache():
+    cache = ResultCache()
+    yield cache
+    cache.close()
+
+
+@pytest.mark.parametrize('wind_speeds, wind_directions', (([], [0, 90]), ([10], []), ([], [])))
+def test_evaluate_wind_grid_without_cases(columns, aircraft_params, wind_speeds, wind_directions):
+    phase_totals = evaluate_wind_grid(columns, aircraft_params, wind_speeds, wind_directions)
+    assert phase_totals.shape == (len(wind_directions), len(wind_speeds), len(columns.flight_directions),
+                                  len(METRIC_PHASES), 2)
+
+
+@pytest.mark.parametrize('use_cache', (False, True))
+def test_wind_sweep_without_cases(columns, aircraft_params, cache, use_cache):
+    results = wind_sweep(columns, aircraft_params, wind_speeds=[], wind_directions=[0, 90],
+                         cache=cache if use_cache else None)
+    assert results.empty
+    assert list(results.columns) == ['wind_direction_degrees', 'wind_magnitude_mph', 'flight_direction',
+                                     'energy_consumption', 'flight_time']
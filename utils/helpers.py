@@ -2,6 +2,7 @@ import numpy as np
 import pandas as pd
 import logging
 from utils.units import sec_to_min
+from utils.vector_math import lat_long_to_heading
 
 def haversine_dist(lat1: float, lon1: float, lat2: float, lon2: float, unit: str = 'mile') -> float:
     # 6367 for distance in KM for miles use 3958
@@ -22,7 +23,7 @@ def haversine_dist(lat1: float, lon1: float, lat2: float, lon2: float, unit: str
     a = np.sin(d_lat / 2) ** 2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(d_lon / 2) ** 2
     c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
 
-    return round(r * c, 2)
+    return np.round(r * c, 2) if isinstance(c, np.ndarray) else round(r * c, 2)
 
 
 # Compute 3D distance between two points
@@ -36,25 +37,28 @@ def distance_3d(lat1: float, lon1: float, alt1: float, lat2: float, lon2: float,
 
 # Compute the haversine distance between waypoints for each flight direction. Use haversine_dist function above
 def add_distance_column(df):
-    # Initialize a list for distances
-    distances = []
-
-    # Iterate over the dataframe and calculate distances
-    for i in range(len(df)):
-        # Check if the next row exists and is in the same flight direction
-        if i < len(df) - 1 and df.iloc[i]['flight_direction'] == df.iloc[i + 1]['flight_direction']:
-            lat1, lon1 = df.iloc[i]['latitude'], df.iloc[i]['longitude']
-            lat2, lon2 = df.iloc[i + 1]['latitude'], df.iloc[i + 1]['longitude']
-            distance = haversine_dist(lat1, lon1, lat2, lon2, unit='meter')
-            distances.append(distance)
-        else:
-            # If the next row is a different flight direction or does not exist, set the distance to 0
-            distances.append(0)
-
-    # Add the distances list as a new column to the dataframe
+    # Distance to the next waypoint of the same flight direction, 0 for the last waypoint of a direction
+    order, has_next = _direction_order(df['flight_direction'])
+    latitude = df['latitude'].to_numpy(dtype=np.float64)[order]
+    longitude = df['longitude'].to_numpy(dtype=np.float64)[order]
+    distances = np.zeros(len(df))
+    distances[order[:-1]] = np.where(has_next, haversine_dist(latitude[:-1], longitude[:-1], latitude[1:], longitude[1:], unit='meter'), 0)
     df['distance_to_next_meters'] = distances
     return df
 
+
+def _direction_order(flight_direction):
+    """
+    Returns (order, has_next): a stable ordering grouping the rows by flight direction (in order of first appearance),
+    and for every consecutive pair of rows in that order whether they belong to the same direction.
+    """
+    codes, _ = pd.factorize(flight_direction)
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    return order, codes[1:] == codes[:-1]
+
+
+import hashlib
 import json
 from typing import Any, Dict
 
@@ -63,73 +67,127 @@ def load_config(file_path: str) -> Dict[str, Any]:
         return json.load(file)
 
 
+def params_hash(aircraft_params: Dict[str, Any]) -> str:
+    """Stable hash of an aircraft params dict (key order does not matter)."""
+    return hashlib.sha256(json.dumps(aircraft_params, sort_keys=True).encode()).hexdigest()
+
+
 def update_is_first_last_time(route, flight_directions):
-    # Initialize all values to False
-    route['is_first_last_time'] = False
+    # Flag the first 'CLIMB TRANSITION' and the last 'DESCENT TRANSITION' of each flight direction
+    in_directions = route['flight_direction'].isin(flight_directions)
+    climb_transition = in_directions & (route['phase'] == 'CLIMB TRANSITION')
+    descent_transition = in_directions & (route['phase'] == 'DESCENT TRANSITION')
+    first_climb_transition = climb_transition & ~route['flight_direction'].where(climb_transition).duplicated(keep='first')
+    last_descent_transition = descent_transition & ~route['flight_direction'].where(descent_transition).duplicated(keep='last')
+    route['is_first_last_time'] = (first_climb_transition | last_descent_transition).to_numpy()
+    return route
 
-    for direction in flight_directions:
-        # Filter the DataFrame for the current flight direction
-        direction_df = route[route['flight_direction'] == direction]
 
-        # Find the first 'CLIMB TRANSITION' phase
-        first_climb_transition_idx = direction_df[direction_df['phase'] == 'CLIMB TRANSITION'].first_valid_index()
-        if first_climb_transition_idx is not None:
-            route.at[first_climb_transition_idx, 'is_first_last_time'] = True
+# Columns preprocess_route derives from the waypoints (flight_direction, latitude, longitude, altitude, phase)
+# and their velocities (horizontal_velocity, vertical_velocity)
+ROUTE_DERIVED_COLUMNS = ('distance_to_next_meters', 'altitude_difference', 'destination_heading_radians',
+                         'time_to_complete', 'is_first_last_time')
 
-        # Find the last 'DESCENT TRANSITION' phase
-        last_descent_transition_idx = direction_df[direction_df['phase'] == 'DESCENT TRANSITION'].last_valid_index()
-        if last_descent_transition_idx is not None:
-            route.at[last_descent_transition_idx, 'is_first_last_time'] = True
 
+def preprocess_route(route, flight_directions=None, overwrite=True):
+    """
+    Derive every column the energy computation needs from the waypoints, for all flight directions at once.
+    Each waypoint looks at the next waypoint of its flight direction; the last waypoint of a direction gets a
+    distance of 0 and NaN altitude difference, heading and time.
+    If overwrite is False, only the columns missing from the route are derived.
+    """
+    if flight_directions is None:
+        flight_directions = route['flight_direction'].unique()
+    missing = [column for column in ROUTE_DERIVED_COLUMNS if overwrite or column not in route.columns]
+    if not missing:
+        return route
+
+    order, has_next = _direction_order(route['flight_direction'])
+    latitude = route['latitude'].to_numpy(dtype=np.float64)[order]
+    longitude = route['longitude'].to_numpy(dtype=np.float64)[order]
+    altitude = route['altitude'].to_numpy(dtype=np.float64)[order]
+
+    def to_route_order(values_to_next, last_value):
+        values = np.full(len(route), last_value, dtype=np.float64)
+        values[order[:-1]] = np.where(has_next, values_to_next, last_value)
+        return values
+
+    derived = {}
+    if 'distance_to_next_meters' in missing or 'time_to_complete' in missing:
+        derived['distance_to_next_meters'] = to_route_order(
+            haversine_dist(latitude[:-1], longitude[:-1], latitude[1:], longitude[1:], unit='meter'), 0)
+    if 'altitude_difference' in missing or 'time_to_complete' in missing:
+        derived['altitude_difference'] = to_route_order(altitude[1:] - altitude[:-1], np.nan)
+    if 'destination_heading_radians' in missing:
+        latitude, longitude = np.radians(latitude), np.radians(longitude)
+        heading = lat_long_to_heading(latitude[:-1], longitude[:-1], latitude[1:], longitude[1:])
+        derived['destination_heading_radians'] = to_route_order(np.mod(heading, 2 * np.pi), np.nan)
+    if 'time_to_complete' in missing:
+        # Vertical phases take as long as their altitude change requires, level flight as long as its distance does
+        distance = derived['distance_to_next_meters']
+        altitude_difference = derived['altitude_difference']
+        vertical_velocity = route['vertical_velocity'].to_numpy(dtype=np.float64)
+        horizontal_velocity = route['horizontal_velocity'].to_numpy(dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            time_to_complete = np.where(vertical_velocity > 0, np.abs(altitude_difference) / vertical_velocity,
+                                        distance / horizontal_velocity)
+        derived['time_to_complete'] = np.where(np.isnan(altitude_difference), np.nan, time_to_complete)
+
+    for column in missing:
+        if column != 'is_first_last_time':
+            route[column] = derived[column]
+    if 'is_first_last_time' in missing:
+        route = update_is_first_last_time(route, flight_directions)
     return route
 
+
+# The log helpers run for every phase, so they return before formatting anything when INFO is not logged
 def log_phase_info(aircraft, phase):
-    logging.info(f"\nPhase: {phase}")
-    logging.info(f"Horizontal velocity: {aircraft.horizontal_velocity} m/s")
-    logging.info(f"Vertical velocity: {aircraft.vertical_velocity} m/s")
-    logging.info(f"Travel time: {aircraft.travel_time} s")
+    if not logging.getLogger().isEnabledFor(logging.INFO):
+        return
+    logging.info("\nPhase: %s", phase)
+    logging.info("Horizontal velocity: %s m/s", aircraft.horizontal_velocity)
+    logging.info("Vertical velocity: %s m/s", aircraft.vertical_velocity)
+    logging.info("Travel time: %s s", aircraft.travel_time)
 
 def log_location_and_speed(aircraft):
-    logging.info(f"Altitude: {aircraft.altitude} m")
-    logging.info(f"latitude: {aircraft.latitude}")
-    logging.info(f"longitude: {aircraft.longitude}")    
-    logging.info(f"Previous horizontal velocity: {aircraft.prev_horizontal_velocity} m/s")
-    logging.info(f"Previous vertical velocity: {aircraft.prev_vertical_velocity} m/s")
-    logging.info(f"Previous latitude: {aircraft.prev_latitude}")
-    logging.info(f"Previous longitude: {aircraft.prev_longitude}")
+    if not logging.getLogger().isEnabledFor(logging.INFO):
+        return
+    logging.info("Altitude: %s m", aircraft.altitude)
+    logging.info("latitude: %s", aircraft.latitude)
+    logging.info("longitude: %s", aircraft.longitude)
+    logging.info("Previous horizontal velocity: %s m/s", aircraft.prev_horizontal_velocity)
+    logging.info("Previous vertical velocity: %s m/s", aircraft.prev_vertical_velocity)
+    logging.info("Previous latitude: %s", aircraft.prev_latitude)
+    logging.info("Previous longitude: %s", aircraft.prev_longitude)
 
 def log_wind_speed(start_air_speed, end_air_speed, true_v, ground_v):
-    logging.info(f"Start air speed: {start_air_speed} m/s")
-    logging.info(f"End air speed: {end_air_speed} m/s")
-    logging.info(f"True velocity: {true_v} m/s")
-    logging.info(f"Ground velocity: {ground_v} m/s")
+    if not logging.getLogger().isEnabledFor(logging.INFO):
+        return
+    logging.info("Start air speed: %s m/s", start_air_speed)
+    logging.info("End air speed: %s m/s", end_air_speed)
+    logging.info("True velocity: %s m/s", true_v)
+    logging.info("Ground velocity: %s m/s", ground_v)
 
 def log_wind_travel_time(travel_time):
-    logging.info(f"New travel time under wind: {travel_time} s")
-
-
-import sqlite3
-
-def save_to_database(energy_consumption, flight_time, wind_direction, wind_magnitude):
-    connection = sqlite3.connect('energy_and_flight_time_60_mile_route.sqlite')
-    cursor = connection.cursor()
+    logging.info("New travel time under wind: %s s", travel_time)
 
-    # create table if needed
-    cursor.execute('''CREATE TABLE IF NOT EXISTS flight_metrics
-                     (id INTEGER PRIMARY KEY, flight_direction TEXT, 
-                      energy_consumption REAL, flight_time REAL, 
-                      wind_direction_degrees INTEGER, wind_magnitude_mph INTEGER)''')
 
-    # insert record
-    for flight_direction in energy_consumption.keys():
-        energy = energy_consumption.get(flight_direction, 0)
-        time = sec_to_min(flight_time.get(flight_direction, 0))
-
-        cursor.execute('''INSERT INTO flight_metrics 
-                          (flight_direction, energy_consumption, flight_time, 
-                           wind_direction_degrees, wind_magnitude_mph)
-                          VALUES (?, ?, ?, ?, ?)''', 
-                       (flight_direction, energy, time, wind_direction, wind_magnitude))
-
-    connection.commit()
-    connection.close()
\ No newline at end of file
+def save_to_database(energy_consumption, flight_time, wind_direction, wind_magnitude,
+                     path='energy_and_flight_time_60_mile_route.sqlite', route=None, aircraft_params=None,
+                     reference_frame='relative_to_aircraft'):
+    """
+    Store the per flight direction energy (kWh) and flight time (s) of one wind case as a run of a ResultsStore.
+    Prefer ResultsStore.add_results / add_sweep for many wind cases: they write a whole sweep in one transaction.
+    """
+    from results_store import ResultsStore  # results_store imports this module
+
+    results = pd.DataFrame({
+        'wind_direction_degrees': wind_direction,
+        'wind_magnitude_mph': wind_magnitude,
+        'flight_direction': list(energy_consumption.keys()),
+        'energy_consumption': list(energy_consumption.values()),
+        'flight_time': [sec_to_min(flight_time.get(flight_direction, 0)) for flight_direction in energy_consumption]
+    })
+    with ResultsStore(path) as store:
+        store.add_results(results, route=route, aircraft_params=aircraft_params, reference_frame=reference_frame)
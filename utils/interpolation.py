@@ -0,0 +1,40 @@
+import itertools
+import numpy as np
+
+
+def axis_step(axis):
+    """Spacing of an evenly spaced axis, or None, so evenly spaced axes are indexed arithmetically."""
+    if len(axis) < 2:
+        return None
+    steps = np.diff(axis)
+    return float(steps[0]) if np.allclose(steps, steps[0], rtol=1e-9, atol=0) else None
+
+
+def grid_cells(axis, step, values):
+    """Lower and upper grid index and interpolation weight of the upper one, per value along an ascending axis."""
+    if step is not None:
+        lower = np.floor((values - axis[0]) / step).astype(np.intp)
+    else:
+        lower = np.searchsorted(axis, values, side='right') - 1
+    lower = np.clip(lower, 0, max(len(axis) - 2, 0))
+    upper = np.minimum(lower + 1, len(axis) - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = np.clip((values - axis[lower]) / (axis[upper] - axis[lower]), 0, 1)
+    return lower, upper, np.where(upper > lower, weight, 0.0)
+
+
+def multilinear(axes, steps, table, points):
+    """
+    Multilinear interpolation of table, whose leading dimensions lie on the ascending axes, at points (one
+    broadcastable array per axis). Points outside the grid are clamped to its edge. Returns an array of shape
+    points + table.shape[len(axes):].
+    """
+    points = np.broadcast_arrays(*(np.asarray(values, dtype=np.float64) for values in points))
+    cells = [grid_cells(axis, step, values) for axis, step, values in zip(axes, steps, points)]
+    trailing = table.shape[len(axes):]
+    result = np.zeros(points[0].shape + trailing)
+    for corner in itertools.product((0, 1), repeat=len(axes)):
+        index = tuple(cell[side] for cell, side in zip(cells, corner))
+        weight = np.prod([cell[2] if side else 1 - cell[2] for cell, side in zip(cells, corner)], axis=0)
+        result += weight.reshape(weight.shape + (1,) * len(trailing)) * table[index]
+    return result
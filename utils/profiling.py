@@ -0,0 +1,142 @@
+import functools
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+# Functions attributed to their own stage when profiling: (module, attribute) pairs are resolved lazily because
+# aircraft and route_engine import utils. power_model functions are patched wherever they were imported by name.
+PROFILED_METHODS = {
+    'aircraft.Aircraft': ('hover_climb_phase', 'climb_transition_phase', 'climb_phase', 'cruise_phase', 'descent_phase',
+                          'descent_transition_phase', 'hover_descent_phase'),
+    'wind.wind.Wind': ('compute_aircraft_velocity', 'compute_aircraft_velocity_batch')
+}
+POWER_MODEL_IMPORTERS = ('power_model', 'aircraft', 'route_engine', 'cruise_optimizer')
+# Stages of the vectorized engine: the wind solver, the phase power and the per-phase totals of evaluate_route,
+# patched in route_engine and in the modules that import them by name
+ROUTE_ENGINE_FUNCTIONS = ('compute_route_energy', 'evaluate_route', '_wind_adjusted_velocities', '_phase_power',
+                          '_phase_totals')
+ROUTE_ENGINE_IMPORTERS = ('route_engine', 'route_stream', 'wind_sweep', 'result_cache', 'design_sweep', 'sensitivity',
+                          'route_derivatives')
+
+
+class Profiler:
+    """
+    Wall time and allocations per pipeline stage. Stages nest: each one is recorded under its stack of enclosing
+    stages, with its total time and its self time (total minus nested stages). Allocations are the net change in
+    the number of memory blocks the interpreter holds (sys.getallocatedblocks) across the stage.
+    A disabled Profiler records nothing and its stages are no-ops.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stages = {}
+        self._stack = []
+        self._patched = []
+
+    def stage(self, name):
+        return self._stage(name) if self.enabled else nullcontext()
+
+    @contextmanager
+    def _stage(self, name):
+        frame = [name, 0.0]  # name, seconds spent in nested stages
+        self._stack.append(frame)
+        path = tuple(entry[0] for entry in self._stack)
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            blocks = sys.getallocatedblocks() - blocks
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1][1] += seconds
+            record = self.stages.setdefault(path, {'calls': 0, 'seconds': 0.0, 'self_seconds': 0.0, 'allocated_blocks': 0})
+            record['calls'] += 1
+            record['seconds'] += seconds
+            record['self_seconds'] += seconds - frame[1]
+            record['allocated_blocks'] += blocks
+
+    def wrap(self, name, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with self._stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def _patch(self, owner, attribute, name):
+        original = owner.__dict__[attribute]
+        if isinstance(original, staticmethod):
+            setattr(owner, attribute, staticmethod(self.wrap(name, original.__func__)))
+        else:
+            setattr(owner, attribute, self.wrap(name, original))
+        self._patched.append((owner, attribute, original))
+
+    def instrument(self):
+        """
+        Attribute the Aircraft phases, the Wind solver, the power_model functions and the route_engine steps to
+        stages of their own.
+        """
+        import importlib
+        import power_model
+        for owner_path, attributes in PROFILED_METHODS.items():
+            module_name, class_name = owner_path.rsplit('.', 1)
+            owner = getattr(importlib.import_module(module_name), class_name)
+            for attribute in attributes:
+                self._patch(owner, attribute, f'{class_name}.{attribute}')
+        functions = {value: name for name, value in vars(power_model).items()
+                     if callable(value) and getattr(value, '__module__', None) == 'power_model'}
+        for module_name in POWER_MODEL_IMPORTERS:
+            module = importlib.import_module(module_name)
+            for attribute, value in list(vars(module).items()):
+                if getattr(value, '__module__', None) == 'power_model' and value in functions:
+                    self._patch(module, attribute, f'power_model.{functions[value]}')
+        route_engine = importlib.import_module('route_engine')
+        functions = {getattr(route_engine, name): name for name in ROUTE_ENGINE_FUNCTIONS}
+        for module_name in ROUTE_ENGINE_IMPORTERS:
+            module = importlib.import_module(module_name)
+            for attribute, value in list(vars(module).items()):
+                if callable(value) and value in functions:
+                    self._patch(module, attribute, f'route_engine.{functions[value]}')
+
+    def uninstrument(self):
+        while self._patched:
+            owner, attribute, original = self._patched.pop()
+            setattr(owner, attribute, original)
+
+    def summary(self):
+        """Per stage name: calls, total and self seconds, share of the profiled wall time and allocated blocks."""
+        totals = {}
+        for path, record in self.stages.items():
+            total = totals.setdefault(path[-1], {'calls': 0, 'seconds': 0.0, 'self_seconds': 0.0, 'allocated_blocks': 0})
+            for field in total:
+                # A stage nested in a stage of the same name is already part of the outer one's total
+                if field != 'seconds' or path[-1] not in path[:-1]:
+                    total[field] += record[field]
+        wall_time = sum(record['seconds'] for path, record in self.stages.items() if len(path) == 1)
+        lines = [f'{"stage":<55} {"calls":>9} {"total s":>10} {"self s":>10} {"self %":>7} {"alloc blocks":>13}']
+        for name, total in sorted(totals.items(), key=lambda item: -item[1]['self_seconds']):
+            share = total['self_seconds'] / wall_time if wall_time else 0
+            lines.append(f'{name:<55} {total["calls"]:>9} {total["seconds"]:>10.4f} {total["self_seconds"]:>10.4f} '
+                         f'{share:>7.1%} {total["allocated_blocks"]:>13}')
+        return '\n'.join(lines)
+
+    def write_folded(self, path):
+        """Write the stage stacks in the collapsed format of flamegraph.pl / speedscope, weighted by self microseconds."""
+        with open(path, 'w') as file:
+            for stack, record in self.stages.items():
+                file.write(f'{";".join(stack)} {max(int(record["self_seconds"] * 1e6), 0)}\n')
+
+
+@contextmanager
+def profiling(name='main', folded_path=None):
+    """Profile the body of a with block as one top-level stage, with the pipeline functions instrumented."""
+    profiler = Profiler()
+    profiler.instrument()
+    try:
+        with profiler.stage(name):
+            yield profiler
+    finally:
+        profiler.uninstrument()
+        if folded_path is not None:
+            profiler.write_folded(folded_path)
@@ -0,0 +1,170 @@
+import functools
+import json
+import time
+from contextlib import contextmanager
+from math import pi
+from utils.vector_math import vector_to_heading, magnitude
+
+# Aircraft phase methods and the phase each one flies
+PHASE_METHODS = {
+    'hover_climb_phase': 'HOVER CLIMB',
+    'climb_transition_phase': 'CLIMB TRANSITION',
+    'climb_phase': 'CLIMB',
+    'cruise_phase': 'CRUISE',
+    'descent_phase': 'DESCENT',
+    'descent_transition_phase': 'DESCENT TRANSITION',
+    'hover_descent_phase': 'HOVER DESCENT'
+}
+# Other methods whose wall-clock time is counted; Aircraft.adjust_speed_based_on_wind is also traced, for the
+# wind correction of each phase
+AIRCRAFT_METHODS = ('vertical_takeoff_landing_energy_consumption',
+                    'climb_transition_energy_consumption', 'climb_energy_consumption', 'cruise_energy_consumption',
+                    'descent_energy_consumption', 'descent_transition_energy_consumption')
+WIND_METHODS = ('wind_adjusted_true_velocity', 'rta_velocity_wind_adjusted', 'compute_aircraft_velocity', 'get_v_wind',
+                'verify_aircraft_heading', 'verify_aircraft_speeds', 'compute_aircraft_velocity_batch')
+
+# The active Tracer, None when tracing is off
+_tracer = None
+# (class, attribute name, original attribute) of every patched method, to restore on disable
+_patched = []
+
+
+class Tracer:
+    """
+    Structured per-phase events and wall-clock counters of an Aircraft / Wind run, or of the vectorized route
+    engine (route_engine.compute_route_energy), which records the same events but only times whole routes.
+    events holds one dict per flown phase: direction, phase, energy (kWh), time (s), power (kW) and, for phases
+    flown through the wind, the wind correction (crab angle, true airspeed and ground speed).
+    phase_counters and function_counters hold the number of calls and total seconds per phase type and per method.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.phase_counters = {}
+        self.function_counters = {}
+        self._wind_correction = None
+
+    @staticmethod
+    def _count(counters, name, seconds):
+        counter = counters.setdefault(name, {'calls': 0, 'seconds': 0.0})
+        counter['calls'] += 1
+        counter['seconds'] += seconds
+
+    def count_function(self, name, seconds):
+        self._count(self.function_counters, name, seconds)
+
+    def add_phase_event(self, direction, phase, energy_consumption, time_to_complete, wind_correction=None):
+        self.events.append({
+            'direction': str(direction),
+            'phase': phase,
+            'energy_consumption': float(energy_consumption),
+            'time_to_complete': float(time_to_complete),
+            'power': float(energy_consumption * 3600 / time_to_complete) if time_to_complete else None,
+            'wind_correction': wind_correction
+        })
+
+    def to_dict(self):
+        return {'events': self.events, 'phase_counters': self.phase_counters, 'function_counters': self.function_counters}
+
+    def export_json(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=4)
+
+
+def _timed(tracer, name, function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            Tracer._count(tracer.function_counters, name, time.perf_counter() - start)
+    return wrapper
+
+
+def _traced_wind_adjustment(tracer, name, function):
+    timed = _timed(tracer, name, function)
+
+    @functools.wraps(function)
+    def wrapper(aircraft, *args, **kwargs):
+        start_air_speed, end_air_speed, true_v, ground_v = timed(aircraft, *args, **kwargs)
+        crab_angle = (vector_to_heading(true_v) - vector_to_heading(ground_v) + pi) % (2 * pi) - pi
+        tracer._wind_correction = {'crab_angle_radians': float(crab_angle),
+                                   'true_airspeed': float(magnitude(true_v)),
+                                   'ground_speed': float(magnitude(ground_v))}
+        return start_air_speed, end_air_speed, true_v, ground_v
+    return wrapper
+
+
+def _traced_phase(tracer, name, phase, function):
+    @functools.wraps(function)
+    def wrapper(aircraft, phase_info):
+        tracer._wind_correction = None
+        start = time.perf_counter()
+        energy_consumption, time_to_complete = function(aircraft, phase_info)
+        seconds = time.perf_counter() - start
+        Tracer._count(tracer.function_counters, name, seconds)
+        Tracer._count(tracer.phase_counters, phase, seconds)
+        tracer.add_phase_event(aircraft.flight_direction, phase, energy_consumption, time_to_complete,
+                               tracer._wind_correction)
+        return energy_consumption, time_to_complete
+    return wrapper
+
+
+def _patch(cls, attribute, make_wrapper):
+    original = cls.__dict__[attribute]
+    name = f'{cls.__name__}.{attribute}'
+    if isinstance(original, staticmethod):
+        setattr(cls, attribute, staticmethod(make_wrapper(name, original.__func__)))
+    else:
+        setattr(cls, attribute, make_wrapper(name, original))
+    _patched.append((cls, attribute, original))
+
+
+def enable_tracing():
+    """
+    Start tracing Aircraft and Wind and return the Tracer. Tracing works by wrapping their methods, so with tracing
+    off they run unwrapped and pay nothing for it.
+    """
+    global _tracer
+    if _tracer is not None:
+        return _tracer
+    from aircraft import Aircraft  # aircraft imports utils
+    from wind.wind import Wind
+
+    tracer = Tracer()
+    for attribute, phase in PHASE_METHODS.items():
+        _patch(Aircraft, attribute, lambda name, function, phase=phase: _traced_phase(tracer, name, phase, function))
+    _patch(Aircraft, 'adjust_speed_based_on_wind', lambda name, function: _traced_wind_adjustment(tracer, name, function))
+    for attribute in AIRCRAFT_METHODS:
+        _patch(Aircraft, attribute, lambda name, function: _timed(tracer, name, function))
+    for attribute in WIND_METHODS:
+        _patch(Wind, attribute, lambda name, function: _timed(tracer, name, function))
+    _tracer = tracer
+    return tracer
+
+
+def disable_tracing():
+    """Stop tracing and restore the original methods. Returns the Tracer that was active, if any."""
+    global _tracer
+    while _patched:
+        cls, attribute, original = _patched.pop()
+        setattr(cls, attribute, original)
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def get_tracer():
+    return _tracer
+
+
+@contextmanager
+def tracing(path=None):
+    """Trace the body of a with block, then export the trace to path as JSON if given."""
+    tracer = enable_tracing()
+    try:
+        yield tracer
+    finally:
+        disable_tracing()
+        if path is not None:
+            tracer.export_json(path)
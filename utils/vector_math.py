@@ -22,10 +22,12 @@ def lat_long_to_heading(latitude_1: float, longitude_1: float, latitude_2: float
     
     Source:
         https://www.movable-type.co.uk/scripts/latlong.html
+
+    Coordinates are in radians and may be arrays.
     """
     
-    longitude_difference = longitude_2 - longitude_1
-    return atan2(sin(longitude_difference) * cos(latitude_2), cos(latitude_1) * sin(latitude_2) - sin(latitude_1) * cos(latitude_2) * cos(longitude_difference))
+    longitude_difference = np.subtract(longitude_2, longitude_1)
+    return np.arctan2(np.sin(longitude_difference) * np.cos(latitude_2), np.cos(latitude_1) * np.sin(latitude_2) - np.sin(latitude_1) * np.cos(latitude_2) * np.cos(longitude_difference))
 
 def heading_to_vector(heading: float, magnitude: float = 1.0) -> np.ndarray:
     """Converts a heading (radians) to a unit vector. Optional argument of vector magnitude.
@@ -35,6 +37,12 @@ def heading_to_vector(heading: float, magnitude: float = 1.0) -> np.ndarray:
     return np.array([magnitude * sin(heading),
                         magnitude * cos(heading)])
 
+def norm(x, y):
+    """Element-wise length of (x, y). Complex inputs (complex-step derivatives) get the analytic sqrt(x^2 + y^2)."""
+    if np.iscomplexobj(x) or np.iscomplexobj(y):
+        return np.sqrt(x * x + y * y)
+    return np.hypot(x, y)
+
 def magnitude(vector: np.ndarray) -> float:
     """Calculate magnitude of numpy vector."""
     return np.sqrt(np.dot(vector, vector))
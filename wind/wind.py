@@ -1,10 +1,12 @@
 import numpy as np
 from math import sin, asin, pi
-from utils.vector_math import vector_to_heading, swap_angle_relative_x_axis_north, heading_to_vector, magnitude, convert_to_range_zero_to_two_pi
+from utils.vector_math import vector_to_heading, swap_angle_relative_x_axis_north, heading_to_vector, magnitude, norm, convert_to_range_zero_to_two_pi
 from utils.units import degrees_to_radians, mph_to_metersec
 import logging
 
 class Wind:
+    # Constant over the whole flight; see wind.wind_field.FieldWind for winds that vary along the route
+    spatial = False
 
     def __init__(self, reference_frame, wind_magnitude_mph=0, wind_direction_degrees=0):
         self.reference_frame = reference_frame
@@ -25,7 +27,7 @@ class Wind:
         where a = desired_heading, c = true_heading, b = wind_heading all relative to the x-axis (using swap_angle_relative_x_axis_north),
         and |B| = wind_mag and |A| = cruise_speed.
         """
-        logging.info(f"PROCESSING VELOCITY FOR WIND: Cruise speed = {cruise_speed}, Desired heading = {desired_heading}, Wind vector = {v_wind}")
+        logging.info("PROCESSING VELOCITY FOR WIND: Cruise speed = %s, Desired heading = %s, Wind vector = %s", cruise_speed, desired_heading, v_wind)
         wind_mag = magnitude(v_wind)
         a = swap_angle_relative_x_axis_north(desired_heading)
         b = swap_angle_relative_x_axis_north(vector_to_heading(v_wind))
@@ -43,7 +45,7 @@ class Wind:
         c = a - asin(min(max(right_hand_side, -1), 1)) # technically, c = a - asin(rhs) - 2pi * k, min and max prevent rounding errors
         required_heading = swap_angle_relative_x_axis_north(c)
 
-        logging.info(f"Desired heading = {desired_heading}, Required heading = {required_heading}")
+        logging.info("Desired heading = %s, Required heading = %s", desired_heading, required_heading)
         
         # new velocities
         true_velocity = heading_to_vector(required_heading, magnitude=cruise_speed)
@@ -66,9 +68,10 @@ class Wind:
         
         v_desired = heading_to_vector(desired_heading, magnitude=desired_ground_speed)
 
-        logging.info(f"AFTER RTA VELOCITY WIND ADJUSTMENT: {np.subtract(v_desired, v_wind)}")
+        true_velocity = np.subtract(v_desired, v_wind)
+        logging.info("AFTER RTA VELOCITY WIND ADJUSTMENT: %s", true_velocity)
         
-        return np.subtract(v_desired, v_wind)
+        return true_velocity
     
     @staticmethod
     def make_static_wind_vector_relative_to_the_aircraft(wind_angle: float, aircraft_heading: float, wind_magnitude: float = None) -> np.ndarray:
@@ -126,10 +129,82 @@ class Wind:
             v_wind: np.ndarray = Wind.make_static_wind_vector_relative_to_the_aircraft(self.wind_angle, destination_heading, self.wind_magnitude)
         elif self.reference_frame == 'relative_to_north':
             v_wind: np.ndarray = Wind.make_wind_vector_relative_to_north(self.wind_angle, self.wind_magnitude)
-            logging.info(f"Wind vector relative to North: {v_wind}")
+            logging.info("Wind vector relative to North: %s", v_wind)
         return v_wind
     
-    # --- VERIFICATION -- 
+    # --- BATCH (ARRAY) VERSIONS --
+    # The batch solvers work in the track frame of each segment: 'along' points toward the destination heading and
+    # 'cross' 90° clockwise from it. A velocity (along, cross) has heading desired_heading + arctan2(cross, along).
+    # All arguments broadcast, e.g. (N,) segments against (M, 1) wind cases gives (M, N) results.
+    # No logging or verification is done per element.
+
+    @staticmethod
+    def track_wind_components(reference_frame: str, wind_magnitude, wind_angle, desired_heading):
+        """Split the wind (magnitude in m/s, angle in radians as stored on Wind) into along/cross-track components
+        for arrays of desired headings. Returns (along_wind, cross_wind) broadcast to a common shape."""
+        desired_heading = np.asarray(desired_heading)
+        if reference_frame == 'relative_to_aircraft':
+            # The wind turns with the aircraft, so its track components do not depend on the heading
+            along_wind = wind_magnitude * np.cos(wind_angle)
+            cross_wind = wind_magnitude * np.sin(wind_angle)
+        elif reference_frame == 'relative_to_north':
+            relative_angle = np.subtract(np.add(wind_angle, pi), desired_heading)
+            along_wind = wind_magnitude * np.cos(relative_angle)
+            cross_wind = wind_magnitude * np.sin(relative_angle)
+        else:
+            raise ValueError('reference_frame must be either "relative_to_aircraft" or "relative_to_north"')
+        shape = np.broadcast_shapes(np.shape(along_wind), desired_heading.shape)
+        return np.broadcast_to(along_wind, shape), np.broadcast_to(cross_wind, shape)
+
+    @staticmethod
+    def wind_adjusted_true_velocity_batch(cruise_speed, along_wind, cross_wind, ground_speed_threshold: float = None):
+        """Array version of wind_adjusted_true_velocity.
+        Returns (true_along, true_cross, ground_speed).
+
+        The crab angle solves the central equation, sin(crab) = -cross_wind / cruise_speed. Where the wind is
+        stronger than the aircraft (B_over_A > 1) or the resulting ground speed is below the threshold, the
+        RTA velocity at the threshold ground speed is used instead (no threshold: hold position over the ground).
+        """
+        cruise_speed = np.asarray(cruise_speed, dtype=np.float64)
+        threshold = ground_speed_threshold or 0.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            right_hand_side = -cross_wind / cruise_speed
+            b_over_a = norm(along_wind, cross_wind) / cruise_speed
+        crab_along = cruise_speed * np.sqrt(1 - np.clip(right_hand_side, -1, 1)**2)
+        crab_ground_speed = crab_along + along_wind
+
+        fallback = b_over_a > 1
+        if ground_speed_threshold:
+            fallback |= crab_ground_speed < ground_speed_threshold
+        rta_along, rta_cross = Wind.rta_velocity_wind_adjusted_batch(threshold, along_wind, cross_wind)
+
+        true_along = np.where(fallback, rta_along, crab_along)
+        true_cross = np.where(fallback, rta_cross, -cross_wind)
+        ground_speed = np.where(fallback, threshold, crab_ground_speed)
+        return true_along, true_cross, ground_speed
+
+    @staticmethod
+    def rta_velocity_wind_adjusted_batch(desired_ground_speed, along_wind, cross_wind):
+        """Array version of rta_velocity_wind_adjusted. Returns (true_along, true_cross)."""
+        return np.subtract(desired_ground_speed, along_wind), np.negative(cross_wind)
+
+    def get_track_wind(self, destination_heading):
+        """Along/cross-track wind components for arrays of destination headings."""
+        return Wind.track_wind_components(self.reference_frame, self.wind_magnitude, self.wind_angle, destination_heading)
+
+    def compute_aircraft_velocity_batch(self, destination_heading, true_airspeed_desired, ground_speed_threshold: float):
+        """Array version of compute_aircraft_velocity.
+        Returns (true_heading, true_airspeed, ground_speed). wind_magnitude and wind_angle may themselves be arrays
+        of wind cases, e.g. shape (M, 1) against N segment headings."""
+        along_wind, cross_wind = self.get_track_wind(destination_heading)
+        true_along, true_cross, ground_speed = Wind.wind_adjusted_true_velocity_batch(true_airspeed_desired,
+                                                                                      along_wind,
+                                                                                      cross_wind,
+                                                                                      ground_speed_threshold)
+        true_heading = np.add(destination_heading, np.arctan2(true_cross, true_along))
+        return true_heading, np.hypot(true_along, true_cross), ground_speed
+
+    # --- VERIFICATION --
     @staticmethod
     def verify_aircraft_heading(ground_v: np.ndarray, destination_heading: float) -> None:
         aircraft_heading = convert_to_range_zero_to_two_pi(vector_to_heading(ground_v))
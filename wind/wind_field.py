@@ -0,0 +1,88 @@
+import json
+import os
+import numpy as np
+from wind.wind import Wind
+from utils.interpolation import axis_step, multilinear
+
+# Bump when the bundle layout changes
+WIND_FIELD_VERSION = 1
+META_FILE = 'meta.json'
+UV_FILE = 'uv.npy'
+
+
+class WindField:
+    """
+    Spatially varying wind on a (latitude, longitude, altitude) grid.
+    uv has shape (latitudes, longitudes, altitudes, 2) and holds the eastward (u) and northward (v) wind components
+    in m/s, i.e. the vector the air moves along. Axes are ascending; latitude and longitude in degrees, altitude in
+    meters. Lookups are trilinear and clamp to the edge of the grid. Fields are stored as a directory bundle whose
+    uv array is memory-mapped on load, so a lookup only reads the grid cells around the queried points.
+    """
+
+    def __init__(self, latitudes, longitudes, altitudes, uv):
+        self.axes = tuple(np.asarray(axis, dtype=np.float64) for axis in (latitudes, longitudes, altitudes))
+        for axis in self.axes:
+            if not len(axis) or np.any(np.diff(axis) <= 0):
+                raise ValueError('Wind field axes must be non-empty and strictly ascending.')
+        if uv.shape != tuple(len(axis) for axis in self.axes) + (2,):
+            raise ValueError(f'uv must have shape (latitudes, longitudes, altitudes, 2), got {uv.shape}.')
+        self.uv = uv
+        self.steps = tuple(axis_step(axis) for axis in self.axes)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, UV_FILE), np.asarray(self.uv, dtype=np.float32))
+        meta = {
+            'version': WIND_FIELD_VERSION,
+            'latitudes': self.axes[0].tolist(),
+            'longitudes': self.axes[1].tolist(),
+            'altitudes': self.axes[2].tolist()
+        }
+        with open(os.path.join(path, META_FILE), 'w') as file:
+            json.dump(meta, file)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(os.path.join(path, META_FILE), 'r') as file:
+            meta = json.load(file)
+        if meta.get('version') != WIND_FIELD_VERSION:
+            raise ValueError(f'{path} was written by wind field version {meta.get("version")}, '
+                             f'expected {WIND_FIELD_VERSION}.')
+        uv = np.load(os.path.join(path, UV_FILE), mmap_mode='r' if mmap else None)
+        return cls(meta['latitudes'], meta['longitudes'], meta['altitudes'], uv)
+
+    def uv_at(self, latitude, longitude, altitude):
+        """Trilinearly interpolated (u, v) in m/s at arrays of points (degrees, degrees, meters)."""
+        uv = multilinear(self.axes, self.steps, self.uv, (latitude, longitude, altitude))
+        return uv[..., 0], uv[..., 1]
+
+    def wind_at(self, latitude, longitude, altitude):
+        """
+        Wind at arrays of points as (magnitude m/s, angle radians) in the relative_to_north frame of Wind, where the
+        angle is the heading the wind comes from.
+        """
+        u, v = self.uv_at(latitude, longitude, altitude)
+        return np.hypot(u, v), np.mod(np.arctan2(u, v) + np.pi, 2 * np.pi)
+
+
+class FieldWind(Wind):
+    """
+    Wind drawn from a WindField. Aircraft.adjust_speed_based_on_wind calls locate before every phase flown through
+    the wind, which samples the field at the waypoint, half way through the phase's altitude change; from there on
+    it behaves as a constant relative_to_north Wind. The vectorized engine samples every route row at once with
+    route_wind.
+    """
+    spatial = True
+
+    def __init__(self, wind_field):
+        super().__init__(reference_frame='relative_to_north')
+        self.wind_field = wind_field
+
+    def locate(self, latitude, longitude, altitude):
+        wind_magnitude, wind_angle = self.wind_field.wind_at(latitude, longitude, altitude)
+        self.wind_magnitude, self.wind_angle = float(wind_magnitude), float(wind_angle)
+
+    def route_wind(self, columns):
+        """(magnitude, angle) arrays for every row of a RouteColumns, sampled where locate would sample them."""
+        mid_altitude = columns.altitude + np.nan_to_num(columns.vertical_distance) / 2
+        return self.wind_field.wind_at(columns.latitude, columns.longitude, mid_altitude)
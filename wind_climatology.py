@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+from route_engine import RouteColumns
+from utils.units import mph_to_metersec, degrees_to_radians, sec_to_min
+from wind_sweep import evaluate_wind_cases, DEFAULT_CHUNK_SIZE
+
+# Meteorological seasons by month
+SEASONS = {12: 'DJF', 1: 'DJF', 2: 'DJF', 3: 'MAM', 4: 'MAM', 5: 'MAM',
+           6: 'JJA', 7: 'JJA', 8: 'JJA', 9: 'SON', 10: 'SON', 11: 'SON'}
+SEASON_ORDER = ('DJF', 'MAM', 'JJA', 'SON')
+# Quantile aggregate reports next to the mean and maximum
+AGGREGATE_QUANTILE = 0.9
+
+
+def read_observations(path):
+    """Wind observations from a CSV with timestamp, wind_speed_mph and wind_direction_degrees columns."""
+    observations = pd.read_csv(path, parse_dates=['timestamp'])
+    missing = {'timestamp', 'wind_speed_mph', 'wind_direction_degrees'} - set(observations.columns)
+    if missing:
+        raise ValueError(f'{path} is missing the columns {sorted(missing)}.')
+    return observations.dropna(subset=['wind_speed_mph', 'wind_direction_degrees'])
+
+
+def replay_climatology(route, aircraft_params, observations, reference_frame='relative_to_north',
+                       flight_directions=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Fly the route once for every wind observation. Identical (speed, direction) observations are evaluated once:
+    a year of hourly observations reported in whole knots or degrees has only a few thousand distinct winds.
+    :param route: route DataFrame (as read from a route CSV) or RouteColumns
+    :param observations: DataFrame with timestamp, wind_speed_mph and wind_direction_degrees columns
+    :return: DataFrame indexed by timestamp with one row per (observation, flight_direction) holding the wind and
+             the total energy_consumption (kWh) and flight_time (minutes)
+    """
+    columns = route if isinstance(route, RouteColumns) else RouteColumns.from_dataframe(route, flight_directions)
+    winds = observations[['wind_speed_mph', 'wind_direction_degrees']].to_numpy(dtype=np.float64)
+    if len(winds):
+        unique_winds, inverse = np.unique(winds, axis=0, return_inverse=True)
+    else:
+        # np.unique along an axis cannot reshape empty input on older numpy
+        unique_winds, inverse = winds, np.zeros(0, dtype=np.int64)
+    phase_totals = evaluate_wind_cases(columns=columns,
+                                       aircraft_params=aircraft_params,
+                                       wind_magnitudes=mph_to_metersec(unique_winds[:, 0]),
+                                       wind_angles=degrees_to_radians(unique_winds[:, 1]),
+                                       reference_frame=reference_frame,
+                                       chunk_size=chunk_size)
+    # (observations, directions, {energy, time})
+    totals = phase_totals.sum(axis=-2)[inverse.ravel()]
+
+    n_flight_directions = len(columns.flight_directions)
+    series = pd.DataFrame({
+        'timestamp': np.repeat(observations['timestamp'].to_numpy(), n_flight_directions),
+        'flight_direction': np.tile(np.asarray(columns.flight_directions, dtype=object), len(winds)),
+        'wind_direction_degrees': np.repeat(winds[:, 1], n_flight_directions),
+        'wind_magnitude_mph': np.repeat(winds[:, 0], n_flight_directions),
+        'energy_consumption': totals[..., 0].ravel(),
+        'flight_time': sec_to_min(totals[..., 1].ravel())
+    })
+    return series.set_index('timestamp')
+
+
+def aggregate(series, by='season'):
+    """
+    Mean, AGGREGATE_QUANTILE quantile and maximum energy_consumption and flight_time of a replay_climatology
+    series per flight direction and season ('season') or hour of day ('hour').
+    """
+    timestamps = pd.DatetimeIndex(series.index)
+    if by == 'season':
+        key = pd.Categorical(timestamps.month.map(SEASONS), categories=SEASON_ORDER, ordered=True)
+    elif by == 'hour':
+        key = timestamps.hour
+    else:
+        raise ValueError('by must be either "season" or "hour"')
+    grouped = series[['energy_consumption', 'flight_time']].groupby([series['flight_direction'].to_numpy(), key],
+                                                                    observed=True)
+    statistics = {'mean': grouped.mean(),
+                  f'p{round(AGGREGATE_QUANTILE * 100)}': grouped.quantile(AGGREGATE_QUANTILE),
+                  'max': grouped.max()}
+    aggregates = pd.concat([table.add_suffix(f'_{statistic}') for statistic, table in statistics.items()], axis=1)
+    aggregates['observations'] = grouped.size()
+    aggregates.index.names = ['flight_direction', by]
+    return aggregates
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+from route_engine import RouteColumns
+from utils.units import mph_to_metersec, degrees_to_radians, sec_to_min
+from wind_sweep import evaluate_wind_cases, DEFAULT_CHUNK_SIZE
+
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+# Samples drawn and evaluated together; convergence is checked after each batch
+DEFAULT_BATCH_SIZE = 4096
+
+
+class WindDistribution:
+    """
+    Distribution wind cases are drawn from. Speeds are in mph and directions in degrees, interpreted in the
+    reference frame the ensemble is evaluated in (as for Wind).
+    speed and direction are functions (rng, n) -> n samples; table is an empirical joint distribution instead.
+    """
+
+    def __init__(self, speed=None, direction=None, table=None):
+        if table is None and (speed is None or direction is None):
+            raise ValueError('Give either speed and direction samplers or an empirical table.')
+        self.speed = speed
+        self.direction = direction
+        self.table = table
+
+    @classmethod
+    def weibull_von_mises(cls, shape, scale_mph, mean_direction_degrees=0.0, kappa=0.0):
+        """Weibull wind speeds and von Mises wind directions (kappa=0 gives uniform directions)."""
+        return cls(speed=lambda rng, n: scale_mph * rng.weibull(shape, n),
+                   direction=lambda rng, n: np.degrees(rng.vonmises(np.radians(mean_direction_degrees), kappa, n)) % 360)
+
+    @classmethod
+    def empirical(cls, wind_speeds, wind_directions, weights=None):
+        """Observed (wind speed mph, wind direction degrees) pairs, resampled with replacement, optionally weighted."""
+        wind_speeds = np.asarray(wind_speeds, dtype=np.float64).ravel()
+        wind_directions = np.asarray(wind_directions, dtype=np.float64).ravel()
+        if len(wind_speeds) != len(wind_directions) or not len(wind_speeds):
+            raise ValueError('wind_speeds and wind_directions must be non-empty and of the same length.')
+        if weights is not None:
+            weights = np.asarray(weights, dtype=np.float64).ravel()
+            weights = weights / weights.sum()
+        return cls(table=(wind_speeds, wind_directions, weights))
+
+    @classmethod
+    def from_csv(cls, path):
+        """Empirical distribution from a CSV with wind_speed_mph and wind_direction_degrees columns and optional weight."""
+        table = pd.read_csv(path)
+        return cls.empirical(table['wind_speed_mph'], table['wind_direction_degrees'], table.get('weight'))
+
+    def sample(self, rng, n):
+        """Returns (wind speeds mph, wind directions degrees), n of each."""
+        if self.table is not None:
+            wind_speeds, wind_directions, weights = self.table
+            rows = rng.choice(len(wind_speeds), size=n, p=weights)
+            return wind_speeds[rows], wind_directions[rows]
+        return self.speed(rng, n), self.direction(rng, n)
+
+
+def _quantiles(totals, quantiles):
+    # (quantiles, directions, {energy, time})
+    return np.quantile(totals, quantiles, axis=0)
+
+
+def wind_ensemble(route, aircraft_params, distribution, n_samples=20_000, quantiles=DEFAULT_QUANTILES,
+                  reference_frame='relative_to_aircraft', flight_directions=None, batch_size=DEFAULT_BATCH_SIZE,
+                  tolerance=None, seed=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Monte Carlo trip energy and flight time under winds drawn from distribution.
+    Samples are drawn and evaluated in batches through the batched route engine. With tolerance, sampling stops
+    early, before n_samples, once no quantile moved by more than tolerance (relative) over the last batch.
+    :param route: route DataFrame (as read from a route CSV) or RouteColumns
+    :return: DataFrame with one row per (flight_direction, quantile) holding the energy_consumption (kWh) and
+             flight_time (minutes) quantiles, and the number of samples they were estimated from
+    """
+    if n_samples < 1:
+        raise ValueError('n_samples must be at least 1.')
+    columns = route if isinstance(route, RouteColumns) else RouteColumns.from_dataframe(route, flight_directions)
+    quantiles = np.asarray(quantiles, dtype=np.float64).ravel()
+    rng = np.random.default_rng(seed)
+
+    batches = []
+    estimate = None
+    samples = 0
+    while samples < n_samples:
+        n = min(batch_size, n_samples - samples)
+        wind_speeds, wind_directions = distribution.sample(rng, n)
+        phase_totals = evaluate_wind_cases(columns=columns,
+                                           aircraft_params=aircraft_params,
+                                           wind_magnitudes=mph_to_metersec(wind_speeds),
+                                           wind_angles=degrees_to_radians(wind_directions),
+                                           reference_frame=reference_frame,
+                                           chunk_size=chunk_size)
+        batches.append(phase_totals.sum(axis=-2))
+        samples += n
+        if tolerance is None:
+            continue
+        previous, estimate = estimate, _quantiles(np.concatenate(batches), quantiles)
+        if previous is not None:
+            change = np.abs(estimate - previous) / np.maximum(np.abs(previous), np.finfo(np.float64).tiny)
+            if change.max() <= tolerance:
+                break
+
+    totals = np.concatenate(batches)
+    estimate = _quantiles(totals, quantiles)
+    n_flight_directions = len(columns.flight_directions)
+    return pd.DataFrame({
+        'flight_direction': np.tile(np.asarray(columns.flight_directions, dtype=object), len(quantiles)),
+        'quantile': np.repeat(quantiles, n_flight_directions),
+        'energy_consumption': estimate[..., 0].ravel(),
+        'flight_time': sec_to_min(estimate[..., 1].ravel()),
+        'samples': samples
+    })
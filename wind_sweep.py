@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+from route_engine import RouteColumns, evaluate_route, METRIC_PHASES
+from utils.units import mph_to_metersec, degrees_to_radians, sec_to_min
+
+# Upper bound on wind cases evaluated together so that (cases x route rows) arrays stay a few MB
+DEFAULT_CHUNK_SIZE = 2048
+
+
+def evaluate_wind_grid(columns, aircraft_params, wind_speeds, wind_directions,
+                       reference_frame='relative_to_aircraft', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Evaluate every (wind_direction, wind_speed) pair of the grid in one process.
+    :param wind_speeds: wind magnitudes in mph
+    :param wind_directions: wind directions in degrees, interpreted in reference_frame like Wind does
+    :return: array of shape (len(wind_directions), len(wind_speeds), flight directions, phases, 2) holding
+             the phase energy (kWh) and phase time (s) totals
+    """
+    wind_speeds = np.asarray(wind_speeds, dtype=np.float64).ravel()
+    wind_directions = np.asarray(wind_directions, dtype=np.float64).ravel()
+    # Cases are laid out direction-major, matching the output table
+    case_magnitudes = np.tile(mph_to_metersec(wind_speeds), len(wind_directions))
+    case_angles = np.repeat(degrees_to_radians(wind_directions), len(wind_speeds))
+    return evaluate_wind_cases(columns, aircraft_params, case_magnitudes, case_angles, reference_frame, chunk_size) \
+        .reshape((len(wind_directions), len(wind_speeds), len(columns.flight_directions), len(METRIC_PHASES), 2))
+
+
+def evaluate_wind_cases(columns, aircraft_params, wind_magnitudes, wind_angles,
+                        reference_frame='relative_to_aircraft', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Evaluate a flat list of wind cases, broadcasting each chunk of cases against the route rows.
+    :param wind_magnitudes: wind magnitudes in m/s
+    :param wind_angles: wind angles in radians
+    :return: array of shape (cases, flight directions, phases, 2)
+    """
+    wind_magnitudes = np.asarray(wind_magnitudes, dtype=np.float64).ravel()
+    wind_angles = np.asarray(wind_angles, dtype=np.float64).ravel()
+    chunks = []
+    for start in range(0, len(wind_magnitudes), chunk_size):
+        stop = start + chunk_size
+        _, _, phase_totals = evaluate_route(columns=columns,
+                                            aircraft_params=aircraft_params,
+                                            wind_magnitude=wind_magnitudes[start:stop, np.newaxis],
+                                            wind_angle=wind_angles[start:stop, np.newaxis],
+                                            reference_frame=reference_frame)
+        chunks.append(phase_totals)
+    if not chunks:
+        return empty_phase_totals(columns)
+    return np.concatenate(chunks)
+
+
+def empty_phase_totals(columns):
+    """Phase totals of zero cases, shaped like those of evaluate_wind_cases."""
+    return np.zeros((0, len(columns.flight_directions), len(METRIC_PHASES), 2))
+
+
+def wind_sweep(route, aircraft_params, wind_speeds, wind_directions, reference_frame='relative_to_aircraft',
+               flight_directions=None, chunk_size=DEFAULT_CHUNK_SIZE, cache=None):
+    """
+    In-process replacement for running main.py once per wind configuration.
+    :param route: route DataFrame (as read from a route CSV) or RouteColumns
+    :param cache: optional result_cache.ResultCache; only the wind cases it misses are computed
+    :return: DataFrame with one row per (wind_direction_degrees, wind_magnitude_mph, flight_direction) and the
+             total energy_consumption (kWh) and flight_time (minutes), the units save_to_database stores
+    """
+    columns = route if isinstance(route, RouteColumns) else RouteColumns.from_dataframe(route, flight_directions)
+    wind_speeds = np.asarray(wind_speeds).ravel()
+    wind_directions = np.asarray(wind_directions).ravel()
+    case_speeds = np.tile(wind_speeds, len(wind_directions))
+    case_directions = np.repeat(wind_directions, len(wind_speeds))
+
+    if cache is None:
+        phase_totals = evaluate_wind_grid(columns, aircraft_params, wind_speeds, wind_directions, reference_frame, chunk_size)
+        phase_totals = phase_totals.reshape((-1,) + phase_totals.shape[2:])
+    else:
+        phase_totals = np.concatenate([empty_phase_totals(columns)] +
+                                      [cache.evaluate_wind_cases(columns, aircraft_params, case_speeds[start:start + chunk_size],
+                                                                 case_directions[start:start + chunk_size], reference_frame)[0]
+                                       for start in range(0, len(case_speeds), chunk_size)])
+    return results_table(flight_directions=columns.flight_directions,
+                         wind_speeds=case_speeds,
+                         wind_directions=case_directions,
+                         phase_totals=phase_totals)
+
+
+def results_table(flight_directions, wind_speeds, wind_directions, phase_totals):
+    """
+    Flatten per-case phase totals of shape (cases, flight directions, phases, 2) into a tidy table.
+    wind_speeds (mph) and wind_directions (degrees) give the wind of each case.
+    """
+    totals = phase_totals.sum(axis=-2)
+    n_flight_directions = len(flight_directions)
+    return pd.DataFrame({
+        'wind_direction_degrees': np.repeat(wind_directions, n_flight_directions),
+        'wind_magnitude_mph': np.repeat(wind_speeds, n_flight_directions),
+        'flight_direction': np.tile(np.asarray(flight_directions, dtype=object), len(wind_speeds)),
+        'energy_consumption': totals[..., 0].ravel(),
+        'flight_time': sec_to_min(totals[..., 1].ravel())
+    })